@@ -0,0 +1,94 @@
+import os
+import time
+import zipfile
+from pathlib import Path
+from shutil import copyfileobj
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# Timestamp of archive entries in reproducible archives (the earliest ZIP
+# files support), unless `SOURCE_DATE_EPOCH` is set
+DEFAULT_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Permissions of archive entries
+FILE_MODE = 0o644
+DIRECTORY_MODE = 0o755
+
+
+def source_date_time() -> Tuple[int, int, int, int, int, int]:
+    """
+    Timestamp for reproducible archive entries.
+
+    The `SOURCE_DATE_EPOCH` environment variable is honoured, as defined by
+    https://reproducible-builds.org/specs/source-date-epoch/.
+    """
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        return DEFAULT_DATE_TIME
+    return max(DEFAULT_DATE_TIME, time.gmtime(int(epoch))[:6])
+
+
+def archive_members(root: Path) -> List[Path]:
+    """
+    List the files and directories within a directory, sorted by name.
+
+    Symbolic links are followed.
+    """
+    members = []
+    for directory, subdirectories, files in os.walk(
+        str(root), followlinks=True
+    ):
+        for name in subdirectories + files:
+            members.append(Path(directory, name))
+    return sorted(members, key=lambda path: path.relative_to(root).parts)
+
+
+def write_zip(archive: Path, root: Path, reproducible: bool = False):
+    """
+    Create a ZIP file with the contents of a directory.
+
+    Entries are always sorted by name and stored with normalized
+    permissions. Reproducible archives also have a fixed timestamp (see
+    `source_date_time`), so the same files always produce a byte-for-byte
+    identical archive.
+
+    Parameters
+    ----------
+    archive
+        Path of the ZIP file to create.
+    root
+        Directory whose contents are archived.
+    reproducible
+        Whether to normalize the timestamps.
+    """
+    date_time = source_date_time() if reproducible else None
+    partial = archive.with_name(archive.name + '.part')
+    with zipfile.ZipFile(str(partial), 'w', zipfile.ZIP_DEFLATED) as output:
+        for path in archive_members(root):
+            write_member(output, path, path.relative_to(root), date_time)
+    partial.replace(archive)
+
+
+def write_member(
+    output: zipfile.ZipFile,
+    path: Path,
+    name: Path,
+    date_time: Optional[Tuple[int, ...]] = None,
+):
+    """
+    Add a file or directory to a ZIP file.
+    """
+    if date_time is None:
+        date_time = time.localtime(path.stat().st_mtime)[:6]
+        date_time = max(DEFAULT_DATE_TIME, date_time)
+    if path.is_dir():
+        info = zipfile.ZipInfo(name.as_posix() + '/', date_time)
+        info.external_attr = (0o40000 | DIRECTORY_MODE) << 16 | 0x10
+        output.writestr(info, b'')
+        return
+    info = zipfile.ZipInfo(name.as_posix(), date_time)
+    info.external_attr = (0o100000 | FILE_MODE) << 16
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with path.open('rb') as source, output.open(info, 'w') as target:
+        copyfileobj(source, target)
@@ -0,0 +1,145 @@
+import asyncio
+import sys
+import traceback
+
+from tornado.ioloop import IOLoop
+
+from .convert import build
+from .events import emit
+from .events import enabled
+
+
+class Builder:
+    """
+    Schedule presentation builds in the Tornado IOLoop.
+
+    Change requests are debounced and at most one build runs at a time: a
+    newer request cancels the in-flight build (killing its Pandoc or rsync
+    child processes), which is then replaced by a new one as soon as the
+    cancelled build has finished cleaning up. Only the newest build ever
+    publishes its results.
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    callback
+        Function to call, with the set of dependencies, after each
+        successful build.
+    no_warmup
+        Whether to skip the warmup slide generation.
+    period
+        Time, in seconds, to wait for more changes before building.
+    preview
+        Whether builds are live previews (see `convert.build`).
+    publish
+        If provided, a function to publish the HTML of each build to
+        directly, as soon as it is generated (see `convert.build`).
+    metrics
+        If provided, a function returning extra statistics to report after
+        each build (i.e.: `Watcher.stats`).
+    """
+
+    def __init__(
+        self,
+        markdown_file,
+        callback,
+        no_warmup=False,
+        period=0.1,
+        preview=False,
+        publish=None,
+        metrics=None,
+    ):
+        self.markdown_file = markdown_file
+        self.callback = callback
+        self.no_warmup = no_warmup
+        self.preview = preview
+        self.publish = publish
+        self.metrics = metrics
+        self.period = period
+        self.ioloop = IOLoop.current()
+        self.lock = asyncio.Lock()
+        self.timeout = None
+        self.task = None
+        self.generation = 0
+        self.built = 0
+        self.cancelled = 0
+
+    def request(self):
+        """
+        Request a new build. This method is thread-safe.
+        """
+        self.ioloop.add_callback(self.schedule)
+
+    def schedule(self):
+        if self.timeout:
+            self.ioloop.remove_timeout(self.timeout)
+        self.timeout = self.ioloop.call_later(self.period, self.start)
+
+    def start(self):
+        self.timeout = None
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.generation += 1
+        self.task = asyncio.ensure_future(self.run(self.generation))
+
+    def stats(self):
+        """
+        Build statistics, for diagnostics.
+        """
+        stats = {'built': self.built, 'cancelled': self.cancelled}
+        if self.metrics:
+            stats.update(self.metrics())
+        return stats
+
+    def publisher(self, generation):
+        """
+        Publish function for a build, which ignores outdated builds.
+        """
+        if not self.publish:
+            return None
+
+        def publish(html):
+            if generation == self.generation:
+                self.publish(html)
+
+        return publish
+
+    async def run(self, generation):
+        try:
+            async with self.lock:
+                dependencies = await build(
+                    self.markdown_file,
+                    self.no_warmup,
+                    preview=self.preview,
+                    publish=self.publisher(generation),
+                )
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as error:
+            emit('error', phase='rebuild', message=str(error))
+            traceback.print_exc()
+            return
+        if generation != self.generation:
+            return
+        self.built += 1
+        self.callback(dependencies)
+        self.report()
+
+    def report(self):
+        """
+        Report the build statistics after a build (as an event, if enabled).
+        """
+        if enabled():
+            emit('rebuild', **self.stats())
+            return
+        message = (
+            'Presentation rebuilt ({built} builds, {cancelled} cancelled)'
+        )
+        if self.metrics:
+            message += (
+                ' [{backend} watcher: {watches} watches,'
+                ' {latency:.0f} ms latency]'
+            )
+        sys.stdout.write(message.format(**self.stats()) + '\n')
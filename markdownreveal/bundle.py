@@ -0,0 +1,276 @@
+import json
+import posixpath
+import re
+from hashlib import sha1
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+from .events import emit
+from .remote import write_atomic
+from .style import minify_css
+from .typing import Config
+
+# Directory, within the local directory, with the cached bundles
+BUNDLES_DIRECTORY = 'bundles'
+
+# Version of the bundling (bundles cached by other versions are not used)
+BUNDLE_VERSION = 1
+
+# Tags referencing the bundled assets, with their attributes
+TAG_REGEX = r'<(link)\b([^>]*)>|<(script)\b([^>]*)>\s*</script>'
+ATTRIBUTE_REGEX = r'([a-zA-Z][\w-]*)(?:\s*=\s*"([^"]*)")?'
+
+# Text allowed between tags bundled together
+SEPARATOR_REGEX = r'^(\s|<!--.*?-->)*$'
+
+# References within CSS files
+URL_REGEX = r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)'
+IMPORT_REGEX = r'@import\s+(?:url\([^)]*\)|([\'"])[^\'"]*\1)[^;]*;'
+SOURCE_MAP_REGEX = r'^\s*//[#@] sourceMappingURL=.*$'
+
+# Bundle tags, by kind
+BUNDLE_TAGS = {
+    'css': '<link rel="stylesheet" href="%s">',
+    'js': '<script src="%s"></script>',
+}
+
+
+def is_local(reference: str) -> bool:
+    """
+    Whether a reference is a relative path (not a URL or an absolute path).
+    """
+    return not re.match(r'^([a-zA-Z][\w+.-]*:|/|#)', reference)
+
+
+def asset_reference(match) -> Optional[tuple]:
+    """
+    Get the kind and local reference of a tag, if it can be bundled.
+
+    Stylesheets with a `media` attribute and scripts loaded as modules or
+    asynchronously are not bundled.
+    """
+    name = match.group(1) or match.group(3)
+    attributes = dict(
+        re.findall(ATTRIBUTE_REGEX, match.group(2) or match.group(4))
+    )
+    if name == 'link' and attributes.get('rel') == 'stylesheet':
+        kind, reference = 'css', attributes.get('href')
+        excluded = ('media',)
+    elif name == 'script':
+        kind, reference = 'js', attributes.get('src')
+        excluded = ('type', 'async', 'defer')
+    else:
+        return None
+    if not reference or not is_local(reference):
+        return None
+    if any(attribute in attributes for attribute in excluded):
+        return None
+    return kind, reference
+
+
+def asset_groups(html: str, directory: Path) -> List[list]:
+    """
+    Find groups of consecutive tags referencing assets of the same kind.
+
+    Tags are only grouped if nothing but whitespace and comments separates
+    them, so bundling them does not change the loading order.
+
+    Returns
+    -------
+        The groups, as lists of `(match, kind, reference)` tuples, for the
+        existing assets.
+    """
+    groups = []
+    end = None
+    for match in re.finditer(TAG_REGEX, html):
+        asset = asset_reference(match)
+        if not asset or not (directory / asset[1]).is_file():
+            end = None
+            continue
+        separator = html[end : match.start()] if end else ''
+        if (
+            end
+            and groups[-1][-1][1] == asset[0]
+            and re.match(SEPARATOR_REGEX, separator, re.DOTALL)
+        ):
+            groups[-1].append((match,) + asset)
+        else:
+            groups.append([(match,) + asset])
+        end = match.end()
+    return groups
+
+
+def rebase_css(css: str, reference: str) -> str:
+    """
+    Rewrite the relative URLs in a CSS file, so they are relative to the
+    presentation directory instead.
+    """
+    base = posixpath.dirname(reference)
+
+    def rebase(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if not is_local(url):
+            return match.group(0)
+        url = posixpath.normpath(posixpath.join(base, url))
+        return 'url(%s%s%s)' % (quote, url, quote)
+
+    return re.sub(URL_REGEX, rebase, css)
+
+
+def bundle_css(sources: List[tuple]) -> str:
+    """
+    Concatenate and minify CSS files.
+
+    `@import` rules are moved to the beginning of the bundle, where they
+    must be.
+    """
+    imports = []
+    bodies = []
+    for reference, css in sources:
+        css = re.sub(r'@charset[^;]*;', '', rebase_css(css, reference))
+        imports.extend(
+            match.group(0) for match in re.finditer(IMPORT_REGEX, css)
+        )
+        bodies.append(re.sub(IMPORT_REGEX, '', css))
+    return minify_css('\n'.join(imports + bodies))
+
+
+def bundle_js(sources: List[tuple]) -> str:
+    """
+    Concatenate JavaScript files.
+
+    Source map comments, which would not match the bundle, are removed.
+    """
+    scripts = [
+        re.sub(SOURCE_MAP_REGEX, '', script, flags=re.M).strip()
+        for _, script in sources
+    ]
+    return '\n;\n'.join(scripts) + '\n'
+
+
+# Bundlers, by kind
+BUNDLERS = {'css': bundle_css, 'js': bundle_js}
+
+
+def minified_reference(reference: str, directory: Path) -> str:
+    """
+    Prefer the minified build of a JavaScript file, if available.
+    """
+    if not reference.endswith('.js') or reference.endswith('.min.js'):
+        return reference
+    minified = reference[: -len('.js')] + '.min.js'
+    return minified if (directory / minified).is_file() else reference
+
+
+def build_bundle(
+    kind: str, references: List[str], directory: Path, config: Config
+) -> Optional[str]:
+    """
+    Build a bundle, or get it from the cache if its inputs did not change.
+
+    Returns
+    -------
+        The bundle content, or `None` if any file is not UTF-8 text.
+    """
+    sources = []
+    digests = []
+    for reference in references:
+        path = directory / minified_reference(reference, directory)
+        content = path.read_bytes()
+        try:
+            sources.append((reference, content.decode('utf')))
+        except UnicodeDecodeError:
+            return None
+        digests.append([reference, sha1(content).hexdigest()])
+    key = json.dumps([BUNDLE_VERSION, kind, digests]).encode('utf')
+    cached = config['local_path'] / BUNDLES_DIRECTORY
+    cached = cached / ('%s.%s' % (sha1(key).hexdigest(), kind))
+    emit('cache', cache='bundle', key=cached.name, hit=cached.exists())
+    if cached.exists():
+        return cached.read_text()
+    bundle = BUNDLERS[kind](sources)
+    write_atomic(cached, bundle.encode('utf'))
+    return bundle
+
+
+def remove_empty_directories(path: Path, directory: Path):
+    """
+    Remove a directory, and its parents up to another one, while empty.
+    """
+    while path != directory:
+        try:
+            path.rmdir()
+        except OSError:
+            return
+        path = path.parent
+
+
+def remove_sources(directory: Path, references: List[str], text: str):
+    """
+    Remove the bundled files which are no longer referenced.
+
+    Parameters
+    ----------
+    directory
+        Directory of the exported presentation.
+    references
+        The files which were bundled, relative to the directory.
+    text
+        Text referencing the presentation files (i.e.: `index.html` and
+        the bundles). Files mentioned in it are kept.
+    """
+    for reference in sorted(set(references)):
+        if reference in text:
+            continue
+        path = directory / reference
+        if path.is_file():
+            path.unlink()
+        remove_empty_directories(path.parent, directory)
+
+
+def bundle_assets(directory: Path, config: Config) -> List[Path]:
+    """
+    Bundle the CSS and JavaScript files referenced by a presentation.
+
+    Consecutive stylesheets and scripts referenced from `index.html` are
+    concatenated (and stylesheets minified) into bundles named after their
+    contents, and the references are replaced by the bundles. Bundles are
+    cached by the hashes of their inputs, so unchanged assets are reused.
+    The bundled files are then removed, unless still referenced.
+
+    Parameters
+    ----------
+    directory
+        Directory of the exported presentation, which is modified in place.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The created bundles.
+    """
+    index = directory / 'index.html'
+    html = index.read_text()
+    bundles = []
+    texts = []
+    sources = []
+    for group in reversed(asset_groups(html, directory)):
+        kind = group[0][1]
+        references = [reference for _, _, reference in group]
+        bundle = build_bundle(kind, references, directory, config)
+        if bundle is None:
+            continue
+        texts.append(bundle)
+        sources.extend(references)
+        sources.extend(minified_reference(r, directory) for r in references)
+        digest = sha1(bundle.encode('utf')).hexdigest()[:16]
+        path = directory / ('bundle-%s.%s' % (digest, kind))
+        path.write_text(bundle)
+        emit('write', path=str(path), bytes=path.stat().st_size)
+        start, end = group[0][0].start(), group[-1][0].end()
+        html = html[:start] + BUNDLE_TAGS[kind] % path.name + html[end:]
+        bundles.append(path)
+    index.write_text(html)
+    remove_sources(directory, sources, '\n'.join([html] + texts))
+    return bundles[::-1]
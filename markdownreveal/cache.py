@@ -0,0 +1,297 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from shutil import rmtree
+from typing import List
+
+from .emoji import EMOJI_DIRECTORY
+from .images import IMAGES_DIRECTORY
+from .locking import cache_lock
+from .locking import file_lock
+from .typing import Config
+
+# Usage index file, within the local directory
+USAGE = 'usage.json'
+
+# Directories holding one cache entry per version (or file)
+VERSIONED_DIRECTORIES = (
+    'revealjs',
+    'katex',
+    'images',
+    'math',
+    'twemoji',
+    'http',
+    'bundles',
+    'templates',
+)
+
+# Output links pointing to cache entries
+OUTPUT_LINKS = ('revealjs', 'katex', 'markdownrevealstyle')
+
+# Downloaded styles are named after the SHA1 hash of their URL
+STYLE_REGEX = r'^[0-9a-f]{40}$'
+
+# Size units, for parsing and formatting
+UNITS = ('B', 'K', 'M', 'G', 'T')
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a human-readable size (i.e.: `500M`, `2G` or `1024`) in bytes.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([BKMGT]?)i?B?\s*$', size, re.I)
+    if not match:
+        raise ValueError('Invalid size: %s' % size)
+    exponent = UNITS.index(match.group(2).upper() or 'B')
+    return int(float(match.group(1)) * 1024**exponent)
+
+
+def format_size(size: int) -> str:
+    """
+    Format a size in bytes in a human-readable way (i.e.: `1.5M`).
+    """
+    exponent = 0
+    while size >= 1024 and exponent < len(UNITS) - 1:
+        size /= 1024
+        exponent += 1
+    if not exponent:
+        return '%dB' % size
+    return '%.1f%s' % (size, UNITS[exponent])
+
+
+def entry_key(localdir: Path, entry: Path) -> str:
+    """
+    Name of a cache entry, relative to the local directory.
+    """
+    return entry.relative_to(localdir).as_posix()
+
+
+def cache_entries(localdir: Path) -> List[Path]:
+    """
+    List the entries in the local cache.
+
+    Each reveal.js, KaTeX and Twemoji version, downloaded style, optimized
+    image, cached HTTP response, asset bundle and baked Pandoc template is
+    an entry that can be removed on its own.
+    """
+    if not localdir.is_dir():
+        return []
+    entries = [
+        path
+        for path in localdir.iterdir()
+        if re.match(STYLE_REGEX, path.name) and path.is_dir()
+    ]
+    for name in VERSIONED_DIRECTORIES:
+        directory = localdir / name
+        if directory.is_dir() and not directory.is_symlink():
+            entries.extend(
+                path
+                for path in directory.iterdir()
+                if not path.name.startswith('.')
+            )
+    return sorted(entries)
+
+
+def entry_size(entry: Path) -> int:
+    """
+    Compute the disk usage of a cache entry, in bytes.
+    """
+    if entry.is_symlink() or not entry.is_dir():
+        return entry.lstat().st_size
+    size = 0
+    for root, _, files in os.walk(str(entry)):
+        size += sum(
+            os.lstat(os.path.join(root, name)).st_size for name in files
+        )
+    return size
+
+
+def remove_entry(entry: Path):
+    """
+    Remove a cache entry from disk.
+    """
+    if entry.is_dir() and not entry.is_symlink():
+        rmtree(str(entry))
+    else:
+        entry.unlink()
+
+
+def read_usage(localdir: Path) -> dict:
+    """
+    Read the usage index of the local cache.
+
+    The index records the last time each entry was used and the entries
+    each known presentation used in its last build.
+    """
+    try:
+        usage = json.loads((localdir / USAGE).read_text())
+    except (OSError, ValueError):
+        usage = {}
+    usage.setdefault('entries', {})
+    usage.setdefault('decks', {})
+    return usage
+
+
+@contextmanager
+def usage_index(localdir: Path):
+    """
+    Read the usage index and atomically write it back after the context.
+    """
+    with file_lock(localdir / '.usage.lock'):
+        usage = read_usage(localdir)
+        yield usage
+        partial = localdir / (USAGE + '.part')
+        partial.write_text(json.dumps(usage, indent=2, sort_keys=True))
+        partial.replace(localdir / USAGE)
+
+
+def link_entry(localdir: Path, link: Path) -> str:
+    """
+    Name of the cache entry a link points to (maybe to a file within it).
+    """
+    parts = link.resolve().relative_to(localdir).parts
+    depth = 2 if parts[0] in VERSIONED_DIRECTORIES else 1
+    return '/'.join(parts[:depth])
+
+
+def linked_entries(config: Config) -> List[str]:
+    """
+    List the cache entries linked from the output directory.
+    """
+    localdir = config['local_path'].resolve()
+    outdir = config['output_path']
+    links = [outdir / name for name in OUTPUT_LINKS]
+    for name in (IMAGES_DIRECTORY, EMOJI_DIRECTORY):
+        if (outdir / name).is_dir():
+            links.extend((outdir / name).iterdir())
+    entries = {
+        link_entry(localdir, link)
+        for link in links
+        if link.is_symlink() and link.exists()
+    }
+    return sorted(entries)
+
+
+def record_usage(markdown_file: Path, config: Config):
+    """
+    Record the cache entries used to build a presentation.
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    config
+        Markdownreveal configuration.
+    """
+    entries = linked_entries(config)
+    now = time.time()
+    with usage_index(config['local_path']) as usage:
+        usage['entries'].update({entry: now for entry in entries})
+        usage['decks'][str(markdown_file.resolve())] = entries
+
+
+def cache_stats(config: Config) -> List[dict]:
+    """
+    Gather statistics about the entries in the local cache.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        A list with the `name`, `size` (in bytes), `used` (last use
+        timestamp) and `decks` (number of known presentations using it) of
+        each entry, sorted from least to most recently used. Entries used
+        before usage was recorded are dated by their modification time.
+    """
+    localdir = config['local_path']
+    usage = read_usage(localdir)
+    stats = []
+    for entry in cache_entries(localdir):
+        name = entry_key(localdir, entry)
+        decks = [d for d in usage['decks'].values() if name in d]
+        used = usage['entries'].get(name, entry.lstat().st_mtime)
+        stats.append(
+            {
+                'name': name,
+                'size': entry_size(entry),
+                'used': used,
+                'decks': len(decks),
+            }
+        )
+    return sorted(stats, key=lambda stat: (stat['used'], stat['name']))
+
+
+def collect_garbage(
+    config: Config, max_size: int = None, max_age: float = None
+) -> List[str]:
+    """
+    Remove the least recently used entries from the local cache.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    max_size
+        Maximum total size of the cache, in bytes.
+    max_age
+        Maximum time, in seconds, since an entry was last used.
+
+    Returns
+    -------
+        The names of the removed entries.
+    """
+    localdir = config['local_path']
+    now = time.time()
+    removed = []
+    with cache_lock(config, shared=False), usage_index(localdir) as usage:
+        stats = cache_stats(config)
+        total = sum(stat['size'] for stat in stats)
+        for stat in stats:
+            too_old = max_age is not None and now - stat['used'] > max_age
+            too_big = max_size is not None and total > max_size
+            if not too_old and not too_big:
+                continue
+            remove_entry(localdir / stat['name'])
+            usage['entries'].pop(stat['name'], None)
+            total -= stat['size']
+            removed.append(stat['name'])
+    return removed
+
+
+def prune_cache(config: Config) -> List[str]:
+    """
+    Remove the cache entries not used by any known presentation.
+
+    Presentations are known once built; those whose Markdown file no longer
+    exists are forgotten.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The names of the removed entries.
+    """
+    localdir = config['local_path']
+    removed = []
+    with cache_lock(config, shared=False), usage_index(localdir) as usage:
+        decks = usage['decks']
+        for deck in [deck for deck in decks if not Path(deck).exists()]:
+            del decks[deck]
+        keep = {entry for entries in decks.values() for entry in entries}
+        for entry in cache_entries(localdir):
+            name = entry_key(localdir, entry)
+            if name in keep:
+                continue
+            remove_entry(entry)
+            usage['entries'].pop(name, None)
+            removed.append(name)
+    return removed
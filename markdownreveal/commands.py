@@ -1,26 +1,68 @@
+import functools
+import os
 import shlex
 import sys
 import threading
+import time
 import webbrowser
 from pathlib import Path
 from shutil import copytree
-from shutil import make_archive
-from shutil import rmtree
 from subprocess import CalledProcessError
 from subprocess import check_output
 from subprocess import run
 from tempfile import TemporaryDirectory
 
 import click
+import requests
 from click_default_group import DefaultGroup
-from livereload import Server
 from tornado.autoreload import add_reload_hook
 from tornado.ioloop import IOLoop
-from watchdog.observers import Observer
 
+from .archive import write_zip
+from .builder import Builder
+from .bundle import bundle_assets
+from .cache import cache_stats
+from .cache import collect_garbage
+from .cache import format_size
+from .cache import parse_size
+from .cache import prune_cache
 from .config import load_config
-from .convert import Handler
 from .convert import generate
+from .convert import run_sync
+from .daemon import Daemon
+from .daemon import DaemonError
+from .daemon import DaemonUnavailable
+from .daemon import request
+from .events import disable
+from .events import emit
+from .events import enable
+from .events import enabled
+from .events import phase
+from .local import ChecksumError
+from .local import clean_localdir
+from .lockfile import lockfile_path
+from .lockfile import update_lockfile
+from .locking import output_lock
+from .remote import fetch_deck
+from .remote import is_exported
+from .remote import is_remote
+from .remote import is_remote_markdown
+from .remote import record_export
+from .server import PREFIX
+from .server import DeckStore
+from .server import make_application
+from .watch import WATCHERS
+from .watch import make_watcher
+
+
+class CommandFailed(click.ClickException):
+    """
+    An external command failed, exiting with its exit code.
+    """
+
+    def __init__(self, error: CalledProcessError):
+        super().__init__(str(error))
+        self.exit_code = error.returncode
 
 
 def shell(command):
@@ -30,6 +72,118 @@ def shell(command):
     return check_output(shlex.split(command)).decode('utf').splitlines()
 
 
+def echo(message: str):
+    """
+    Print a message for the user, which goes to the standard error when the
+    standard output is used for JSON events.
+    """
+    click.echo(message, err=enabled())
+
+
+def run_reported(name: str, function, **params):
+    """
+    Run a command function within a phase, reporting errors as events.
+
+    Failed external commands are reported with their exit code.
+    """
+    try:
+        with phase(name):
+            return function(**params)
+    except CalledProcessError as error:
+        failure = CommandFailed(error)
+    except click.ClickException as error:
+        failure = error
+    emit('error', message=failure.format_message(), code=failure.exit_code)
+    raise failure
+
+
+def json_option(function):
+    """
+    Add a `--json` option to a command, to write its progress to the
+    standard output as a stream of JSON events (see `events`).
+    """
+
+    @click.option(
+        '--json',
+        'json_events',
+        is_flag=True,
+        help='Write progress as a stream of JSON events.',
+    )
+    @functools.wraps(function)
+    def command(json_events: bool = False, **params):
+        if json_events:
+            enable()
+        try:
+            return run_reported(function.__name__, function, **params)
+        finally:
+            disable()
+
+    return command
+
+
+def delegate(config, command, **params):
+    """
+    Run a command in the build daemon, if running.
+
+    Returns
+    -------
+        Whether the daemon ran the command.
+    """
+    try:
+        request(config, command, **params)
+        emit('delegate', command=command)
+    except DaemonUnavailable:
+        return False
+    except DaemonError as error:
+        raise click.ClickException(str(error))
+    return True
+
+
+def export(markdown_file: Path, destination: Path, config):
+    """
+    Generate the presentation and copy the output directory, bundling its
+    CSS and JavaScript files (if enabled with `bundle_assets`).
+
+    The build is delegated to the build daemon, if running.
+    """
+    params = {
+        'markdown_file': str(markdown_file.resolve()),
+        'cwd': os.getcwd(),
+    }
+    if not delegate(config, 'build', export=str(destination), **params):
+        with output_lock(config):
+            generate(markdown_file)
+            copytree(src=str(config['output_path']), dst=str(destination))
+    if config.get('bundle_assets'):
+        with phase('bundle'):
+            bundle_assets(destination, config)
+
+
+def source_file(source: str, config) -> Path:
+    """
+    Get the Markdown file of a presentation, fetching it if remote.
+    """
+    if not is_remote(source):
+        return Path(source)
+    try:
+        return fetch_deck(source, config)
+    except requests.RequestException as error:
+        raise click.ClickException(str(error))
+
+
+def is_up_to_date(source: str, markdown_file: Path, output: Path) -> bool:
+    """
+    Whether a remote presentation did not change since it was exported.
+    """
+    if not is_remote(source):
+        return False
+    exported = is_exported(markdown_file, output)
+    emit('cache', cache='export', key=str(output), hit=exported)
+    if exported:
+        echo('%s is up to date' % output)
+    return exported
+
+
 @click.group(cls=DefaultGroup, default='show')
 @click.version_option(
     prog_name='Markdownreveal', message='%(prog)s %(version)s'
@@ -61,11 +215,20 @@ def cli():
     help='Do not display the warmup slide, even if it exists in the'
     ' style folder (default: false).',
 )
+@click.option(
+    '-w',
+    '--watcher',
+    type=click.Choice(WATCHERS),
+    default=None,
+    help='File watcher backend (default: `watcher` in the configuration).',
+)
+@json_option
 def show(
     markdown_file: Path,
     host: str = 'localhost',
     port: int = 8123,
     no_warmup: bool = False,
+    watcher: str = None,
 ):
     """
     Visualize your presentation (default).
@@ -74,22 +237,32 @@ def show(
     config = load_config()
 
     # Initial generation
-    generate(markdown_file, no_warmup=no_warmup)
+    dependencies = generate(markdown_file, no_warmup=no_warmup, preview=True)
 
-    observer = Observer()
-    url = 'http://{host}:{port}'.format(host=host, port=port)
-    reload_url = url + '/forcereload'
-    ignore_regexes = [r'.*/\.[^/]*']
-    handler = Handler(
-        regexes=['.*'], ignore_regexes=ignore_regexes, ignore_directories=True
+    store = DeckStore()
+    index = config['output_path'] / 'index.html'
+
+    watcher = make_watcher(config, lambda: builder.request(), watcher)
+    builder = Builder(
+        markdown_file,
+        watcher.watch,
+        no_warmup=no_warmup,
+        preview=True,
+        publish=store.publish,
+        metrics=watcher.stats,
     )
-    handler.configure(markdown_file, reload_url)
-    observer.schedule(handler, '.', recursive=True)
-    observer.start()
+    watcher.watch(dependencies)
+    store.publish(index.read_text())
+    watcher.start()
 
-    server = Server()
-    server.root = str(config['output_path'])
-    server.application(port, host, liveport=None, debug=True, live_css=True)
+    application = make_application(
+        store, config['output_path'], config['local_path'], debug=True
+    )
+    application.listen(port, host)
+    url = 'http://{host}:{port}'.format(host=host, port=port)
+    echo(
+        'Presenter view: %s%s/presenter?token=%s' % (url, PREFIX, store.token)
+    )
     threading.Thread(target=webbrowser.open, args=(url,)).start()
     add_reload_hook(lambda: IOLoop.instance().close(all_fds=True))
     IOLoop.instance().start()
@@ -104,6 +277,7 @@ def show(
     default='origin',
     help='Choose a specific remote.',
 )
+@json_option
 def upload(markdown_file: Path, remote: str = 'origin'):
     """
     Upload your presentation.
@@ -113,20 +287,21 @@ def upload(markdown_file: Path, remote: str = 'origin'):
     try:
         shell('git status')
         remote_url = shell('git remote get-url --push ' + remote)[0]
-    except CalledProcessError:
-        return
+    except CalledProcessError as error:
+        raise click.ClickException(
+            'Could not get the URL of the remote "%s": %s' % (remote, error)
+        )
 
     if 'github' not in remote_url:
-        error = 'Uploading only supported for GitHub repositories!'
-        sys.stderr.write(error + '\n')
-        return
+        raise click.ClickException(
+            'Uploading only supported for GitHub repositories!'
+        )
 
     # We copy the directory because `git` does not follow symlinks...
+    config = load_config()
     with TemporaryDirectory() as tmpdir:
         tmpdir = Path(tmpdir) / 'out'
-        generate(markdown_file)
-        config = load_config()
-        copytree(src=str(config['output_path']), dst=str(tmpdir))
+        export(markdown_file, tmpdir, config)
         (tmpdir / '.nojekyll').touch()
 
         worktree = '--work-tree=%s' % tmpdir
@@ -139,24 +314,32 @@ def upload(markdown_file: Path, remote: str = 'origin'):
 
     repo = Path(remote_url.split(':')[-1])
     url = 'https://%s.github.io/%s/' % (repo.parent, repo.stem)
-    sys.stdout.write('Presentation uploaded to:\n\n' + url + '\n\n')
+    emit('upload', url=url)
+    echo('Presentation uploaded to:\n\n' + url + '\n')
 
 
 @cli.command()
 @click.argument('markdown_file')
-def zip(markdown_file: Path):
+@json_option
+def zip(markdown_file: str):
     """
-    Generate a ZIP file with the presentation.
+    Generate a ZIP file with the presentation (which may be a URL).
     """
-    markdown_file = Path(markdown_file)
+    config = load_config()
+    source = markdown_file
+    markdown_file = source_file(source, config)
+    archive = Path(markdown_file.stem + '.zip')
+    if is_up_to_date(source, markdown_file, archive):
+        return
 
-    # We copy the directory because `make_archive` cannot follow symlinks...
+    # The output directory is copied, so it does not change while archived
     with TemporaryDirectory() as tmpdir:
         tmpdir = Path(tmpdir) / 'out'
-        generate(markdown_file)
-        config = load_config()
-        copytree(src=str(config['output_path']), dst=str(tmpdir))
-        make_archive(markdown_file.stem, format='zip', root_dir=str(tmpdir))
+        export(markdown_file, tmpdir, config)
+        write_zip(archive, tmpdir, reproducible=config.get('reproducible'))
+    emit('write', path=str(archive), bytes=archive.stat().st_size)
+    if is_remote(source):
+        record_export(markdown_file, archive)
 
 
 @cli.command()
@@ -168,23 +351,80 @@ def zip(markdown_file: Path):
     default='1920x1080',
     help='Page size (resolution); use 2048x1536 for 4:3.',
 )
+@json_option
 def pdf(markdown_file: str, size: str = '1920x1080'):
     """
-    Generate a PDF file with the presentation.
+    Generate a PDF file with the presentation (which may be a URL).
     """
-    if markdown_file.startswith('http'):
-        presentation = markdown_file
-    else:
-        markdown_file = Path(markdown_file)
-        generate(markdown_file)
-        config = load_config()
-        presentation = config['output_path'] / 'index.html'
-
+    config = load_config()
+    source = markdown_file
     name = 'slides.pdf'
-    command = 'decktape reveal --size={size} {presentation} {name}'.format(
-        size=size, presentation=presentation, name=name
-    )
-    run(shlex.split(command))
+    with output_lock(config):
+        if is_remote(source) and not is_remote_markdown(source):
+            presentation = source
+        else:
+            markdown_file = source_file(source, config)
+            if is_up_to_date(source, markdown_file, Path(name)):
+                return
+            generate(markdown_file)
+            presentation = config['output_path'] / 'index.html'
+
+        command = 'decktape reveal --size={size} {presentation} {name}'
+        command = command.format(
+            size=size, presentation=presentation, name=name
+        )
+        stdout = sys.stderr if enabled() else None
+        with phase('decktape'):
+            run(shlex.split(command), stdout=stdout).check_returncode()
+    emit('write', path=name, bytes=Path(name).stat().st_size)
+    if is_remote_markdown(source):
+        record_export(markdown_file, Path(name))
+
+
+@cli.command()
+@click.argument('markdown_file')
+@click.option(
+    '-n',
+    '--no-warmup',
+    is_flag=True,
+    help='Do not display the warmup slide, even if it exists in the'
+    ' style folder (default: false).',
+)
+@json_option
+def build(markdown_file: str, no_warmup: bool = False):
+    """
+    Generate the presentation (which may be a URL) in the output directory.
+    """
+    config = load_config()
+    markdown_file = source_file(markdown_file, config)
+    params = {
+        'markdown_file': str(markdown_file.resolve()),
+        'cwd': os.getcwd(),
+    }
+    if not delegate(config, 'build', no_warmup=no_warmup, **params):
+        generate(markdown_file, no_warmup=no_warmup)
+    echo(str(config['output_path'] / 'index.html'))
+
+
+@cli.command()
+@click.argument('markdown_file')
+@click.option(
+    '-u',
+    '--update',
+    is_flag=True,
+    help='Resolve the latest versions and download the style again.',
+)
+def lock(markdown_file: str, update: bool = False):
+    """
+    Lock the versions and checksums of the files the presentation uses.
+    """
+    config = load_config()
+    markdown_file = Path(markdown_file)
+    try:
+        update_lockfile(markdown_file, config, update=update)
+    except (ChecksumError, requests.RequestException) as error:
+        raise click.ClickException(str(error))
+    click.echo(str(lockfile_path(markdown_file)))
 
 
 @cli.command()
@@ -193,4 +433,130 @@ def clean():
     Clean local Markdownreveal files.
     """
     config = load_config()
-    rmtree(str(config['local_path']), ignore_errors=True)
+    clean_localdir(config)
+
+
+def size_option(context, parameter, value):
+    """
+    Parse a human-readable size option in bytes.
+    """
+    if value is None:
+        return None
+    try:
+        return parse_size(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+
+@cli.group()
+def cache():
+    """
+    Manage the local cache of downloaded files.
+    """
+
+
+@cache.command()
+def stats():
+    """
+    Show the local cache entries, least recently used first.
+    """
+    config = load_config()
+    entries = cache_stats(config)
+    for entry in entries:
+        used = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['used']))
+        click.echo(
+            '{name:<56} {size:>8}  {used}  {decks} deck(s)'.format(
+                name=entry['name'],
+                size=format_size(entry['size']),
+                used=used,
+                decks=entry['decks'],
+            )
+        )
+    total = format_size(sum(entry['size'] for entry in entries))
+    click.echo('Total: %s in %d entries' % (total, len(entries)))
+
+
+@cache.command()
+@click.option(
+    '--max-size',
+    type=str,
+    default=None,
+    callback=size_option,
+    help='Remove least recently used entries until the cache is smaller'
+    ' than this size (i.e.: 500M, 2G).',
+)
+@click.option(
+    '--max-age',
+    type=float,
+    default=None,
+    help='Remove entries not used in this number of days.',
+)
+def gc(max_size: int = None, max_age: float = None):
+    """
+    Remove least recently used entries from the local cache.
+    """
+    if max_size is None and max_age is None:
+        raise click.UsageError('Specify --max-size and/or --max-age.')
+    if max_age is not None:
+        max_age *= 24 * 60 * 60
+    config = load_config()
+    for name in collect_garbage(config, max_size, max_age):
+        click.echo('Removed %s' % name)
+
+
+@cache.command()
+def prune():
+    """
+    Remove cache entries not used by any known presentation.
+    """
+    config = load_config()
+    for name in prune_cache(config):
+        click.echo('Removed %s' % name)
+
+
+@cli.group()
+def daemon():
+    """
+    Manage the build daemon, used by editor integrations.
+    """
+
+
+@daemon.command()
+def start():
+    """
+    Run the build daemon in the foreground, until stopped.
+    """
+    config = load_config()
+    try:
+        run_sync(Daemon(config).serve())
+    except DaemonError as error:
+        raise click.ClickException(str(error))
+
+
+@daemon.command()
+def stop():
+    """
+    Stop the build daemon.
+    """
+    config = load_config()
+    if not delegate(config, 'stop'):
+        raise click.ClickException('The daemon is not running')
+
+
+@daemon.command()
+def status():
+    """
+    Show the build daemon status.
+    """
+    config = load_config()
+    try:
+        status = request(config, 'status')
+    except DaemonUnavailable:
+        raise click.ClickException('The daemon is not running')
+    click.echo('Running (pid %d) for %ds' % (status['pid'], status['uptime']))
+    for markdown_file, build in sorted(status['builds'].items()):
+        built = time.strftime('%H:%M:%S', time.localtime(build['built']))
+        click.echo(
+            '%s: built at %s in %.2fs'
+            % (markdown_file, built, build['duration'])
+        )
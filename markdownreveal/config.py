@@ -5,6 +5,8 @@ from pathlib import Path
 import yaml
 from pkg_resources import resource_filename
 
+from .style import STYLE_LINK
+from .style import style_config
 from .typing import Config
 
 
@@ -57,10 +59,17 @@ def complete_config(config: Config) -> Config:
     return config
 
 
-def load_config() -> Config:
+def load_config(cwd: Path = None) -> Config:
     """
     Load configuration file template.
 
+    Parameters
+    ----------
+    cwd
+        Directory where the local `config.yaml` file is looked for, and
+        relative paths are resolved from, stored as `working_path` (by
+        default, the current working directory).
+
     Returns
     -------
         The configuration file template.
@@ -71,22 +80,19 @@ def load_config() -> Config:
 
     # Local configuration (load first for style path)
     local_config = {}
-    config_file = Path('config.yaml')
+    config_file = Path(cwd or '.').absolute() / 'config.yaml'
     if config_file.exists():
         local_config = yaml.safe_load(config_file.read_text())
         update_config(config, local_config)
     complete_config(config)
 
     # Style configuration
-    style_config = {}
-    config_file = config['output_path'] / 'markdownrevealstyle' / 'config.yaml'
-    if config_file.exists():
-        style_config = yaml.safe_load(config_file.read_text())
-        update_config(config, style_config)
+    update_config(config, style_config(config['output_path'] / STYLE_LINK))
     complete_config(config)
 
     # Local configuration (override style configuration)
     update_config(config, local_config)
     complete_config(config)
+    config['working_path'] = config_file.parent
 
     return config
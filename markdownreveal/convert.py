@@ -1,24 +1,70 @@
+import asyncio
+import json
+import re
+from asyncio.subprocess import PIPE
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import LooseVersion
+from hashlib import sha1
+from io import StringIO
+from pathlib import Path
+from subprocess import DEVNULL
+from subprocess import CalledProcessError
 from subprocess import check_output
-from sys import platform
-from threading import Timer
+from typing import Callable
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
 
-import requests
-from pypandoc import convert_text
+from pypandoc import get_pandoc_path
 from pypandoc import get_pandoc_version
-from watchdog.events import RegexMatchingEventHandler
 
+from .cache import record_usage
 from .config import load_config
+from .dependencies import deck_dependencies
+from .dependencies import html_references
+from .emoji import EMOJI_DIRECTORY
+from .emoji import EmojiRenderer
+from .emoji import initialize_twemoji
+from .events import emit
+from .events import phase
+from .images import IMAGES_DIRECTORY
+from .images import optimize_images
+from .katex import KatexRenderer
 from .local import initialize_localdir
-from .tweak import tweak_html
+from .lockfile import LOCKFILE
+from .lockfile import load_lock
+from .locking import async_output_lock
+from .locking import output_lock
+from .native import UnsupportedMarkdown
+from .native import render_markdown
+from .slides import MANIFEST
+from .slides import SlideScanner
+from .slides import update_manifest
+from .style import STYLE_KEYS
+from .tweak import SLIDE_REGEX
+from .tweak import find_indexes
+from .tweak import find_style_file
+from .tweak import split_slides
+from .tweak import tweak_html_chunk
+from .tweak import tweak_html_slide
+from .tweak import tweak_template
 from .typing import Config
 
-if platform == 'linux':
-    from watchdog.observers.inotify_buffer import InotifyBuffer
+# Maximum line length when streaming Pandoc output (i.e.: inline images)
+STREAM_LIMIT = 2**28
 
-    # Reduce watchdog default buffer delay for faster response times
-    InotifyBuffer.delay = 0.1
+# Paragraph marking where the slides go in native preview skeletons
+NATIVE_MARKER = 'MARKDOWNREVEALNATIVESLIDES'
+
+# Default Pandoc templates, indexed by Pandoc path
+_templates = {}
+
+# Conversion profiles, indexed by configuration
+_profiles = {}
+
+# Background writes of published presentations, in order
+_persistence = ThreadPoolExecutor(max_workers=1)
 
 
 def pandoc_extra_to_args(config: Config) -> List[str]:
@@ -63,65 +109,195 @@ def reveal_extra_to_args(config: Config) -> List[str]:
     return arguments
 
 
-def markdown_to_reveal(text: str, config: Config) -> str:
+def katex_to_args(config: Config) -> List[str]:
     """
-    Transform a Markdown input file to an HTML (reveal.js) output string.
+    Transform KaTeX configuration options into Pandoc arguments.
 
     Parameters
     ----------
-    markdown_text
-        Markdown text to convert to HTML.
     config
         Markdownreveal configuration.
 
     Returns
     -------
-        The converted string.
+        A list with all the Pandoc arguments.
+    """
+    if not config['katex']:
+        return []
+    pandoc_version = get_pandoc_version()
+    if LooseVersion(pandoc_version) < LooseVersion('2.0'):
+        return [
+            '--katex=katex/katex.min.js',
+            '--katex-stylesheet=katex/katex.min.css',
+        ]
+    return ['--katex=katex/']
+
+
+def pandoc_command(config: Config) -> List[str]:
+    """
+    Build the Pandoc command to convert Markdown into reveal.js HTML.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The command, as a list of arguments, reading Markdown from the
+        standard input (unless input files are appended) and writing HTML
+        to the standard output.
     """
-    extra_args = ['-s', '--slide-level=2', '-V', 'revealjs-url=revealjs']
-    if config['katex']:
-        pandoc_version = get_pandoc_version()
-        if LooseVersion(pandoc_version) < LooseVersion('2.0'):
-            extra_args.extend(
-                [
-                    '--katex=katex/katex.min.js',
-                    '--katex-stylesheet=katex/katex.min.css',
-                ]
-            )
-        else:
-            extra_args.extend(['--katex=katex/'])
-    extra_args.extend(pandoc_extra_to_args(config))
-    extra_args.extend(reveal_extra_to_args(config))
     input_format = 'markdown'
     if config['emoji_codes']:
         input_format += '+emoji'
-    output = convert_text(
-        source=text, format=input_format, to='revealjs', extra_args=extra_args
-    )
+    command = [get_pandoc_path(), '--from=' + input_format, '--to=revealjs']
+    command.extend(['-s', '--slide-level=2', '-V', 'revealjs-url=revealjs'])
+    command.extend(katex_to_args(config))
+    command.extend(pandoc_extra_to_args(config))
+    command.extend(reveal_extra_to_args(config))
+    return command
 
-    # HTML substitution
-    output = tweak_html(output, config)
 
-    return output
+def default_template() -> Optional[str]:
+    """
+    Get the default Pandoc reveal.js template.
+
+    Returns
+    -------
+        The template text, or `None` if Pandoc can not provide it.
+    """
+    pandoc = get_pandoc_path()
+    if pandoc not in _templates:
+        try:
+            output = check_output([pandoc, '-D', 'revealjs'], stderr=DEVNULL)
+            _templates[pandoc] = output.decode('utf')
+        except (OSError, CalledProcessError):
+            _templates[pandoc] = None
+    return _templates[pandoc]
+
+
+def bake_template(config: Config) -> Optional[Path]:
+    """
+    Write a Pandoc template with the page-level tweaks already applied.
 
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
 
-def generate(markdown_file, no_warmup=False):
+    Returns
+    -------
+        The path of the template, named after its contents, or `None` if
+        the user provided a custom template or the default template is not
+        available.
     """
-    Generate Markdownreveal project.
+    template = default_template()
+    if template is None or 'template' in config['pandoc_extra']:
+        return None
+    text = tweak_template(template, config)
+    name = '%s.revealjs' % sha1(text.encode('utf')).hexdigest()
+    path = config['local_path'] / 'templates' / name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix('.part')
+        partial.write_text(text)
+        partial.replace(path)
+    return path
+
+
+class ConversionProfile:
     """
-    # Reload config
-    config = load_config()
+    Pandoc command and template, prepared once per effective configuration.
 
-    # If the --no-warmup option was specified, do not generate the warmup slide
-    # The 'no_warmup' key in the config makes the tweak_html_warmup function
-    # return None, skipping the slide generation
-    config['no_warmup'] = no_warmup
+    The command only depends on the configuration and the Pandoc version,
+    and the page-level tweaks (header, footer, logo, custom CSS and warmup
+    slide) are baked into a custom Pandoc template, so only per-slide
+    tweaks are left to post-process the Pandoc output.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.template = bake_template(config)
+        self.command = pandoc_command(config)
+        if self.template:
+            self.command.append('--template=%s' % self.template)
+        self.native = supports_native_preview(config)
+        self.skeletons = {}
+
+    def is_valid(self) -> bool:
+        """
+        Whether the profile files still exist (i.e.: after a cleanup).
+        """
+        return not self.template or self.template.exists()
 
-    # Initialize localdir
-    initialize_localdir(config)
+    def tweak(self, html: List[str]) -> List[str]:
+        """
+        Tweak a chunk of lines (usually a slide) of the Pandoc output.
+        """
+        if self.template:
+            return tweak_html_slide(html, self.config)
+        return tweak_html_chunk(html, self.config)
+
+
+def supports_native_preview(config: Config) -> bool:
+    """
+    Whether previews can be rendered with the native Markdown renderer.
 
-    # rsync
-    command = [
+    The native renderer mimics Pandoc 3 output and does not support extra
+    Pandoc options.
+    """
+    if not config.get('native_preview') or any(
+        config['pandoc_extra'].values()
+    ):
+        return False
+    return LooseVersion(get_pandoc_version()) >= LooseVersion('3.0')
+
+
+def conversion_profile(config: Config) -> ConversionProfile:
+    """
+    Get the conversion profile for a configuration.
+
+    Profiles are cached by configuration and available style files, which
+    are baked into the template.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The conversion profile.
+    """
+    styles = [str(find_style_file(key, config)) for key in STYLE_KEYS]
+    key = json.dumps([config, styles], sort_keys=True, default=str)
+    profile = _profiles.get(key)
+    if not profile or not profile.is_valid():
+        profile = _profiles[key] = ConversionProfile(config)
+    return profile
+
+
+def clear_caches():
+    """
+    Forget the cached Pandoc templates and conversion profiles, so they are
+    prepared again on the next conversion (i.e.: after updating Pandoc).
+    """
+    _templates.clear()
+    _profiles.clear()
+
+
+def rsync_command(markdown_file: Path, config: Config) -> List[str]:
+    """
+    Build the command to synchronize the presentation directory with the
+    output directory.
+    """
+    return [
         'rsync',
         '--delete',
         '--exclude',
@@ -131,46 +307,466 @@ def generate(markdown_file, no_warmup=False):
         '--exclude',
         'markdownrevealstyle',
         '--exclude',
+        IMAGES_DIRECTORY,
+        '--exclude',
+        EMOJI_DIRECTORY,
+        '--exclude',
+        MANIFEST,
+        '--exclude',
+        LOCKFILE,
+        '--exclude',
         '.git',
         '-av',
         '%s/' % markdown_file.resolve().parent,
         '%s/' % config['output_path'],
     ]
-    check_output(command)
 
-    # Convert from markdown
-    output = markdown_to_reveal(markdown_file.read_text(), config)
 
-    # Write index.html
-    index = config['output_path'] / 'index.html'
-    index.write_text(output)
+async def run_command(
+    command: List[str], stdin: bytes = None, cwd: Path = None
+) -> bytes:
+    """
+    Execute a command asynchronously and return its output.
+
+    Parameters
+    ----------
+    command
+        The command to execute, as a list of arguments.
+    stdin
+        Data to send to the process standard input.
+    cwd
+        Directory to run the command in (by default, the current working
+        directory).
+
+    Returns
+    -------
+        The standard output of the process.
+
+    Raises
+    ------
+    CalledProcessError
+        If the process exits with a non-zero status.
+
+    Notes
+    -----
+    If the coroutine is cancelled, the process is killed before propagating
+    the cancellation.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=PIPE, stdout=PIPE, stderr=PIPE, cwd=cwd
+    )
+    try:
+        stdout, stderr = await process.communicate(stdin)
+    finally:
+        await reap(process)
+    if process.returncode:
+        raise CalledProcessError(process.returncode, command, stdout, stderr)
+    return stdout
+
+
+async def reap(process):
+    """
+    Kill a process, if still running, and wait for it to terminate.
+    """
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def stream_lines(stream, callback):
+    """
+    Read a stream line by line, passing each decoded line to a coroutine
+    function.
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        await callback(line.decode('utf').rstrip('\n'))
+
+
+class SlideWriter:
+    """
+    Tweak HTML lines slide by slide and write them to a file as they flow,
+    finding the local file references and the slides on the way.
+
+    Parameters
+    ----------
+    output
+        Text file to write the tweaked HTML to.
+    profile
+        Conversion profile used to generate the HTML.
+    math
+        Renderer to pre-render math formulas with, if any.
+    """
+
+    def __init__(
+        self, output, profile: ConversionProfile, math: KatexRenderer = None
+    ):
+        self.output = output
+        self.profile = profile
+        self.config = profile.config
+        self.math = math
+        self.emoji = EmojiRenderer(self.config)
+        self.chunk = []
+        self.references = []
+        self.slides = SlideScanner()
+
+    async def feed(self, line: str):
+        if self.chunk and re.search(SLIDE_REGEX, line):
+            await self.flush()
+        self.chunk.append(line)
+
+    async def flush(self):
+        chunk = self.profile.tweak(self.chunk)
+        if self.math:
+            chunk = await self.math.render_html(chunk)
+        self.references.extend(html_references('\n'.join(chunk)))
+        optimize_images(chunk, self.config)
+        if self.emoji.pending(chunk):
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, initialize_twemoji, self.config)
+        chunk = self.emoji.render_html(chunk)
+        html = '\n'.join(chunk) + '\n'
+        self.output.write(html)
+        self.slides.feed(html)
+        self.chunk = []
+
+
+async def stream_command(command: List[str], callback, cwd: Path = None):
+    """
+    Execute a command asynchronously, passing each output line to a
+    coroutine function as soon as it is available. The command is run in
+    `cwd`, if provided.
+
+    Raises
+    ------
+    CalledProcessError
+        If the process exits with a non-zero status.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=PIPE, stderr=PIPE, limit=STREAM_LIMIT, cwd=cwd
+    )
+    stderr = asyncio.ensure_future(process.stderr.read())
+    try:
+        await stream_lines(process.stdout, callback)
+        if await process.wait():
+            raise CalledProcessError(
+                process.returncode, command, None, await stderr
+            )
+    finally:
+        stderr.cancel()
+        await reap(process)
+
+
+async def native_skeleton(profile: ConversionProfile, metadata: str):
+    """
+    Get the page around the slides, as generated by Pandoc, for some
+    document metadata.
+
+    Skeletons are cached in the profile, so Pandoc only runs again when the
+    metadata (i.e.: the title block) changes.
+
+    Returns
+    -------
+        The lines before and after the slides, or `None` if the skeleton
+        could not be found in the Pandoc output.
+    """
+    if metadata not in profile.skeletons:
+        text = '%s\n\n%s\n' % (metadata, NATIVE_MARKER)
+        output = await run_command(
+            profile.command,
+            text.encode('utf'),
+            cwd=profile.config.get('working_path'),
+        )
+        profile.skeletons[metadata] = split_skeleton(output.decode('utf'))
+    return profile.skeletons[metadata]
+
+
+def split_skeleton(html: str):
+    """
+    Split a Pandoc page around the slide holding the native marker.
+    """
+    lines = html.splitlines()
+    marker = '<p>%s</p>' % NATIVE_MARKER
+    if marker not in lines:
+        return None
+    index = lines.index(marker)
+    start = max(find_indexes(lines[:index], SLIDE_REGEX), default=None)
+    end = index + lines[index:].index('</section>')
+    if start is None:
+        return None
+    return lines[:start], lines[end + 1 :]
+
+
+async def native_lines(
+    markdown_file: Path, profile: ConversionProfile
+) -> Optional[List[str]]:
+    """
+    Render a Markdown file with the native renderer.
+
+    Returns
+    -------
+        The HTML lines of the page, or `None` if the file uses features
+        the native renderer does not support.
+    """
+    text = markdown_file.read_text(encoding='utf')
+    try:
+        metadata, slides = render_markdown(text, profile.config['emoji_codes'])
+    except UnsupportedMarkdown:
+        return None
+    skeleton = await native_skeleton(profile, metadata)
+    if not skeleton:
+        return None
+    return skeleton[0] + slides + skeleton[1]
+
+
+async def render_file(
+    markdown_file: Path, output, config: Config, preview: bool = False
+) -> Tuple[List[str], List[dict]]:
+    """
+    Transform a Markdown file to HTML (reveal.js), streaming it to a text
+    file object.
+
+    Returns
+    -------
+        The local file references and the slides (see `SlideScanner`)
+        found in the generated HTML.
+    """
+    profile = conversion_profile(config)
+    lines = None
+    if preview and profile.native:
+        lines = await native_lines(markdown_file, profile)
+    async with KatexRenderer(config) as math:
+        writer = SlideWriter(output, profile, math)
+        if lines is None:
+            command = profile.command + [str(markdown_file)]
+            await stream_command(
+                command, writer.feed, cwd=config.get('working_path')
+            )
+        else:
+            for line in lines:
+                await writer.feed(line)
+        await writer.flush()
+    return writer.references, writer.slides.slides
 
 
-def generate_and_reload(markdown_file, reload_url):
+def write_output(output_file: Path, html: str, config: Config):
     """
-    Generate Markdownreveal project and reload web browser view.
+    Atomically write a generated HTML file, holding the output lock.
     """
-    generate(markdown_file)
-    requests.get(reload_url)
+    partial = output_file.with_name(output_file.name + '.part')
+    with output_lock(config):
+        partial.write_text(html)
+        partial.replace(output_file)
 
 
-class Handler(RegexMatchingEventHandler):
-    def configure(self, markdown_file, reload_url, period=0.1):
-        self.markdown_file = markdown_file
-        self.reload_url = reload_url
-        self.period = period
-        self.timer = None
-        self.set_timer()
+async def convert_file(
+    markdown_file: Path,
+    output_file: Path,
+    config: Config,
+    preview: bool = False,
+    publish: Callable[[str], None] = None,
+) -> List[str]:
+    """
+    Transform a Markdown file to an HTML (reveal.js) file, streaming.
 
-    def on_any_event(self, event):
-        if self.timer.is_alive():
-            return
-        self.set_timer()
-        self.timer.start()
+    The HTML is written to a temporary file as it flows, which then
+    replaces the output file, so readers never find a partial file. The
+    slide manifest is updated next to it (see `update_manifest`).
 
-    def set_timer(self):
-        self.timer = Timer(
-            self.period,
-            generate_and_reload,
-            args=(self.markdown_file, self.reload_url),
+    Parameters
+    ----------
+    markdown_file
+        Markdown file to convert.
+    output_file
+        HTML file to write.
+    config
+        Markdownreveal configuration.
+    preview
+        Whether the output is a live preview, which may be rendered with
+        the native Markdown renderer (if enabled with `native_preview`)
+        instead of Pandoc. Pandoc is used if the file uses unsupported
+        features.
+    publish
+        If provided, a function to publish the generated HTML to directly
+        (i.e.: to serve it from memory). The output file is then written in
+        the background, only for persistence.
+
+    Returns
+    -------
+        The local file references found in the generated HTML.
+    """
+    if publish:
+        output = StringIO()
+        references, slides = await render_file(
+            markdown_file, output, config, preview
+        )
+        html = output.getvalue()
+        update_manifest(
+            markdown_file,
+            slides,
+            output_file.parent,
+            reproducible=config.get('reproducible'),
         )
+        publish(html)
+        emit('write', path=str(output_file), bytes=len(html.encode('utf')))
+        loop = asyncio.get_event_loop()
+        loop.run_in_executor(
+            _persistence, write_output, output_file, html, config
+        )
+        return references
+    partial = output_file.with_name(output_file.name + '.part')
+    try:
+        with partial.open('w') as output:
+            references, slides = await render_file(
+                markdown_file, output, config, preview
+            )
+        update_manifest(
+            markdown_file,
+            slides,
+            output_file.parent,
+            reproducible=config.get('reproducible'),
+        )
+        partial.replace(output_file)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    emit('write', path=str(output_file), bytes=output_file.stat().st_size)
+    return references
+
+
+def run_sync(coroutine):
+    """
+    Run a coroutine to completion in a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+async def convert(text: str, config: Config) -> str:
+    """
+    Asynchronously transform Markdown text to an HTML (reveal.js) string.
+
+    Parameters
+    ----------
+    text
+        Markdown text to convert to HTML.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The converted string.
+    """
+    profile = conversion_profile(config)
+    output = await run_command(
+        profile.command, text.encode('utf'), cwd=config.get('working_path')
+    )
+
+    # HTML substitution
+    chunks = split_slides(output.decode('utf').splitlines())
+    return '\n'.join('\n'.join(profile.tweak(chunk)) for chunk in chunks)
+
+
+def markdown_to_reveal(text: str, config: Config) -> str:
+    """
+    Transform a Markdown input file to an HTML (reveal.js) output string.
+
+    Parameters
+    ----------
+    markdown_text
+        Markdown text to convert to HTML.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The converted string.
+    """
+    return run_sync(convert(text, config))
+
+
+async def build(
+    markdown_file: Path,
+    no_warmup: bool = False,
+    preview: bool = False,
+    publish: Callable[[str], None] = None,
+    cwd: Path = None,
+) -> Set[Path]:
+    """
+    Asynchronously generate Markdownreveal project.
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    no_warmup
+        Whether to skip the warmup slide generation.
+    preview
+        Whether the presentation is generated for a live preview, which
+        allows using the native Markdown renderer.
+    publish
+        If provided, a function to publish the generated HTML to directly
+        (see `convert_file`).
+    cwd
+        Directory the presentation is built from, where the local
+        `config.yaml` file is looked for and relative paths are resolved
+        from (by default, the current working directory).
+
+    Returns
+    -------
+        The set of files the generated presentation depends on.
+    """
+    # Reload config
+    config = load_config(cwd)
+    markdown_file = config['working_path'] / markdown_file
+
+    # If the --no-warmup option was specified, do not generate the warmup slide
+    # The 'no_warmup' key in the config makes the tweak_html_warmup function
+    # return None, skipping the slide generation
+    config['no_warmup'] = no_warmup
+
+    async with async_output_lock(config):
+        # Initialize localdir (blocking downloads run in the default executor)
+        loop = asyncio.get_event_loop()
+        with phase('install'):
+            await loop.run_in_executor(None, load_lock, markdown_file, config)
+            await loop.run_in_executor(None, initialize_localdir, config)
+
+        # rsync
+        with phase('rsync'):
+            await run_command(rsync_command(markdown_file, config))
+
+        # Convert from markdown, writing index.html as the HTML flows
+        index = config['output_path'] / 'index.html'
+        with phase('convert'):
+            references = await convert_file(
+                markdown_file, index, config, preview=preview, publish=publish
+            )
+        record_usage(markdown_file, config)
+
+    return deck_dependencies(markdown_file, references, config)
+
+
+def generate(
+    markdown_file: Path,
+    no_warmup: bool = False,
+    preview: bool = False,
+    cwd: Path = None,
+) -> Set[Path]:
+    """
+    Generate Markdownreveal project.
+
+    Returns
+    -------
+        The set of files the generated presentation depends on.
+    """
+    return run_sync(
+        build(markdown_file, no_warmup=no_warmup, preview=preview, cwd=cwd)
+    )
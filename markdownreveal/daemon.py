@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from shutil import copytree
+
+from .config import load_config
+from .convert import build
+from .convert import clear_caches
+from .convert import convert
+from .locking import async_output_lock
+from .slides import read_manifest
+from .typing import Config
+
+# Unix socket the daemon listens on, within the local directory
+SOCKET = 'daemon.sock'
+
+
+class DaemonUnavailable(OSError):
+    """
+    The build daemon is not running.
+    """
+
+
+class DaemonError(RuntimeError):
+    """
+    The build daemon failed to process a request.
+    """
+
+
+def socket_path(config: Config) -> Path:
+    """
+    Path of the Unix socket the build daemon listens on.
+    """
+    return config['local_path'] / SOCKET
+
+
+def send(config: Config, message: dict) -> bytes:
+    """
+    Send a message to the build daemon and read the response line.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(str(socket_path(config)))
+        except OSError as error:
+            raise DaemonUnavailable(str(error))
+        client.sendall(json.dumps(message).encode('utf') + b'\n')
+        with client.makefile('rb') as stream:
+            return stream.readline()
+    finally:
+        client.close()
+
+
+def request(config: Config, command: str, **params):
+    """
+    Send a request to the build daemon and wait for its response.
+
+    Requests and responses are single lines of JSON: requests have a
+    `command` and its parameters, and responses either a `result` or an
+    `error`.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    command
+        The command to run (`build`, `status`, `invalidate`, `render-slide`,
+        `slides` or `stop`).
+    params
+        The command parameters.
+
+    Returns
+    -------
+        The result of the command.
+
+    Raises
+    ------
+    DaemonUnavailable
+        If the daemon is not running.
+    DaemonError
+        If the daemon failed to run the command.
+    """
+    line = send(config, dict(params, command=command))
+    if not line:
+        raise DaemonError('The daemon closed the connection')
+    response = json.loads(line.decode('utf'))
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    return response['result']
+
+
+class Daemon:
+    """
+    Long-running build server, listening for requests on a Unix socket.
+
+    Keeping a single process warm avoids paying the Python start-up, and
+    preparing the Pandoc command and template, on each build. Requests are
+    run for the working directory of the client (where the `config.yaml`
+    file is looked for), which is passed down to the build instead of
+    changing the daemon directory, and are run one at a time.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    """
+
+    def __init__(self, config: Config):
+        self.path = socket_path(config)
+        self.started = time.time()
+        self.builds = {}
+        self.lock = None
+        self.stopped = None
+
+    async def serve(self):
+        """
+        Serve requests until the `stop` command is received.
+        """
+        if self.path.exists():
+            self.check_stale()
+        self.lock = asyncio.Lock()
+        self.stopped = asyncio.Event()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        server = await asyncio.start_unix_server(self.handle, str(self.path))
+        try:
+            await self.stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            if self.path.exists():
+                self.path.unlink()
+
+    def check_stale(self):
+        """
+        Remove the socket left by a daemon that did not exit cleanly.
+
+        Raises
+        ------
+        DaemonError
+            If another daemon is running.
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.path))
+        except OSError:
+            self.path.unlink()
+            return
+        finally:
+            probe.close()
+        raise DaemonError('The daemon is already running')
+
+    async def handle(self, reader, writer):
+        try:
+            message = json.loads((await reader.readline()).decode('utf'))
+            response = {'result': await self.dispatch(message)}
+        except Exception as error:
+            response = {'error': str(error) or repr(error)}
+        writer.write(json.dumps(response).encode('utf') + b'\n')
+        await writer.drain()
+        writer.close()
+
+    async def dispatch(self, message: dict):
+        """
+        Run the method implementing a command with the given parameters.
+        """
+        command = message.pop('command', '')
+        method = getattr(self, 'do_' + command.replace('-', '_'), None)
+        if not method:
+            raise ValueError('Unknown command: %s' % command)
+        return await method(**message)
+
+    async def do_build(
+        self,
+        markdown_file: str,
+        cwd: str,
+        no_warmup: bool = False,
+        export: str = None,
+    ) -> list:
+        """
+        Generate a presentation and, optionally, copy the output directory.
+
+        Returns
+        -------
+            The files the presentation depends on.
+        """
+        cwd = Path(cwd)
+        markdown_file = cwd / markdown_file
+        async with self.lock:
+            start = time.time()
+            config = load_config(cwd)
+            async with async_output_lock(config):
+                dependencies = await build(markdown_file, no_warmup, cwd=cwd)
+                if export:
+                    copytree(str(config['output_path']), str(cwd / export))
+            self.builds[str(markdown_file.resolve())] = {
+                'built': time.time(),
+                'duration': time.time() - start,
+            }
+        return sorted(str(path) for path in dependencies)
+
+    async def do_render_slide(self, markdown: str, cwd: str) -> str:
+        """
+        Convert a Markdown snippet (i.e.: a single slide) to HTML.
+        """
+        async with self.lock:
+            return await convert(markdown, load_config(Path(cwd)))
+
+    async def do_slides(self, cwd: str) -> dict:
+        """
+        Read the slide manifest of the last build (see `update_manifest`).
+        """
+        async with self.lock:
+            return read_manifest(load_config(Path(cwd))['output_path'])
+
+    async def do_status(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'builds': self.builds,
+        }
+
+    async def do_invalidate(self):
+        """
+        Forget cached templates and profiles (i.e.: after updating Pandoc).
+        """
+        clear_caches()
+
+    async def do_stop(self):
+        self.stopped.set()
@@ -0,0 +1,140 @@
+import os
+import re
+from pathlib import Path
+from typing import List
+from typing import Set
+from urllib.parse import unquote
+
+from .style import STYLE_KEYS
+from .typing import Config
+
+# HTML attributes that may reference local files
+REFERENCE_REGEX = (
+    r'(?:src|href|poster|data-src|data-background'
+    r'(?:-image|-video|-iframe)?)="([^"#?]+)'
+)
+
+# Output directories populated from the local cache, not from the deck
+CACHED_DIRECTORIES = ('katex', 'revealjs', 'markdownrevealstyle')
+
+
+def html_references(html: str) -> List[str]:
+    """
+    Find local file references in an HTML string.
+
+    Parameters
+    ----------
+    html
+        HTML text to search for references.
+
+    Returns
+    -------
+        The referenced paths, relative to the HTML file, in order of
+        appearance. Remote URLs and cached assets are excluded.
+    """
+    references = []
+    for reference in re.findall(REFERENCE_REGEX, html):
+        if re.match(r'^([a-z]+:|/)', reference):
+            continue
+        if Path(reference).parts[0] in CACHED_DIRECTORIES:
+            continue
+        references.append(unquote(reference))
+    return references
+
+
+def pandoc_dependencies(config: Config) -> Set[Path]:
+    """
+    Find local files referenced from Pandoc extra arguments.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The files (i.e.: included headers, templates, bibliographies...)
+        Pandoc reads when converting the presentation.
+    """
+    dependencies = set()
+    directory = config.get('working_path', Path.cwd())
+    for value in config['pandoc_extra'].values():
+        if not isinstance(value, str):
+            continue
+        path = directory / value
+        if path.is_file():
+            dependencies.add(path.resolve())
+    return dependencies
+
+
+def style_dependencies(deck_path: Path, config: Config) -> Set[Path]:
+    """
+    List the local style files that may be used in the presentation.
+
+    Parameters
+    ----------
+    deck_path
+        Directory where the presentation Markdown file is located.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The style files, whether they exist or not, as their creation
+        should trigger a new build too.
+    """
+    style_path = deck_path / config['style_path']
+    return {style_path / config[key] for key in STYLE_KEYS}
+
+
+def deck_dependencies(
+    markdown_file: Path, references: List[str], config: Config
+) -> Set[Path]:
+    """
+    Compute the set of files a presentation build depends on.
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    references
+        The local file references found in the generated HTML output.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        Absolute paths of the files that, if modified, require rebuilding
+        the presentation.
+    """
+    markdown_file = markdown_file.resolve()
+    deck_path = markdown_file.parent
+    config_file = config.get('working_path', Path.cwd()) / 'config.yaml'
+    dependencies = {markdown_file, config_file}
+    dependencies.update(pandoc_dependencies(config))
+    dependencies.update(style_dependencies(deck_path, config))
+    for reference in references:
+        dependencies.add(Path(os.path.normpath(str(deck_path / reference))))
+    return dependencies
+
+
+def watched_directories(dependencies: Set[Path]) -> Set[Path]:
+    """
+    Find the directories that need to be watched to track dependencies.
+
+    Parameters
+    ----------
+    dependencies
+        Absolute paths of the dependencies.
+
+    Returns
+    -------
+        The closest existing directory for each dependency.
+    """
+    directories = set()
+    for dependency in dependencies:
+        directory = dependency.parent
+        while not directory.is_dir():
+            directory = directory.parent
+        directories.add(directory)
+    return directories
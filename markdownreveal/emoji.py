@@ -0,0 +1,221 @@
+import re
+from html import escape
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import requests
+
+from .images import link_variant
+from .local import extraction_profile
+from .local import install_project
+from .typing import Config
+
+# Output directory where the Twemoji images used are linked from
+EMOJI_DIRECTORY = 'markdownrevealemoji'
+
+# Characters which may be displayed as emoji (only those with a Twemoji
+# image are replaced), when followed by the emoji variation selector
+EMOJI_CHARACTER = (
+    '[\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u21aa\u231a-\u23ff'
+    '\u24c2\u25aa-\u27bf\u2934\u2935\u2b05-\u2b55\u3030\u303d\u3297\u3299'
+    '\U0001f000-\U0001faff]'
+)
+
+# Characters displayed as emoji by default, unless followed by the text
+# variation selector (i.e.: not `©` nor `™`, which are text by default)
+EMOJI_PRESENTATION = (
+    '[\u231a\u231b\u23e9-\u23ec\u23f0\u23f3\u25fd\u25fe\u2614\u2615'
+    '\u2648-\u2653\u267f\u2693\u26a1\u26aa\u26ab\u26bd\u26be\u26c4\u26c5'
+    '\u26ce\u26d4\u26ea\u26f2\u26f3\u26f5\u26fa\u26fd\u2705\u270a\u270b'
+    '\u2728\u274c\u274e\u2753-\u2755\u2757\u2795-\u2797\u27b0\u27bf'
+    '\u2b1b\u2b1c\u2b50\u2b55\U0001f000-\U0001faff]'
+)
+
+# Variation selector, skin tone modifiers and tags
+EMOJI_MODIFIER = '[\ufe0f\U0001f3fb-\U0001f3ff\U000e0020-\U000e007f]'
+
+# Flags, keycaps and (possibly joined) emoji presentation sequences
+EMOJI_REGEX = (
+    '[\U0001f1e6-\U0001f1ff]{2}'
+    '|[#*0-9]\ufe0f?\u20e3'
+    '|(?:%(presentation)s(?!\ufe0e)|%(char)s\ufe0f)%(modifier)s*'
+    '(?:\u200d%(char)s%(modifier)s*)*'
+    % {
+        'presentation': EMOJI_PRESENTATION,
+        'char': EMOJI_CHARACTER,
+        'modifier': EMOJI_MODIFIER,
+    }
+)
+
+# Markup where emoji must not be replaced by images: tags, comments and the
+# contents of elements which can only hold text
+MARKUP_REGEX = (
+    r'<(?P<tag>script|style|title|textarea|math)\b.*?</(?P=tag)\s*>'
+    r'|<!--.*?-->'
+    r'|<[^>]*>'
+)
+
+# Emoji in the text, or markup which must be kept as it is
+TEXT_EMOJI_REGEX = '(?P<markup>%s)|%s' % (MARKUP_REGEX, EMOJI_REGEX)
+
+# Twemoji image, as inserted by `twemoji.parse()`
+IMAGE = '<img class="emoji" draggable="false" alt="%s" src="%s" />'
+
+# Twemoji installations (local directory and version) which failed, and are
+# not retried by this process
+_unavailable = set()
+
+
+def emoji_names(emoji: str) -> List[str]:
+    """
+    Get the candidate Twemoji image names of an emoji, in order.
+
+    Twemoji names images after the code points of the emoji, without the
+    variation selector unless the emoji is a joined sequence.
+    """
+    stripped = emoji.replace('\ufe0f', '')
+    if '\u200d' not in emoji:
+        emoji = stripped
+    names = ['-'.join('%x' % ord(char) for char in emoji)]
+    if stripped != emoji:
+        names.append('-'.join('%x' % ord(char) for char in stripped))
+    return [name + '.svg' for name in names]
+
+
+def contains_emoji(html: List[str]) -> bool:
+    """
+    Whether a list of HTML lines has emoji in the text (not in the markup).
+    """
+    matches = re.finditer(TEXT_EMOJI_REGEX, '\n'.join(html), flags=re.S)
+    return any(not match.group('markup') for match in matches)
+
+
+def install_twemoji(config: Config) -> Path:
+    """
+    Install the Twemoji images in the local directory, if not installed.
+
+    Returns
+    -------
+        Path of the directory with the SVG images.
+    """
+    project_path = install_project(
+        github='jdecked/twemoji',
+        localdir=config['local_path'],
+        project_version=config['twemoji_version'],
+        name='twemoji',
+        download_url='https://github.com/{project}/archive/{version}.tar.gz',
+        profile=extraction_profile('twemoji', config),
+    )
+    return project_path / 'assets' / 'svg'
+
+
+def twemoji_key(config: Config) -> Tuple[str, str]:
+    """
+    Identify a Twemoji installation by local directory and version.
+    """
+    return (str(config['local_path']), config['twemoji_version'])
+
+
+def twemoji_unavailable(config: Config) -> bool:
+    """
+    Whether installing Twemoji already failed in this process.
+    """
+    return twemoji_key(config) in _unavailable
+
+
+def initialize_twemoji(config: Config) -> Optional[Path]:
+    """
+    Install the Twemoji images, if enabled, when the first emoji is found
+    (see `EmojiRenderer.pending`).
+
+    The directory with the images is stored in the configuration, as
+    `twemoji_path`, for `EmojiRenderer` to use. If Twemoji cannot be
+    downloaded, emoji are kept as they are, and the installation is not
+    retried by this process (i.e.: on each rebuild while offline).
+
+    Returns
+    -------
+        Path of the directory with the SVG images, if available.
+    """
+    if not config.get('twemoji') or twemoji_unavailable(config):
+        return None
+    try:
+        images = install_twemoji(config)
+    except (OSError, requests.RequestException):
+        _unavailable.add(twemoji_key(config))
+        return None
+    config['twemoji_path'] = images
+    return images
+
+
+class EmojiRenderer:
+    """
+    Replace emoji by Twemoji images, so they look the same in all browsers.
+
+    Twemoji is only installed when needed (see `pending`), and only the
+    images used are linked from the output directory. If Twemoji is not
+    available, emoji are kept as they are and displayed with the fonts
+    available in the browser.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.enabled = bool(config.get('twemoji'))
+
+    def pending(self, html: List[str]) -> bool:
+        """
+        Whether Twemoji must be installed (see `initialize_twemoji`) before
+        rendering a list of HTML lines, because they have emoji.
+        """
+        if not self.enabled or twemoji_unavailable(self.config):
+            return False
+        images = self.config.get('twemoji_path')
+        if images and images.is_dir():
+            return False
+        return contains_emoji(html)
+
+    def image(self, emoji: str) -> Optional[str]:
+        """
+        Get the Twemoji image of an emoji.
+
+        Returns
+        -------
+            The image HTML, or `None` if there is no image for the emoji.
+        """
+        for name in emoji_names(emoji):
+            path = self.config['twemoji_path'] / name
+            if path.exists():
+                reference = link_variant(path, self.config, EMOJI_DIRECTORY)
+                return IMAGE % (escape(emoji), reference)
+        return None
+
+    def render_html(self, html: List[str]) -> List[str]:
+        """
+        Replace the emoji in a list of HTML lines by Twemoji images.
+
+        Parameters
+        ----------
+        html
+            List of HTML lines, usually a single slide.
+
+        Returns
+        -------
+            The new list of HTML lines.
+        """
+        if not self.enabled or not self.config.get('twemoji_path'):
+            return html
+
+        def replace(match):
+            if match.group('markup'):
+                return match.group(0)
+            return self.image(match.group(0)) or match.group(0)
+
+        text = '\n'.join(html)
+        return re.sub(TEXT_EMOJI_REGEX, replace, text, flags=re.S).split('\n')
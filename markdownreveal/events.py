@@ -0,0 +1,86 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TextIO
+
+# Stream where events are written, if enabled
+_stream = None
+_lock = threading.Lock()
+
+
+def enable(stream: TextIO = None):
+    """
+    Write events to a stream (by default, the standard output).
+    """
+    global _stream
+    _stream = stream or sys.stdout
+
+
+def disable():
+    """
+    Stop writing events.
+    """
+    global _stream
+    _stream = None
+
+
+def enabled() -> bool:
+    """
+    Whether events are being written.
+    """
+    return _stream is not None
+
+
+def emit(event: str, **fields):
+    """
+    Write an event as a line of JSON, if enabled. This function is
+    thread-safe.
+
+    Parameters
+    ----------
+    event
+        The event type (i.e.: `phase_start`, `cache` or `write`).
+    fields
+        Details about the event, which must be serializable as JSON.
+    """
+    if _stream is None:
+        return
+    fields = dict(fields, event=event, time=time.time())
+    line = json.dumps(fields, sort_keys=True, default=str)
+    with _lock:
+        _stream.write(line + '\n')
+        _stream.flush()
+
+
+@contextmanager
+def phase(name: str, **fields):
+    """
+    Emit events when a phase starts and finishes.
+
+    The `phase_finish` event has the `duration` of the phase, in seconds,
+    and its `status`, which is `error` if the phase raised an exception.
+
+    Parameters
+    ----------
+    name
+        Name of the phase (i.e.: `convert`).
+    fields
+        Details about the phase, added to both events.
+    """
+    emit('phase_start', phase=name, **fields)
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        duration = time.perf_counter() - start
+        emit(
+            'phase_finish',
+            phase=name,
+            status=status,
+            duration=duration,
+            **fields
+        )
@@ -0,0 +1,169 @@
+import re
+from hashlib import sha1
+from pathlib import Path
+from typing import List
+from urllib.parse import unquote
+
+from .tweak import SLIDE_REGEX
+from .typing import Config
+
+# Output directory where the optimized image variants are linked from
+IMAGES_DIRECTORY = 'markdownrevealimages'
+
+# Image formats that can be resized and transcoded
+RASTER_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# Attributes referencing images that may be replaced by optimized variants
+IMAGE_REGEX = r'(<img [^>]*?src=|data-background(?:-image)?=)"([^"]+)"'
+
+# Image sources to lazy-load
+LAZY_REGEX = r'(<img [^>]*?)(?<![-\w])src='
+
+# Content hashes, indexed by file path, modification time and size
+_hashes = {}
+
+
+def content_hash(path: Path) -> str:
+    """
+    Compute the SHA1 hash of a file contents.
+
+    Hashes are cached in memory while the file is not modified.
+
+    Parameters
+    ----------
+    path
+        Path of the file.
+
+    Returns
+    -------
+        The hexadecimal digest.
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_mtime, stat.st_size)
+    if key not in _hashes:
+        _hashes[key] = sha1(path.read_bytes()).hexdigest()
+    return _hashes[key]
+
+
+def image_variant(source: Path, cache: Path, width: int, quality: int) -> Path:
+    """
+    Create (or reuse) a resized WebP variant of an image.
+
+    Parameters
+    ----------
+    source
+        Path of the original image.
+    cache
+        Directory where variants are stored, named after the content hash
+        of the original image and the optimization parameters.
+    width
+        Maximum width of the variant, in pixels.
+    quality
+        WebP quality, from 0 to 100.
+
+    Returns
+    -------
+        The path of the variant.
+    """
+    name = '%s-%s-%s.webp' % (content_hash(source), width, quality)
+    variant = cache / name
+    if variant.exists():
+        return variant
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError(
+            'Image optimization requires Pillow; install it with '
+            '`pip install markdownreveal[images]`'
+        )
+    cache.mkdir(parents=True, exist_ok=True)
+    partial = variant.with_suffix('.part')
+    with Image.open(str(source)) as image:
+        image.thumbnail((width, image.height))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.save(str(partial), format='WEBP', quality=quality)
+    partial.replace(variant)
+    return variant
+
+
+def optimized_reference(reference: str, config: Config) -> str:
+    """
+    Get the reference to the optimized variant of an image.
+
+    Parameters
+    ----------
+    reference
+        Image reference, relative to the output directory.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The reference to the variant, or the original reference if the
+        image can not be optimized or the variant would not be smaller.
+    """
+    if re.match(r'^([a-z]+:|/)', reference):
+        return reference
+    source = config['output_path'] / unquote(reference)
+    if source.suffix.lower() not in RASTER_SUFFIXES or not source.is_file():
+        return reference
+    variant = image_variant(
+        source,
+        config['local_path'] / 'images',
+        config['optimize_images_width'],
+        config['optimize_images_quality'],
+    )
+    if variant.stat().st_size >= source.stat().st_size:
+        return reference
+    return link_variant(variant, config)
+
+
+def link_variant(
+    variant: Path, config: Config, directory: str = IMAGES_DIRECTORY
+) -> str:
+    """
+    Link an image variant from a directory within the output directory.
+
+    Returns
+    -------
+        The reference to the link, relative to the output directory.
+    """
+    link = config['output_path'] / directory / variant.name
+    if not link.exists():
+        # The variant may have been removed from the cache
+        if link.is_symlink():
+            link.unlink()
+        link.parent.mkdir(exist_ok=True)
+        link.symlink_to(variant)
+    return '%s/%s' % (directory, variant.name)
+
+
+def optimize_images(html: List[str], config: Config) -> None:
+    """
+    Replace image references by optimized variants and lazy-load them.
+
+    Images within slides are lazy-loaded by reveal.js (`data-src`), so
+    off-screen slides do not fetch them up front. Backgrounds are always
+    lazy-loaded by reveal.js.
+
+    Parameters
+    ----------
+    html
+        List of HTML lines, usually a single slide. It is modified in place.
+    config
+        Markdownreveal configuration.
+    """
+    if not config['optimize_images']:
+        return
+
+    def replace(match):
+        reference = optimized_reference(match.group(2), config)
+        return '%s"%s"' % (match.group(1), reference)
+
+    lazy = bool(html) and re.search(SLIDE_REGEX, html[0])
+    for index, line in enumerate(html):
+        line = re.sub(IMAGE_REGEX, replace, line)
+        if lazy:
+            line = re.sub(LAZY_REGEX, r'\1data-src=', line)
+        html[index] = line
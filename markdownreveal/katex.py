@@ -0,0 +1,281 @@
+import asyncio
+import json
+import re
+from hashlib import sha1
+from html import unescape
+from pathlib import Path
+from shutil import which
+from subprocess import PIPE
+from typing import List
+from typing import Optional
+
+from .images import content_hash
+from .typing import Config
+
+# KaTeX scripts that can be loaded with Node.js, in order of preference
+KATEX_SCRIPTS = ('katex.min.js', 'katex.js')
+
+# Math formulas, as written by Pandoc with `--katex`
+MATH_REGEX = r'<span\s+class="math (inline|display)">(.*?)</span>'
+
+# Math delimiters written by Pandoc < 3
+DELIMITERS_REGEX = r'^\\[(\[](.*)\\[)\]]$'
+
+# Client-side rendering scripts, not required once everything is rendered
+SOURCE_REGEX = r'<script[^>]*src="[^"]*katex[^"]*\.js"[^>]*></script>'
+SCRIPTS_REGEX = (
+    r'\s*%s|\s*<script>(?:(?!</script>).)*katex\.render\(.*?</script>'
+    % SOURCE_REGEX
+)
+
+# Maximum time, in seconds, to render the formulas of a slide before falling
+# back to rendering them in the browser
+KATEX_TIMEOUT = 10
+
+# Maximum length of a response from the rendering process
+RESPONSE_LIMIT = 2**28
+
+# Formulas defining macros, which are shared with any later formula
+DEFINITION_REGEX = r'\\(gdef|xdef|def|global|newcommand|renewcommand)\b'
+
+# Render batches of formulas read as JSON lines from the standard input, with
+# the same options Pandoc uses for client-side rendering
+RENDER_SCRIPT = """
+const katex = require(process.argv[1]);
+const macros = {};
+require('readline').createInterface({input: process.stdin})
+  .on('line', function(line) {
+    const html = JSON.parse(line).map(function([tex, display]) {
+      return katex.renderToString(tex, {
+        displayMode: display, throwOnError: false, macros: macros, fleqn: false
+      });
+    });
+    process.stdout.write(JSON.stringify(html) + '\\n');
+  });
+"""
+
+# Client-side rendering of the formulas which could not be pre-rendered
+FALLBACK_SCRIPT = r"""<script>
+document.addEventListener("DOMContentLoaded", function () {
+  var macros = {};
+  var elements = document.querySelectorAll('span.math');
+  for (var i = 0; i < elements.length; i++) {
+    if (elements[i].querySelector('.katex')) {
+      continue;
+    }
+    var tex = elements[i].textContent.replace(
+      /^\\[(\[]([\s\S]*)\\[)\]]$/, '$1');
+    katex.render(tex, elements[i], {
+      displayMode: elements[i].classList.contains('display'),
+      throwOnError: false, macros: macros, fleqn: false
+    });
+  }
+});
+</script>"""
+
+
+def katex_script(config: Config) -> Optional[Path]:
+    """
+    Find the KaTeX script to pre-render math with.
+
+    Returns
+    -------
+        The path of the script, or `None` if math pre-rendering is disabled
+        or not available (i.e.: Node.js is not installed).
+    """
+    if not config['katex'] or not config.get('katex_prerender'):
+        return None
+    if not which('node'):
+        return None
+    for name in KATEX_SCRIPTS:
+        path = config['output_path'] / 'katex' / name
+        if path.is_file():
+            return path.resolve()
+    return None
+
+
+def parse_formula(kind: str, tex: str) -> list:
+    """
+    Get the TeX source and whether to render in display mode of a formula,
+    as written by Pandoc.
+    """
+    tex = re.sub(DELIMITERS_REGEX, r'\1', unescape(tex), flags=re.S)
+    return [tex, kind == 'display']
+
+
+class KatexRenderer:
+    """
+    Pre-render math formulas to static HTML (and MathML) with KaTeX.
+
+    Formulas are rendered by a Node.js process, started on demand, and
+    cached by their TeX source, so only new or changed formulas are
+    rendered, in a single batch per slide. Formulas are rendered in order
+    with shared macros, as KaTeX does in the browser: once a formula
+    defines a macro, the cache is bypassed for the rest of the
+    presentation.
+
+    If a batch is not rendered in time (see `katex_timeout`), pre-rendering
+    stops and the formulas left are rendered in the browser instead.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    """
+
+    def __init__(self, config: Config):
+        self.script = katex_script(config)
+        self.timeout = config.get('katex_timeout', KATEX_TIMEOUT)
+        self.process = None
+        self.stateful = False
+        self.scripts = []
+        if self.script:
+            version = content_hash(self.script)
+            self.cache = config['local_path'] / 'math' / version
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.script)
+
+    async def close(self):
+        """
+        Stop the Node.js process, if running.
+        """
+        if self.process:
+            self.process.stdin.close()
+            if self.process.returncode is None:
+                self.process.kill()
+            await self.process.wait()
+            self.process = None
+
+    async def run(self, formulas: List[list]) -> List[str]:
+        """
+        Render a batch of formulas with the Node.js process.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            If the formulas are not rendered in time.
+        RuntimeError
+            If the process exited.
+        """
+        if not self.process:
+            self.process = await asyncio.create_subprocess_exec(
+                'node',
+                '-e',
+                RENDER_SCRIPT,
+                str(self.script),
+                stdin=PIPE,
+                stdout=PIPE,
+                limit=RESPONSE_LIMIT,
+            )
+        request = json.dumps(formulas) + '\n'
+
+        async def exchange():
+            self.process.stdin.write(request.encode('utf'))
+            await self.process.stdin.drain()
+            return await self.process.stdout.readline()
+
+        response = await asyncio.wait_for(exchange(), self.timeout)
+        if not response:
+            raise RuntimeError('KaTeX rendering failed')
+        return json.loads(response.decode('utf'))
+
+    def cache_path(self, tex: str, display: bool) -> Optional[Path]:
+        """
+        Path of the cached rendering of a formula, or `None` if it must not
+        be cached (i.e.: macros were defined).
+        """
+        self.stateful |= bool(re.search(DEFINITION_REGEX, tex))
+        if self.stateful:
+            return None
+        key = json.dumps([tex, display]).encode('utf')
+        return self.cache / ('%s.html' % sha1(key).hexdigest())
+
+    async def render(self, formulas: List[list]) -> List[str]:
+        """
+        Render formulas, using the cache when possible.
+
+        Parameters
+        ----------
+        formulas
+            TeX source and whether to render in display mode, for each
+            formula, in order.
+
+        Returns
+        -------
+            The rendered HTML of each formula.
+        """
+        paths = [self.cache_path(tex, display) for tex, display in formulas]
+        rendered = [
+            path.read_text() if path and path.exists() else None
+            for path in paths
+        ]
+        pending = [i for i, html in enumerate(rendered) if html is None]
+        if not pending:
+            return rendered
+        results = await self.run([formulas[i] for i in pending])
+        for i, html in zip(pending, results):
+            rendered[i] = html
+            if paths[i]:
+                self.cache.mkdir(parents=True, exist_ok=True)
+                partial = paths[i].with_suffix('.part')
+                partial.write_text(html)
+                partial.replace(paths[i])
+        return rendered
+
+    def fall_back(self, text: str) -> List[str]:
+        """
+        Stop pre-rendering, so formulas are rendered in the browser instead.
+
+        The KaTeX scripts removed so far are added back, with a script
+        rendering the formulas which were not pre-rendered.
+        """
+        self.script = None
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+        if self.scripts:
+            text = '\n'.join(self.scripts + [FALLBACK_SCRIPT, text])
+        return text.split('\n')
+
+    async def render_html(self, html: List[str]) -> List[str]:
+        """
+        Pre-render all the math formulas in a list of HTML lines.
+
+        Client-side rendering scripts are removed too.
+
+        Parameters
+        ----------
+        html
+            List of HTML lines, usually a single slide.
+
+        Returns
+        -------
+            The new list of HTML lines.
+        """
+        if not self.enabled:
+            return html
+
+        text = '\n'.join(html)
+        self.scripts.extend(re.findall(SOURCE_REGEX, text))
+        text = re.sub(SCRIPTS_REGEX, '', text, flags=re.S)
+        formulas = [
+            parse_formula(kind, tex)
+            for kind, tex in re.findall(MATH_REGEX, text, flags=re.S)
+        ]
+        try:
+            rendered = iter(await self.render(formulas))
+        except (asyncio.TimeoutError, OSError, RuntimeError, ValueError):
+            return self.fall_back(text)
+
+        def replace(match):
+            kind = match.group(1)
+            return '<span class="math %s">%s</span>' % (kind, next(rendered))
+
+        return re.sub(MATH_REGEX, replace, text, flags=re.S).split('\n')
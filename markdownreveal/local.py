@@ -1,16 +1,148 @@
+import json
 import os
 import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 from hashlib import sha1
+from hashlib import sha256
 from pathlib import Path
-from urllib.request import urlretrieve
+from shutil import rmtree
+from tempfile import mkdtemp
+from typing import List
+from typing import Optional
 
 import requests
 
+from .events import emit
+from .locking import LOCKS_DIRECTORY
+from .locking import cache_lock
+from .locking import install_lock
+from .locking import output_lock
+from .style import compile_style
+from .style import read_package
 from .typing import Config
 from .typing import TarMembers
 
+# Network settings for downloads
+TIMEOUT = 30
+RETRIES = 5
+CHUNK_SIZE = 2**16
 
-def latest_project_release(github: str) -> str:
+# Files required at runtime for each project, as `fnmatch` patterns
+PROFILES = {
+    'revealjs': [
+        'LICENSE',
+        'README.md',
+        'package.json',
+        # reveal.js >= 4.0
+        'dist/*.css',
+        'dist/*.js',
+        'dist/theme/{theme}.css',
+        'dist/theme/fonts/*',
+        # reveal.js < 4.0
+        'css/reveal.css',
+        'css/reset.css',
+        'css/theme/{theme}.css',
+        'css/print/*',
+        'js/reveal.js',
+        'lib/*',
+        # Plugins used by Pandoc
+        'plugin/math/*',
+        'plugin/notes/*',
+        'plugin/search/*',
+        'plugin/zoom/*',
+        'plugin/zoom-js/*',
+    ],
+    'katex': [
+        'LICENSE',
+        'README.md',
+        'katex.js',
+        'katex.min.js',
+        'katex.min.css',
+        'contrib/*',
+        'fonts/*',
+    ],
+    'twemoji': ['LICENSE-GRAPHICS', 'assets/svg/*'],
+}
+
+# Projects installed in the local directory, with their GitHub name, the
+# setting with their version and their download URL
+PROJECTS = {
+    'revealjs': {
+        'github': 'hakimel/reveal.js',
+        'setting': 'reveal_version',
+        'url': 'https://github.com/{project}/archive/{version}.tar.gz',
+    },
+    'katex': {
+        'github': 'Khan/KaTeX',
+        'setting': 'katex_version',
+        'url': 'https://github.com/{project}/releases/download/{version}/'
+        'katex.tar.gz',
+    },
+}
+
+# Name of the file, within each installed directory, describing its contents
+MANIFEST = '.manifest.json'
+
+
+class ChecksumError(ValueError):
+    """
+    A downloaded file does not match its expected checksum.
+    """
+
+
+def file_checksum(path: Path) -> str:
+    """
+    Compute the SHA256 checksum of a file.
+    """
+    digest = sha256()
+    with path.open('rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def locked_checksum(lock: dict, name: str, key: str, value: str) -> str:
+    """
+    Get the checksum of a project in the lock of a presentation.
+
+    Parameters
+    ----------
+    lock
+        The lock of the presentation (see `markdownreveal.lockfile`).
+    name
+        Name of the project (i.e.: `revealjs` or `style`).
+    key
+        The locked property which identifies the installation (`version` or
+        `url`).
+    value
+        The value of that property for this build.
+
+    Returns
+    -------
+        The checksum, or `None` if the project is not locked with that value.
+    """
+    entry = lock.get(name, {})
+    if entry.get(key) != value:
+        return None
+    return entry.get('sha256')
+
+
+def create_session() -> requests.Session:
+    """
+    Create an HTTP session with a connection pool shared among downloads.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def latest_project_release(
+    github: str, session: requests.Session = requests
+) -> str:
     """
     Fetch the latest project release tag.
 
@@ -18,18 +150,116 @@ def latest_project_release(github: str) -> str:
     ----------
     github
         The name of the GitHub project.
+    session
+        HTTP session to use for the request.
 
     Notes
     -----
     For now, only GitHub projects are supported.
     """
-    response = requests.get(
-        'https://github.com/%s/releases/latest' % github, allow_redirects=True
+    response = session.get(
+        'https://github.com/%s/releases/latest' % github,
+        allow_redirects=True,
+        timeout=TIMEOUT,
     )
     return response.url.split('/')[-1]
 
 
-def clean_tar_members(members: TarMembers) -> TarMembers:
+def download_chunks(session: requests.Session, url: str, path: Path):
+    """
+    Download a file in chunks, resuming a previous partial download.
+
+    Parameters
+    ----------
+    session
+        HTTP session to use for the request.
+    url
+        URL to download.
+    path
+        Path of the (possibly partial) downloaded file.
+    """
+    size = path.stat().st_size if path.exists() else 0
+    headers = {'Range': 'bytes=%d-' % size} if size else {}
+    response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    with response:
+        if response.status_code == 416:
+            return
+        response.raise_for_status()
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        with path.open(mode) as output:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                output.write(chunk)
+
+
+def download(session: requests.Session, url: str, path: Path):
+    """
+    Download a file, retrying and resuming on network failures.
+
+    Parameters
+    ----------
+    session
+        HTTP session to use for the requests.
+    url
+        URL to download.
+    path
+        Path where to store the downloaded file.
+    """
+    partial = path.with_name(path.name + '.part')
+    for attempt in range(RETRIES):
+        try:
+            download_chunks(session, url, partial)
+            break
+        except requests.exceptions.RequestException:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(2**attempt * 0.1)
+    partial.replace(path)
+    emit('download', url=url, bytes=path.stat().st_size)
+
+
+def clean_tar_member(
+    member: tarfile.TarInfo, profile: List[str] = None
+) -> Optional[tarfile.TarInfo]:
+    """
+    Strip .tar components (i.e.: remove top-level directory) from a member.
+
+    Parameters
+    ----------
+    member
+        A .tar member.
+    profile
+        If provided, a list of `fnmatch` patterns; members not matching any
+        of them are discarded.
+
+    Returns
+    -------
+        The member with the stripped components, or `None` if it should not
+        be extracted.
+    """
+    path = Path(member.name)
+    if path.is_absolute():
+        raise NotImplementedError('Please, report this unexpected error!')
+    parts = path.parts[1:]
+    if not parts:
+        return None
+    if parts[0] == 'test':
+        return None
+    member.name = str(Path(*parts))
+    if profile is not None and not matches_profile(member.name, profile):
+        return None
+    return member
+
+
+def matches_profile(name: str, profile: List[str]) -> bool:
+    """
+    Check whether a file name matches any of the patterns of a profile.
+    """
+    return any(fnmatch(name, pattern) for pattern in profile)
+
+
+def clean_tar_members(
+    members: TarMembers, profile: List[str] = None
+) -> TarMembers:
     """
     Strip .tar components (i.e.: remove top-level directory) from members.
 
@@ -37,24 +267,245 @@ def clean_tar_members(members: TarMembers) -> TarMembers:
     ----------
     members
         A list of .tar members.
+    profile
+        If provided, a list of `fnmatch` patterns; members not matching any
+        of them are discarded.
 
     Returns
     -------
         A clean .tar member list with the stripped components.
     """
-    clean = []
-    for member in members:
-        path = Path(member.name)
-        if path.is_absolute():
-            raise NotImplementedError('Please, report this unexpected error!')
-        parts = path.parts[1:]
-        if not parts:
-            continue
-        if parts[0] == 'test':
-            continue
-        member.name = str(Path(*parts))
-        clean.append(member)
-    return clean
+    clean = [clean_tar_member(member, profile) for member in members]
+    return [member for member in clean if member]
+
+
+def extraction_profile(name: str, config: Config) -> Optional[List[str]]:
+    """
+    Get the extraction profile of a project.
+
+    Parameters
+    ----------
+    name
+        The name of the local downloaded project.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The list of `fnmatch` patterns of the files to extract, or `None`
+        if all files should be extracted.
+    """
+    if not config.get('prune_assets') or name not in PROFILES:
+        return None
+    return [pattern.format(**config) for pattern in PROFILES[name]]
+
+
+def read_manifest(path: Path) -> dict:
+    """
+    Read the manifest of an installed directory.
+
+    Directories installed without manifest are considered complete.
+    """
+    manifest = path / MANIFEST
+    if not manifest.exists():
+        return {'profile': None}
+    return json.loads(manifest.read_text())
+
+
+def is_installed(path: Path, profile: List[str] = None) -> bool:
+    """
+    Check whether a directory is installed with, at least, the files
+    defined by an extraction profile.
+
+    Parameters
+    ----------
+    path
+        Path of the installed directory.
+    profile
+        The extraction profile, or `None` for a complete installation.
+    """
+    if not path.exists():
+        return False
+    installed = read_manifest(path)['profile']
+    if installed is None:
+        return True
+    return profile is not None and set(profile) <= set(installed)
+
+
+def extract_members(
+    tarball: Path, path: Path, profile: List[str] = None
+) -> List[str]:
+    """
+    Extract the clean members of a .tar file, streaming, into a directory.
+
+    Returns
+    -------
+        The names of the extracted members.
+    """
+    names = []
+    with tarfile.open(str(tarball), mode='r|*') as tar:
+        for member in tar:
+            if clean_tar_member(member, profile):
+                tar.extract(member, str(path))
+                names.append(member.name)
+    return names
+
+
+def replace_directory(source: Path, destination: Path):
+    """
+    Rename a directory, replacing the destination if it already exists.
+    """
+    previous = destination.with_name('.%s.previous' % destination.name)
+    rmtree(str(previous), ignore_errors=True)
+    if destination.exists():
+        os.rename(str(destination), str(previous))
+    os.rename(str(source), str(destination))
+    rmtree(str(previous), ignore_errors=True)
+
+
+def extract(
+    tarball: Path,
+    path: Path,
+    profile: List[str] = None,
+    source: dict = None,
+):
+    """
+    Atomically extract a .tar file into a directory.
+
+    Members are extracted while streaming the file into a temporary
+    directory, which is then renamed, so a partial extraction is never
+    mistaken for a complete one. A manifest with the extraction profile and
+    the extracted files is written in the directory.
+
+    Parameters
+    ----------
+    tarball
+        Path of the .tar file.
+    path
+        Path of the directory to create with the extracted contents.
+    profile
+        If provided, a list of `fnmatch` patterns of the files to extract.
+    source
+        Details about the origin of the .tar file (i.e.: its `url` and
+        `sha256` checksum) to record in the manifest.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmpdir = Path(mkdtemp(dir=str(path.parent), prefix='.' + path.name))
+    try:
+        names = extract_members(tarball, tmpdir, profile)
+        manifest = dict(source or {}, profile=profile, files=names)
+        (tmpdir / MANIFEST).write_text(json.dumps(manifest, indent=2))
+        replace_directory(tmpdir, path)
+    finally:
+        rmtree(str(tmpdir), ignore_errors=True)
+
+
+def install(
+    session: requests.Session,
+    url: str,
+    path: Path,
+    profile: List[str] = None,
+    checksum: str = None,
+) -> str:
+    """
+    Download a .tar file and extract it into a directory.
+
+    Parameters
+    ----------
+    session
+        HTTP session to use for the requests.
+    url
+        URL of the .tar file to download.
+    path
+        Path of the directory to create with the extracted contents.
+    profile
+        If provided, a list of `fnmatch` patterns of the files to extract.
+    checksum
+        If provided, the expected SHA256 checksum of the .tar file.
+
+    Returns
+    -------
+        The SHA256 checksum of the .tar file, which is also recorded in the
+        manifest of the directory.
+
+    Raises
+    ------
+    ChecksumError
+        If the .tar file does not match the expected checksum.
+    """
+    tarball = path.parent / ('.%s.tar' % path.name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    download(session, url, tarball)
+    try:
+        actual = file_checksum(tarball)
+        if checksum and actual != checksum:
+            raise ChecksumError(
+                'Checksum mismatch for %s: expected %s, got %s'
+                % (url, checksum, actual)
+            )
+        extract(tarball, path, profile, {'url': url, 'sha256': actual})
+    finally:
+        os.remove(str(tarball))
+    return actual
+
+
+def install_project(
+    github: str,
+    localdir: Path,
+    project_version: str,
+    name: str,
+    download_url: str,
+    session: requests.Session = None,
+    profile: List[str] = None,
+    checksum: str = None,
+) -> Path:
+    """
+    Install the specified project in the local directory, if not installed.
+
+    Parameters
+    ----------
+    github
+        The name of the GitHub project.
+    localdir
+        Path to store local files.
+    project_version
+        String with the project version to use (i.e.: `3.0.1`). The value
+        `latest` is also allowed.
+    name
+        A name for the local downloaded project.
+    download_url
+        URL to download the project from. In example:
+        `'https://github.com/{project}/archive/{version}.tar.gz'`
+    session
+        HTTP session to use for the requests.
+    profile
+        If provided, a list of `fnmatch` patterns of the files to extract.
+        Files from previous installations of the same version are kept.
+    checksum
+        If provided, the expected SHA256 checksum of the downloaded file.
+
+    Returns
+    -------
+        Path of the installed project.
+
+    Notes
+    -----
+    For now, only GitHub projects are supported.
+    """
+    project_path = localdir / name / project_version
+    with install_lock(localdir, project_path):
+        installed = is_installed(project_path, profile)
+        emit('cache', cache='install', key=name, hit=installed)
+        if not installed:
+            session = session or create_session()
+            if project_version == 'latest':
+                project_version = latest_project_release(github, session)
+            download_url = download_url.format(
+                project=github, version=project_version
+            )
+            profile = merge_profile(project_path, profile)
+            install(session, download_url, project_path, profile, checksum)
+    return project_path
 
 
 def initialize_localdir_project(
@@ -64,6 +515,9 @@ def initialize_localdir_project(
     project_version: str,
     name: str,
     download_url: str,
+    session: requests.Session = None,
+    profile: List[str] = None,
+    checksum: str = None,
 ) -> Path:
     """
     Initialize local directory with the specified project.
@@ -85,32 +539,56 @@ def initialize_localdir_project(
     download_url
         URL to download the project from. In example:
         `'https://github.com/{project}/archive/{version}.tar.gz'`
+    session
+        HTTP session to use for the requests.
+    profile
+        If provided, a list of `fnmatch` patterns of the files to extract.
+        Files from previous installations of the same version are kept.
+    checksum
+        If provided, the expected SHA256 checksum of the downloaded file.
 
     Notes
     -----
     For now, only GitHub projects are supported.
     """
-    # Download project
-    project_path = localdir / name / project_version
-    if not project_path.exists():
-        if project_version == 'latest':
-            project_version = latest_project_release(github=github)
-        download_url = download_url.format(
-            project=github, version=project_version
-        )
-        reveal_tar, headers = urlretrieve(download_url)
-        with tarfile.open(reveal_tar) as tar:
-            members = clean_tar_members(tar.getmembers())
-            tar.extractall(str(project_path), members)
-        os.remove(reveal_tar)
+    project_path = install_project(
+        github=github,
+        localdir=localdir,
+        project_version=project_version,
+        name=name,
+        download_url=download_url,
+        session=session,
+        profile=profile,
+        checksum=checksum,
+    )
     symlink = outdir / name
-    if symlink.exists():
+    if symlink.is_symlink() or symlink.exists():
         symlink.unlink()
     symlink.symlink_to(project_path, target_is_directory=True)
 
 
+def merge_profile(path: Path, profile: List[str] = None) -> List[str]:
+    """
+    Merge an extraction profile with the profile of an installed directory.
+    """
+    if profile is None or not path.exists():
+        return profile
+    return sorted(set(profile) | set(read_manifest(path)['profile']))
+
+
+def style_directory(localdir: Path, style_url: str) -> Path:
+    """
+    Path of the directory where a style is installed.
+    """
+    return localdir / sha1(style_url.encode('utf')).hexdigest()
+
+
 def initialize_localdir_style(
-    outdir: Path, localdir: Path, style_url: str
+    outdir: Path,
+    localdir: Path,
+    style_url: str,
+    session: requests.Session = None,
+    checksum: str = None,
 ) -> Path:
     """
     Initialize local directory with the required style files.
@@ -124,21 +602,26 @@ def initialize_localdir_style(
         Path to store local files.
     style_url
         String with the URL to download the style from.
+    session
+        HTTP session to use for the requests.
+    checksum
+        If provided, the expected SHA256 checksum of the downloaded file.
     """
     # Style
     symlink = outdir / 'markdownrevealstyle'
-    if symlink.exists():
+    if symlink.is_symlink() or symlink.exists():
         symlink.unlink()
     if not style_url:
         return outdir
-    style_version = sha1(style_url.encode('utf')).hexdigest()
-    style_path = localdir / style_version
-    if not style_path.exists():
-        style_tar, headers = urlretrieve(style_url)
-        with tarfile.open(style_tar) as tar:
-            members = clean_tar_members(tar.getmembers())
-            tar.extractall(str(style_path), members)
-        os.remove(style_tar)
+    style_path = style_directory(localdir, style_url)
+    with install_lock(localdir, style_path):
+        installed = style_path.exists()
+        emit('cache', cache='install', key='style', hit=installed)
+        if not installed:
+            session = session or create_session()
+            install(session, style_url, style_path, checksum=checksum)
+        if read_package(style_path) is None:
+            compile_style(style_path)
     symlink.symlink_to(style_path, target_is_directory=True)
 
 
@@ -162,28 +645,63 @@ def initialize_localdir(config: Config) -> Path:
     outdir = localdir / 'out'
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # reveal.js
-    initialize_localdir_project(
-        github='hakimel/reveal.js',
-        outdir=outdir,
-        localdir=localdir,
-        project_version=config['reveal_version'],
-        name='revealjs',
-        download_url='https://github.com/{project}/archive/{version}.tar.gz',
-    )
+    # Download reveal.js, KaTeX and the style concurrently, verifying the
+    # checksums in the lock file of the presentation (if any)
+    lock = config.get('lock', {})
+    session = create_session()
+    with cache_lock(config), ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(
+                initialize_localdir_project,
+                github=project['github'],
+                outdir=outdir,
+                localdir=localdir,
+                project_version=config[project['setting']],
+                name=name,
+                download_url=project['url'],
+                session=session,
+                profile=extraction_profile(name, config),
+                checksum=locked_checksum(
+                    lock, name, 'version', config[project['setting']]
+                ),
+            )
+            for name, project in PROJECTS.items()
+        ]
+        futures.append(
+            executor.submit(
+                initialize_localdir_style,
+                outdir,
+                localdir,
+                config['style'],
+                session,
+                locked_checksum(lock, 'style', 'url', config['style']),
+            )
+        )
+        for future in futures:
+            future.result()
 
-    # KaTeX
-    initialize_localdir_project(
-        github='Khan/KaTeX',
-        outdir=outdir,
-        localdir=localdir,
-        project_version=config['katex_version'],
-        name='katex',
-        download_url='https://github.com/{project}/'
-        + 'releases/download/{version}/katex.tar.gz',
-    )
+    return outdir
 
-    # Style
-    initialize_localdir_style(outdir, localdir, config['style'])
 
-    return outdir
+def clean_localdir(config: Config):
+    """
+    Remove all local files.
+
+    Lock files are kept, as other processes may be waiting on them.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    """
+    localdir = config['local_path']
+    if not localdir.exists():
+        return
+    with cache_lock(config, shared=False), output_lock(config):
+        for path in localdir.iterdir():
+            if path.suffix == '.lock' or path.name == LOCKS_DIRECTORY:
+                continue
+            if path.is_dir() and not path.is_symlink():
+                rmtree(str(path))
+            else:
+                path.unlink()
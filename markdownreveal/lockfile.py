@@ -0,0 +1,214 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import requests
+
+from .local import PROJECTS
+from .local import create_session
+from .local import download
+from .local import extraction_profile
+from .local import file_checksum
+from .local import install
+from .local import install_project
+from .local import latest_project_release
+from .local import locked_checksum
+from .local import read_manifest
+from .local import style_directory
+from .locking import cache_lock
+from .locking import install_lock
+from .typing import Config
+
+# Lock file, next to the presentation Markdown file
+LOCKFILE = 'markdownreveal.lock'
+
+
+def lockfile_path(markdown_file: Path) -> Path:
+    """
+    Path of the lock file of a presentation.
+    """
+    return markdown_file.resolve().parent / LOCKFILE
+
+
+def read_lockfile(path: Path) -> dict:
+    """
+    Read a lock file, which is empty if it does not exist.
+    """
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_lockfile(path: Path, lock: dict):
+    """
+    Atomically write a lock file, with sorted keys.
+    """
+    partial = path.with_name(path.name + '.part')
+    partial.write_text(json.dumps(lock, indent=2, sort_keys=True) + '\n')
+    partial.replace(path)
+
+
+def apply_lock(markdown_file: Path, config: Config) -> dict:
+    """
+    Use the versions and checksums locked for a presentation.
+
+    The `latest` versions in the configuration are replaced by the locked
+    ones, so already downloaded files are used without any request, and the
+    lock is stored in the configuration (as `lock`) to verify the checksums
+    of the files which need to be downloaded (see `initialize_localdir`).
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    config
+        Markdownreveal configuration, which is updated in place.
+
+    Returns
+    -------
+        The lock, which is empty if the presentation has no lock file.
+    """
+    lock = read_lockfile(lockfile_path(markdown_file))
+    for name, project in PROJECTS.items():
+        setting = project['setting']
+        if config[setting] == 'latest' and name in lock:
+            config[setting] = lock[name]['version']
+    config['lock'] = lock
+    return lock
+
+
+def download_checksum(session: requests.Session, url: str) -> str:
+    """
+    Download a file to compute its SHA256 checksum.
+    """
+    with TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'download'
+        download(session, url, path)
+        return file_checksum(path)
+
+
+def installed_checksum(
+    session: requests.Session, url: str, path: Path, locked: str = None
+) -> str:
+    """
+    Get the checksum of the file an installed directory was extracted from.
+
+    Directories installed before checksums were recorded in their manifest
+    use the locked checksum, if any, or download the file again.
+    """
+    checksum = read_manifest(path).get('sha256') or locked
+    return checksum or download_checksum(session, url)
+
+
+def lock_project(
+    name: str,
+    config: Config,
+    lock: dict,
+    session: requests.Session,
+) -> dict:
+    """
+    Resolve, install and lock the version of a project.
+
+    Returns
+    -------
+        The lock entry, with the `version`, `url` and `sha256` of the
+        project.
+    """
+    project = PROJECTS[name]
+    version = config[project['setting']]
+    if version == 'latest':
+        version = lock.get(name, {}).get('version') or latest_project_release(
+            project['github'], session
+        )
+    checksum = locked_checksum(lock, name, 'version', version)
+    url = project['url'].format(project=project['github'], version=version)
+    path = install_project(
+        github=project['github'],
+        localdir=config['local_path'],
+        project_version=version,
+        name=name,
+        download_url=project['url'],
+        session=session,
+        profile=extraction_profile(name, config),
+        checksum=checksum,
+    )
+    sha256 = installed_checksum(session, url, path, checksum)
+    return {'version': version, 'url': url, 'sha256': sha256}
+
+
+def lock_style(
+    config: Config,
+    lock: dict,
+    session: requests.Session,
+    update: bool = False,
+) -> dict:
+    """
+    Install and lock the style.
+
+    Styles are identified by their URL only, so they are downloaded again
+    when updating, to lock their current contents.
+
+    Returns
+    -------
+        The lock entry, with the `url` and `sha256` of the style.
+    """
+    url = config['style']
+    checksum = locked_checksum(lock, 'style', 'url', url)
+    path = style_directory(config['local_path'], url)
+    with install_lock(config['local_path'], path):
+        if update or not path.exists():
+            sha256 = install(session, url, path, checksum=checksum)
+        else:
+            sha256 = installed_checksum(session, url, path, checksum)
+    return {'url': url, 'sha256': sha256}
+
+
+def update_lockfile(
+    markdown_file: Path, config: Config, update: bool = False
+) -> dict:
+    """
+    Lock the versions and checksums of the files a presentation uses.
+
+    Projects and styles already locked keep their version, unless updating,
+    in which case `latest` versions are resolved and the style is
+    downloaded again. The lock file is only written if it changed.
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    config
+        Markdownreveal configuration.
+    update
+        Whether to refresh the locked versions and checksums.
+
+    Returns
+    -------
+        The lock, with an entry for each project and the style.
+    """
+    path = lockfile_path(markdown_file)
+    previous = read_lockfile(path)
+    lock = {} if update else dict(previous)
+    session = create_session()
+    with cache_lock(config):
+        for name in PROJECTS:
+            lock[name] = lock_project(name, config, lock, session)
+        if config['style']:
+            lock['style'] = lock_style(config, lock, session, update)
+        else:
+            lock.pop('style', None)
+    if lock != previous:
+        write_lockfile(path, lock)
+    return lock
+
+
+def load_lock(markdown_file: Path, config: Config) -> dict:
+    """
+    Apply the lock file of a presentation before building it.
+
+    Reproducible builds create (or complete) the lock file first.
+    """
+    if config.get('reproducible'):
+        update_lockfile(markdown_file, config)
+    return apply_lock(markdown_file, config)
@@ -0,0 +1,167 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from .typing import Config
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    import msvcrt
+
+    fcntl = None
+
+# Directory, within the local directory, with the installation locks
+LOCKS_DIRECTORY = '.locks'
+
+# Paths of the locks held in the current context (i.e.: the thread or the
+# asyncio task), which nested contexts on the same path reuse
+_held = ContextVar('held', default=frozenset())
+
+
+def acquire(descriptor: int, shared: bool):
+    """
+    Block until an advisory lock is acquired on a file descriptor.
+
+    Notes
+    -----
+    Shared locks are not supported on Windows, where all locks are
+    exclusive.
+    """
+    if fcntl:
+        fcntl.flock(descriptor, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    else:  # pragma: no cover
+        msvcrt.locking(descriptor, msvcrt.LK_LOCK, 1)
+
+
+def release(descriptor: int):
+    """
+    Release an advisory lock acquired on a file descriptor.
+    """
+    if fcntl:
+        fcntl.flock(descriptor, fcntl.LOCK_UN)
+    else:  # pragma: no cover
+        msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+
+
+def open_lock(path: Path) -> int:
+    """
+    Open a lock file, creating it if it does not exist.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return os.open(str(path), os.O_RDWR | os.O_CREAT)
+
+
+@contextmanager
+def holding(path: Path):
+    """
+    Record that a lock is held in the current context.
+    """
+    token = _held.set(_held.get() | {str(path)})
+    try:
+        yield
+    finally:
+        _held.reset(token)
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    """
+    Hold a cross-process lock on a file within the context.
+
+    Many shared (reader) locks can be held at the same time, while an
+    exclusive (writer) lock excludes any other lock. Locks are only
+    re-entrant when explicitly nested: nested contexts on the same path,
+    within the same thread or asyncio task (including the coroutines it
+    runs with `run_sync`), reuse the lock already held. Other tasks and
+    threads wait for it.
+
+    Parameters
+    ----------
+    path
+        Path of the lock file, which is created if it does not exist.
+    shared
+        Whether to acquire a shared lock instead of an exclusive one.
+    """
+    if str(path) in _held.get():
+        yield
+        return
+    descriptor = open_lock(path)
+    try:
+        acquire(descriptor, shared)
+        with holding(path):
+            yield
+    finally:
+        release(descriptor)
+        os.close(descriptor)
+
+
+@asynccontextmanager
+async def async_file_lock(path: Path, shared: bool = False):
+    """
+    Hold a cross-process lock on a file within an asynchronous context.
+
+    The lock is acquired in the default executor, so the event loop keeps
+    running while waiting for it (see `file_lock`).
+    """
+    if str(path) in _held.get():
+        yield
+        return
+    descriptor = open_lock(path)
+    loop = asyncio.get_event_loop()
+    try:
+        await loop.run_in_executor(None, acquire, descriptor, shared)
+        with holding(path):
+            yield
+    finally:
+        release(descriptor)
+        os.close(descriptor)
+
+
+def cache_lock(config: Config, shared: bool = True):
+    """
+    Lock the local download cache.
+
+    Builds hold a shared lock while using cached files, while cleaning
+    the cache requires an exclusive lock.
+    """
+    return file_lock(config['local_path'] / '.cache.lock', shared=shared)
+
+
+def install_lock(localdir: Path, path: Path):
+    """
+    Lock the installation of a directory in the local download cache.
+
+    Locks are kept in their own directory, so they never show up when
+    listing the installed versions.
+    """
+    name = '-'.join(path.relative_to(localdir).parts)
+    return file_lock(localdir / LOCKS_DIRECTORY / ('%s.lock' % name))
+
+
+@contextmanager
+def output_lock(config: Config):
+    """
+    Lock the output directory to generate and publish a presentation.
+
+    A shared lock on the local download cache is held too, as the output
+    directory links to cached files.
+    """
+    with cache_lock(config, shared=True):
+        with file_lock(config['local_path'] / '.output.lock'):
+            yield
+
+
+@asynccontextmanager
+async def async_output_lock(config: Config):
+    """
+    Lock the output directory without blocking the event loop (see
+    `output_lock`).
+    """
+    cache = config['local_path'] / '.cache.lock'
+    async with async_file_lock(cache, shared=True):
+        async with async_file_lock(config['local_path'] / '.output.lock'):
+            yield
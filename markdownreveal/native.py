@@ -0,0 +1,472 @@
+import re
+from html import escape
+from html import unescape
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+# Placeholder delimiter for already rendered inline fragments
+PLACEHOLDER = '\ue001'
+
+# Inline characters with a meaning the renderer does not support (math,
+# raw HTML, escapes, quotes, citations, superscripts, attributes...)
+UNSUPPORTED_INLINE = r'[\\<$"@^~{}]|&#?\w+;|\*\*\*|___'
+
+# Emoji codes (`:smile:`)
+EMOJI_REGEX = r':[\w+-]+:'
+
+# Inline code, links and images
+CODE_REGEX = r'`([^`\s](?:[^`]*[^`\s])?)`'
+LINK_REGEX = r'(!?)\[([^\[\]]*)\]\(([^()\s]+)\)'
+
+# Images alone in a paragraph, with alternative text, are figures
+FIGURE_REGEX = r'^!\[([^\[\]]+)\]\(([^()\s]+)\)\s*$'
+
+# Emphasis, most specific first
+EMPHASIS = [
+    (r'\*\*(?=\S)(.+?)(?<=\S)\*\*', 'strong'),
+    (r'(?<!\w)__(?=\S)(.+?)(?<=\S)__(?!\w)', 'strong'),
+    (r'\*(?=\S)(.+?)(?<=\S)\*', 'em'),
+    (r'(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)', 'em'),
+]
+
+# Smart punctuation
+SMART = [
+    (r'---', '—'),
+    (r'--', '–'),
+    (r'\.\.\.', '…'),
+    (r"(?<=\w)'(?=\w)", '’'),
+]
+
+# Markup left after rendering the inline elements
+LEFTOVER_INLINE = r"[*'\[\]`]|(?<!\w)_|_(?!\w)"
+
+# Block elements
+HEADING_REGEX = r'^(#{1,2})\s+(\S.*?)(?:\s+#+)?\s*$'
+RULE_REGEX = r'^\s{0,3}([-*_])(\s*\1){2,}\s*$'
+BULLET_REGEX = r'^[-*+]\s+(.*)$'
+ORDERED_REGEX = r'^\d+\.\s+(.*)$'
+FENCE = '```'
+
+# Block starts the renderer does not support (indented code and list
+# continuations, block quotes, tables, divs, raw HTML, rules, setext
+# headings, definition lists, reference links, deeper headings...)
+UNSUPPORTED_BLOCK = (
+    r'^(\s|>|\||:|~|<|\[|%|#{3}|#\S|[-=]+\s*$|\d+[.)]|\(?[a-zA-Z#][.)]\s)'
+)
+
+# Lines that may interrupt a paragraph in Pandoc
+INTERRUPTS_PARAGRAPH = r'^(```|~~~|>|:|\||<)'
+
+
+class UnsupportedMarkdown(ValueError):
+    """
+    The Markdown text uses features the native renderer does not support.
+    """
+
+
+def check_inline(text: str, emoji: bool):
+    """
+    Make sure an inline text only uses supported features.
+    """
+    match = re.search(UNSUPPORTED_INLINE, text)
+    if not match and emoji:
+        match = re.search(EMOJI_REGEX, text)
+    if match:
+        raise UnsupportedMarkdown(match.group(0))
+
+
+def render_inline(text: str, emoji: bool = False) -> str:
+    """
+    Render a Markdown inline text into HTML.
+
+    Parameters
+    ----------
+    text
+        Markdown inline text.
+    emoji
+        Whether emoji codes are enabled, in which case they are not
+        supported.
+
+    Returns
+    -------
+        The HTML text.
+    """
+    fragments = []
+
+    def stash(html):
+        fragments.append(html)
+        return '%s%d%s' % (PLACEHOLDER, len(fragments) - 1, PLACEHOLDER)
+
+    def code(match):
+        return stash('<code>%s</code>' % escape(match.group(1), quote=False))
+
+    def link(match):
+        return stash(render_link(*match.groups(), emoji=emoji))
+
+    text = re.sub(CODE_REGEX, code, text)
+    check_inline(text, emoji)
+    text = re.sub(LINK_REGEX, link, text)
+    text = render_text(text)
+    return re.sub(
+        '%s(\\d+)%s' % (PLACEHOLDER, PLACEHOLDER),
+        lambda match: fragments[int(match.group(1))],
+        text,
+    )
+
+
+def render_text(text: str) -> str:
+    """
+    Render emphasis and smart punctuation of plain text into HTML.
+    """
+    text = escape(text, quote=False)
+    for regex, replacement in SMART:
+        text = re.sub(regex, replacement, text)
+    for regex, tag in EMPHASIS:
+        text = re.sub(regex, r'<%s>\1</%s>' % (tag, tag), text)
+    match = re.search(LEFTOVER_INLINE, text)
+    if match:
+        raise UnsupportedMarkdown(match.group(0))
+    return text
+
+
+def render_link(image: str, text: str, url: str, emoji: bool) -> str:
+    """
+    Render a Markdown link or image into HTML.
+    """
+    url = escape(url)
+    if not image:
+        return '<a href="%s">%s</a>' % (url, render_inline(text, emoji))
+    if re.search(r'[*_`]', text):
+        raise UnsupportedMarkdown(text)
+    alt = ' alt="%s"' % render_text(text) if text else ''
+    return '<img data-src="%s"%s />' % (url, alt)
+
+
+def plain_text(html: str) -> str:
+    """
+    Get the text of an HTML fragment, without tags.
+    """
+    return unescape(re.sub(r'<[^>]*>', '', html))
+
+
+def identifier(text: str, used: dict) -> str:
+    """
+    Create a unique identifier for a heading, as Pandoc does.
+
+    Parameters
+    ----------
+    text
+        Plain text of the heading.
+    used
+        Number of times each identifier has been used, which is updated.
+
+    Returns
+    -------
+        The identifier.
+    """
+    text = ''.join(c for c in text if c.isalnum() or c in '_-. \t')
+    text = strip_to_letter('-'.join(text.split()).lower()) or 'section'
+    count = used.get(text, 0)
+    used[text] = count + 1
+    return '%s-%d' % (text, count) if count else text
+
+
+def strip_to_letter(text: str) -> str:
+    """
+    Remove everything up to the first letter of a text.
+    """
+    for index, character in enumerate(text):
+        if character.isalpha():
+            return text[index:]
+    return ''
+
+
+def split_metadata(text: str) -> Tuple[str, List[str]]:
+    """
+    Split the metadata (title block or YAML block) from a Markdown text.
+
+    Returns
+    -------
+        The metadata text and the list of lines of the body.
+    """
+    lines = text.splitlines()
+    end = 0
+    if lines and lines[0].rstrip() == '---':
+        ends = [i for i, line in enumerate(lines) if line in ('---', '...')]
+        end = ends[1] + 1 if len(ends) > 1 else 0
+    else:
+        while end < len(lines) and lines[end].startswith('%'):
+            end += 1
+            while end < len(lines) and re.match(r'^\s+\S', lines[end]):
+                end += 1
+    return '\n'.join(lines[:end]), lines[end:]
+
+
+def split_blocks(lines: List[str]) -> Iterator[List[str]]:
+    """
+    Group lines in blocks, separated by blank lines.
+
+    Fenced code blocks are kept whole, blank lines included.
+    """
+    block = []
+    fenced = False
+    for line in lines + ['']:
+        fenced ^= line.startswith(FENCE)
+        if fenced or line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if fenced:
+        raise UnsupportedMarkdown('Unclosed code block')
+
+
+def render_code(block: List[str]) -> List[str]:
+    """
+    Render a fenced code block (without language) into HTML.
+    """
+    if block[0].rstrip() != FENCE or block[-1].rstrip() != FENCE:
+        raise UnsupportedMarkdown(block[0])
+    if len(block) < 3 or FENCE in ''.join(block[1:-1]):
+        raise UnsupportedMarkdown(block[0])
+    code = escape('\n'.join(block[1:-1]), quote=False)
+    code = code.replace('"', '&quot;')
+    return ['<pre><code>%s</code></pre>' % code]
+
+
+def render_list(block: List[str], regex: str, emoji: bool) -> List[str]:
+    """
+    Render a tight list into HTML.
+    """
+    items = []
+    for line in block:
+        match = re.match(regex, line)
+        if match:
+            items.append(match.group(1))
+        elif is_continuation(line):
+            items[-1] += ' ' + line.strip()
+        else:
+            raise UnsupportedMarkdown(line)
+    html = ['<li>%s</li>' % render_inline(item, emoji) for item in items]
+    if regex == BULLET_REGEX:
+        return ['<ul>'] + html + ['</ul>']
+    return ['<ol type="1">'] + html + ['</ol>']
+
+
+def is_continuation(line: str) -> bool:
+    """
+    Whether a line continues a list item (rather than nesting a list).
+    """
+    nested = re.match(BULLET_REGEX, line.strip())
+    nested = nested or re.match(ORDERED_REGEX, line.strip())
+    return bool(re.match(r'^\s+\S', line)) and not nested
+
+
+def render_paragraph(lines: List[str], emoji: bool) -> str:
+    """
+    Render the lines of a paragraph into HTML.
+    """
+    for line in lines[1:]:
+        if re.match(INTERRUPTS_PARAGRAPH, line):
+            raise UnsupportedMarkdown(line)
+    return render_inline(' '.join(line.strip() for line in lines), emoji)
+
+
+def block_kind(line: str) -> str:
+    """
+    Guess the kind of a Markdown block from its first line.
+    """
+    kinds = [
+        (RULE_REGEX, 'unsupported'),
+        (HEADING_REGEX, 'heading'),
+        (re.escape(FENCE), 'code'),
+        (BULLET_REGEX, 'bullet'),
+        (r'^1\.\s', 'ordered'),
+        (UNSUPPORTED_BLOCK, 'unsupported'),
+    ]
+    for regex, kind in kinds:
+        if re.match(regex, line):
+            return kind
+    return 'paragraph'
+
+
+def parse_blocks(lines: List[str], emoji: bool) -> Iterator[tuple]:
+    """
+    Parse Markdown lines into headings and rendered HTML blocks.
+
+    Returns
+    -------
+        An iterator of `('heading', level, html)` and `('html', lines,
+        kind)` tuples.
+    """
+    for block in split_blocks(lines):
+        kind = block_kind(block[0])
+        if kind == 'heading':
+            level, text = re.match(HEADING_REGEX, block[0]).groups()
+            yield ('heading', len(level), render_inline(text, emoji))
+            block = block[1:]
+            kind = block_kind(block[0]) if block else None
+        if block:
+            yield ('html', render_block(block, kind, emoji), kind)
+
+
+def has_line_break(block: List[str]) -> bool:
+    """
+    Whether a block has hard line breaks (lines ending with two spaces).
+    """
+    return block[0] != FENCE and any(
+        line.endswith('  ') for line in block[:-1]
+    )
+
+
+def render_block(block: List[str], kind: str, emoji: bool) -> List[str]:
+    """
+    Render a Markdown block of a given kind into HTML lines.
+    """
+    if kind in ('unsupported', 'heading') or has_line_break(block):
+        raise UnsupportedMarkdown(block[0])
+    if kind == 'code':
+        return render_code(block)
+    if kind in ('bullet', 'ordered'):
+        regex = BULLET_REGEX if kind == 'bullet' else ORDERED_REGEX
+        return render_list(block, regex, emoji)
+    figure = re.match(FIGURE_REGEX, block[0]) if len(block) == 1 else None
+    if figure:
+        return render_figure(*figure.groups(), emoji=emoji)
+    return ['<p>%s</p>' % render_paragraph(block, emoji)]
+
+
+def render_figure(text: str, url: str, emoji: bool) -> List[str]:
+    """
+    Render an image alone in a paragraph (with a caption) into HTML.
+    """
+    image = render_link('!', text, url, emoji)
+    caption = '<figcaption aria-hidden="true">%s</figcaption>'
+    return ['<figure>', image, caption % render_text(text), '</figure>']
+
+
+def group_slides(blocks: Iterator[tuple]) -> List[dict]:
+    """
+    Group parsed blocks in slides, nesting level 2 slides within level 1
+    slides.
+    """
+    slides = []
+    used = {}
+    previous = None
+    for block in blocks:
+        if block[0] == 'heading':
+            add_slide(slides, new_slide(block[1], block[2], used))
+            previous = None
+            continue
+        if not slides:
+            slides.append(new_slide(2, None, used))
+        check_loose_list(previous, block[2])
+        last_slide(slides)['content'].extend(block[1])
+        previous = block[2]
+    return slides
+
+
+def add_slide(slides: List[dict], slide: dict):
+    """
+    Add a slide, nesting level 2 slides within the last level 1 slide.
+    """
+    if slide['level'] == 2 and slides and slides[-1]['level'] == 1:
+        slides[-1]['children'].append(slide)
+    else:
+        slides.append(slide)
+
+
+def check_loose_list(previous: str, kind: str):
+    """
+    Make sure two consecutive blocks are not a loose list.
+    """
+    if previous == kind and kind in ('bullet', 'ordered'):
+        raise UnsupportedMarkdown('Loose list')
+
+
+def new_slide(level: int, heading: str, used: dict) -> dict:
+    """
+    Create a new slide, with an empty content.
+    """
+    slide = {'level': level, 'heading': heading, 'content': []}
+    if heading is not None:
+        slide['id'] = identifier(plain_text(heading), used)
+    if level == 1:
+        slide['children'] = []
+    return slide
+
+
+def last_slide(slides: List[dict]) -> dict:
+    """
+    Get the last slide (the one new content is added to).
+    """
+    slide = slides[-1]
+    if slide.get('children'):
+        return slide['children'][-1]
+    return slide
+
+
+def render_slide(slide: dict) -> List[str]:
+    """
+    Render a slide (without its children) into HTML lines.
+    """
+    level = slide['level']
+    if slide['heading'] is None:
+        return (
+            ['<section class="slide level2">', '']
+            + slide['content']
+            + ['</section>']
+        )
+    classes = 'title-slide slide level1' if level == 1 else 'slide level2'
+    html = ['<section id="%s" class="%s">' % (slide['id'], classes)]
+    html.append('<h{0}>{1}</h{0}>'.format(level, slide['heading']))
+    html.extend(slide['content'] or ([''] if level == 1 else []))
+    html.append('</section>')
+    return html
+
+
+def render_slides(slides: List[dict]) -> List[str]:
+    """
+    Render slides into HTML lines, wrapping level 1 slides with children
+    in a vertical stack.
+    """
+    html = []
+    for slide in slides:
+        children = slide.get('children')
+        if not children:
+            html.extend(render_slide(slide))
+            continue
+        html.append('<section>')
+        html.extend(render_slide(slide))
+        for child in children:
+            html.extend(render_slide(child))
+        html[-1] += '</section>'
+    return html
+
+
+def render_markdown(text: str, emoji: bool = False) -> Tuple[str, List[str]]:
+    """
+    Render a Markdown text into reveal.js HTML sections.
+
+    Parameters
+    ----------
+    text
+        Markdown text.
+    emoji
+        Whether emoji codes are enabled, in which case they are not
+        supported.
+
+    Returns
+    -------
+        The metadata text, to be rendered by Pandoc, and the HTML lines of
+        the slides.
+
+    Raises
+    ------
+    UnsupportedMarkdown
+        If the text uses unsupported features.
+    """
+    metadata, lines = split_metadata(text)
+    blocks = parse_blocks(lines, emoji)
+    return metadata, render_slides(group_slides(blocks))
@@ -0,0 +1,309 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from pathlib import Path
+from typing import List
+from typing import Optional
+from urllib.parse import unquote
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+
+import requests
+
+from .dependencies import REFERENCE_REGEX
+from .dependencies import style_dependencies
+from .events import emit
+from .local import TIMEOUT
+from .local import create_session
+from .typing import Config
+
+# Directories, within the local directory, with the cached HTTP responses
+# and the fetched presentations
+HTTP_DIRECTORY = 'http'
+REMOTE_DIRECTORY = 'remote'
+
+# Suffix of the record of the exports of a fetched presentation, which is
+# kept next to (not within) its directory, so it is never exported
+EXPORTS = '.exports.json'
+
+# Markdown images, which are fetched along with the presentation
+IMAGE_REGEX = r'!\[[^\]]*\]\(\s*<?([^)\s>]+)'
+
+# Suffixes of remote Markdown files (other URLs are built presentations)
+MARKDOWN_SUFFIXES = ('.md', '.markdown', '.mdown', '.txt')
+
+
+def is_remote(source: str) -> bool:
+    """
+    Whether a presentation source is an HTTP(S) URL.
+    """
+    return bool(re.match(r'^https?://', source))
+
+
+def is_remote_markdown(source: str) -> bool:
+    """
+    Whether a presentation source is the URL of a Markdown file.
+    """
+    path = urlparse(source).path
+    return is_remote(source) and path.lower().endswith(MARKDOWN_SUFFIXES)
+
+
+def write_atomic(path: Path, content: bytes):
+    """
+    Write a file, replacing it only once completely written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+    partial.write_bytes(content)
+    partial.replace(path)
+
+
+class HttpCache:
+    """
+    Local cache of HTTP responses, revalidated with conditional requests.
+
+    Each URL is stored in its own directory, with the response body and the
+    `ETag` and `Last-Modified` headers, which are sent back (as
+    `If-None-Match` and `If-Modified-Since`) on the next request, so the
+    server only sends the file again if it changed.
+
+    Parameters
+    ----------
+    directory
+        Directory where responses are stored.
+    session
+        HTTP session to use for the requests.
+    """
+
+    def __init__(self, directory: Path, session: requests.Session = None):
+        self.directory = directory
+        self.session = session or create_session()
+        self.downloaded = 0
+        self.revalidated = 0
+
+    def entry(self, url: str) -> Path:
+        """
+        Directory where the response for a URL is stored.
+        """
+        return self.directory / sha1(url.encode('utf')).hexdigest()
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Build the headers to revalidate the cached response for a URL.
+        """
+        entry = self.entry(url)
+        if not (entry / 'body').exists():
+            return {}
+        try:
+            meta = json.loads((entry / 'headers.json').read_text())
+        except (OSError, ValueError):
+            return {}
+        headers = {
+            'If-None-Match': meta.get('etag'),
+            'If-Modified-Since': meta.get('last_modified'),
+        }
+        return {name: value for name, value in headers.items() if value}
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """
+        Get the content of a URL, from the cache if it did not change.
+
+        Returns
+        -------
+            The content, or `None` if the URL does not exist (404).
+
+        Raises
+        ------
+        requests.RequestException
+            If the request failed.
+        """
+        entry = self.entry(url)
+        headers = self.conditional_headers(url)
+        response = self.session.get(url, headers=headers, timeout=TIMEOUT)
+        emit('cache', cache='http', key=url, hit=response.status_code == 304)
+        if response.status_code == 304:
+            self.revalidated += 1
+            os.utime(str(entry))
+            return (entry / 'body').read_bytes()
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        self.downloaded += 1
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        write_atomic(entry / 'body', response.content)
+        write_atomic(entry / 'headers.json', json.dumps(meta).encode('utf'))
+        return response.content
+
+
+def remote_references(markdown: str) -> List[str]:
+    """
+    Find the relative file references in a Markdown file.
+
+    Returns
+    -------
+        The referenced images, and files referenced from HTML and Pandoc
+        attributes (i.e.: `data-background-image`), relative to the
+        Markdown file. Absolute paths, URLs and paths outside the directory
+        of the Markdown file are excluded.
+    """
+    references = re.findall(IMAGE_REGEX, markdown)
+    references += re.findall(REFERENCE_REGEX, markdown)
+    relative = []
+    for reference in references:
+        reference = unquote(reference.split('#')[0].split('?')[0])
+        if not reference or re.match(r'^([a-z]+:|/)', reference):
+            continue
+        if os.path.normpath(reference).startswith('..'):
+            continue
+        relative.append(os.path.normpath(reference))
+    return sorted(set(relative))
+
+
+def fetch_file(cache: HttpCache, url: str, path: Path):
+    """
+    Fetch a file through the cache, only writing it if it changed.
+
+    Files which no longer exist remotely are removed.
+    """
+    content = cache.fetch(url)
+    if content is None:
+        if path.exists():
+            path.unlink()
+        return
+    if not path.exists() or path.read_bytes() != content:
+        write_atomic(path, content)
+
+
+def deck_name(url: str) -> str:
+    """
+    Name of the local copy of a presentation, from the last segment of its
+    URL (which may not contain path separators nor refer to a directory).
+    """
+    name = Path(unquote(urlparse(url).path.rstrip('/').split('/')[-1])).name
+    if name in ('', '.', '..'):
+        return 'index.md'
+    return name
+
+
+def fetch_deck(url: str, config: Config, cache: HttpCache = None) -> Path:
+    """
+    Fetch a remote presentation, with its images and style files.
+
+    Every file goes through the local HTTP cache, and fetched files are
+    only rewritten if they changed, so unchanged presentations are neither
+    downloaded nor considered modified.
+
+    Parameters
+    ----------
+    url
+        URL of the presentation Markdown file.
+    config
+        Markdownreveal configuration.
+    cache
+        HTTP cache to use (by default, in the local directory).
+
+    Returns
+    -------
+        Path of the local copy of the Markdown file, within a directory
+        dedicated to the URL.
+
+    Raises
+    ------
+    requests.RequestException
+        If the Markdown file could not be fetched.
+    """
+    cache = cache or HttpCache(config['local_path'] / HTTP_DIRECTORY)
+    key = sha1(url.encode('utf')).hexdigest()[:16]
+    directory = config['local_path'] / REMOTE_DIRECTORY / key
+    markdown_file = directory / deck_name(url)
+
+    content = cache.fetch(url)
+    if content is None:
+        raise requests.HTTPError('Not found: %s' % url)
+    if not markdown_file.exists() or markdown_file.read_bytes() != content:
+        write_atomic(markdown_file, content)
+
+    references = set(remote_references(content.decode('utf')))
+    for path in style_dependencies(directory, config):
+        references.add(path.relative_to(directory).as_posix())
+
+    def fetch_reference(reference):
+        fetch_file(cache, urljoin(url, reference), directory / reference)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(fetch_reference, sorted(references)))
+    return markdown_file
+
+
+def deck_fingerprint(markdown_file: Path) -> str:
+    """
+    Hash the fetched files of a presentation and the local configuration.
+    """
+    digest = sha1()
+    directory = markdown_file.parent
+    for path in sorted(directory.rglob('*')):
+        if path.is_file() and not path.name.startswith('.'):
+            digest.update(path.relative_to(directory).as_posix().encode())
+            digest.update(sha1(path.read_bytes()).digest())
+    config_file = Path.cwd() / 'config.yaml'
+    if config_file.exists():
+        digest.update(config_file.read_bytes())
+    return digest.hexdigest()
+
+
+def exports_path(markdown_file: Path) -> Path:
+    """
+    Path of the record of the exports of a fetched presentation.
+    """
+    directory = markdown_file.parent
+    return directory.with_name(directory.name + EXPORTS)
+
+
+def read_exports(markdown_file: Path) -> dict:
+    try:
+        return json.loads(exports_path(markdown_file).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def is_exported(markdown_file: Path, output: Path) -> bool:
+    """
+    Whether an output file was exported from the current presentation.
+
+    Parameters
+    ----------
+    markdown_file
+        Fetched presentation Markdown file (see `fetch_deck`).
+    output
+        The exported file (i.e.: a ZIP or PDF file).
+
+    Returns
+    -------
+        Whether the output file exists, was not modified since the export,
+        and neither the presentation nor the configuration changed.
+    """
+    export = read_exports(markdown_file).get(str(output.resolve()))
+    if not export or not output.exists():
+        return False
+    if export['mtime'] != output.stat().st_mtime_ns:
+        return False
+    return export['fingerprint'] == deck_fingerprint(markdown_file)
+
+
+def record_export(markdown_file: Path, output: Path):
+    """
+    Record that an output file was exported from the presentation.
+    """
+    exports = read_exports(markdown_file)
+    exports[str(output.resolve())] = {
+        'fingerprint': deck_fingerprint(markdown_file),
+        'mtime': output.stat().st_mtime_ns,
+    }
+    content = json.dumps(exports, indent=2).encode('utf')
+    write_atomic(exports_path(markdown_file), content)
@@ -0,0 +1,677 @@
+import hmac
+import json
+import os
+import re
+import secrets
+from collections import OrderedDict
+from hashlib import sha1
+from inspect import signature
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from tornado.web import Application
+from tornado.web import HTTPError
+from tornado.web import RequestHandler
+from tornado.web import StaticFileHandler
+from tornado.websocket import WebSocketClosedError
+from tornado.websocket import WebSocketHandler
+
+from .slides import MANIFEST
+
+# URL prefix of the live preview endpoints
+PREFIX = '/_markdownreveal'
+
+# Number of revisions kept in memory to compute differences from
+REVISIONS = 8
+
+# Maximum time, in seconds, viewers wait before fetching a new revision, and
+# time added to it for each connected viewer, so they do not all fetch it at
+# the same time
+MAX_JITTER = 2.0
+VIEWER_JITTER = 0.05
+
+# Maximum size of a file, and of all the files, kept in memory, in bytes
+MAX_ASSET_SIZE = 2**20
+MAX_ASSETS_SIZE = 32 * 2**20
+
+# Opening and closing tags of slides
+SECTION_REGEX = r'<(/?)section\b'
+
+# Live preview client, which patches the changed slides in place. Windows
+# opened with `?speaker` report their state to the presenter view and follow
+# its navigation, and those opened with `?preview` (the presenter view
+# slides) are only driven by it. The slide manifest is used to stay on the
+# same slide when it moves or the page is reloaded
+CLIENT_SCRIPT = """
+<script>
+(function () {
+  var state = %s;
+  var role = /[?&]speaker\\b/.test(location.search) ? 'speaker' :
+    /[?&]preview\\b/.test(location.search) ? 'preview' : 'viewer';
+  var socket = null;
+  var manifest = [];
+
+  function connect() {
+    var protocol = location.protocol === 'https:' ? 'wss://' : 'ws://';
+    var url = protocol + location.host + state.prefix + '/updates';
+    socket = new WebSocket(url + '?role=' + role);
+    socket.onopen = report;
+    socket.onmessage = function (event) {
+      var message = JSON.parse(event.data);
+      if (message.revision && message.revision !== state.revision) {
+        setTimeout(update, Math.random() * message.jitter * 1000);
+      }
+      if (message.navigate) {
+        Reveal.setState(message.navigate);
+      }
+    };
+    socket.onclose = function () {
+      setTimeout(connect, 1000);
+    };
+  }
+
+  function report() {
+    if (role === 'speaker' && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({state: Reveal.getState()}));
+    }
+  }
+
+  function update() {
+    var request = new XMLHttpRequest();
+    var since = encodeURIComponent(state.revision);
+    var slide = currentSlide();
+    request.open('GET', state.prefix + '/diff?since=' + since);
+    request.onload = function () {
+      var diff = JSON.parse(request.responseText);
+      if (diff.reload) {
+        if (slide && role !== 'preview') {
+          sessionStorage.setItem(state.manifest, slide);
+        }
+        location.reload();
+      } else if (diff.revision !== state.revision) {
+        patch(diff);
+        state.revision = diff.revision;
+        loadManifest(function () {
+          restore(slide);
+        });
+        window.dispatchEvent(new Event('markdownreveal:patched'));
+      }
+    };
+    request.send();
+  }
+
+  function loadManifest(callback) {
+    var request = new XMLHttpRequest();
+    request.open('GET', state.manifest + '?' + state.revision);
+    request.onload = function () {
+      if (request.status === 200) {
+        manifest = JSON.parse(request.responseText).slides;
+      }
+      callback();
+    };
+    request.send();
+  }
+
+  function currentSlide() {
+    var indices = Reveal.getIndices();
+    var found = manifest.filter(function (slide) {
+      return slide.indices[0] === indices.h &&
+        slide.indices[1] === (indices.v || 0);
+    });
+    return found.length ? found[0].id : null;
+  }
+
+  function restore(id) {
+    if (!id || currentSlide() === id) {
+      return;
+    }
+    manifest.forEach(function (slide) {
+      if (slide.id === id) {
+        Reveal.slide(slide.indices[0], slide.indices[1]);
+      }
+    });
+  }
+
+  function patch(diff) {
+    var slides = document.querySelector('.reveal .slides');
+    var sections = [];
+    for (var i = 0; i < slides.children.length; i++) {
+      if (slides.children[i].tagName === 'SECTION') {
+        sections.push(slides.children[i]);
+      }
+    }
+    diff.slides.forEach(function (slide) {
+      var container = document.createElement('div');
+      container.innerHTML = slide.html;
+      var section = container.firstElementChild;
+      if (sections[slide.index]) {
+        slides.replaceChild(section, sections[slide.index]);
+      } else {
+        slides.appendChild(section);
+      }
+      sections[slide.index] = section;
+      renderMath(section);
+    });
+    sections.slice(diff.count).forEach(function (section) {
+      slides.removeChild(section);
+    });
+    var indices = Reveal.getIndices();
+    Reveal.sync();
+    Reveal.slide(indices.h, indices.v, indices.f);
+  }
+
+  function renderMath(element) {
+    if (window.renderMathInElement) {
+      renderMathInElement(element);
+    } else if (window.katex) {
+      var spans = element.querySelectorAll('span.math');
+      for (var i = 0; i < spans.length; i++) {
+        if (!spans[i].querySelector('.katex')) {
+          katex.render(spans[i].textContent, spans[i], {
+            displayMode: spans[i].classList.contains('display'),
+            throwOnError: false
+          });
+        }
+      }
+    }
+  }
+
+  function ready() {
+    if (role === 'preview') {
+      Reveal.configure({
+        controls: false, progress: false, keyboard: false, history: false
+      });
+    }
+    ['slidechanged', 'fragmentshown', 'fragmenthidden', 'paused', 'resumed',
+     'overviewshown', 'overviewhidden'].forEach(function (name) {
+      Reveal.addEventListener(name, report);
+    });
+    loadManifest(function () {
+      var slide = sessionStorage.getItem(state.manifest);
+      sessionStorage.removeItem(state.manifest);
+      restore(slide);
+    });
+    connect();
+  }
+
+  if (Reveal.isReady()) {
+    ready();
+  } else {
+    Reveal.addEventListener('ready', ready);
+  }
+})();
+</script>
+"""
+
+# Presenter view, showing the current and next slides, the speaker notes and
+# a timer, following the state reported by the speaker window (the token of
+# the session is required to control the presentation)
+PRESENTER_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>Presenter view</title>
+  <style>
+    body {
+      margin: 0; height: 100vh; display: flex; background: #222;
+      color: #eee; font-family: sans-serif;
+    }
+    iframe { border: 0; background: #fff; }
+    #current { flex: 3; }
+    #side { flex: 2; display: flex; flex-direction: column; }
+    #upcoming { height: 40vh; }
+    #timer { font-size: 2em; padding: 0.3em 0.5em; cursor: pointer; }
+    #notes { flex: 1; overflow: auto; padding: 0 1em; font-size: 1.3em; }
+  </style>
+</head>
+<body>
+  <iframe id="current" src="/?preview"></iframe>
+  <div id="side">
+    <iframe id="upcoming" src="/?preview"></iframe>
+    <div id="timer" title="Click to reset">00:00:00</div>
+    <div id="notes"></div>
+  </div>
+<script>
+(function () {
+  var prefix = %s;
+  var token = %s;
+  var current = document.getElementById('current');
+  var upcoming = document.getElementById('upcoming');
+  var timer = document.getElementById('timer');
+  var state = null;
+  var socket = null;
+  var start = Date.now();
+
+  function deck(frame) {
+    var reveal = frame.contentWindow && frame.contentWindow.Reveal;
+    return reveal && reveal.isReady() ? reveal : null;
+  }
+
+  function show() {
+    var main = deck(current);
+    var next = deck(upcoming);
+    if (!state || !main || !next) {
+      return;
+    }
+    main.setState(state);
+    next.setState(state);
+    next.next();
+    document.getElementById('notes').innerHTML = main.getSlideNotes() || '';
+  }
+
+  function connect() {
+    var protocol = location.protocol === 'https:' ? 'wss://' : 'ws://';
+    var url = protocol + location.host + prefix + '/updates';
+    socket = new WebSocket(
+      url + '?role=presenter&token=' + encodeURIComponent(token));
+    socket.onmessage = function (event) {
+      var message = JSON.parse(event.data);
+      if (message.state) {
+        state = message.state;
+        show();
+      }
+    };
+    socket.onclose = function () {
+      setTimeout(connect, 1000);
+    };
+  }
+
+  function navigate(event) {
+    var main = deck(current);
+    var keys = {ArrowRight: 'next', ArrowDown: 'next', ' ': 'next',
+                PageDown: 'next', ArrowLeft: 'prev', ArrowUp: 'prev',
+                PageUp: 'prev'};
+    if (!main || !keys[event.key]) {
+      return;
+    }
+    event.preventDefault();
+    main[keys[event.key]]();
+    state = main.getState();
+    show();
+    socket.send(JSON.stringify({navigate: state}));
+  }
+
+  function tick() {
+    var seconds = Math.floor((Date.now() - start) / 1000);
+    timer.textContent = [seconds / 3600, seconds / 60 %% 60, seconds %% 60]
+      .map(function (value) { return ('0' + Math.floor(value)).slice(-2); })
+      .join(':');
+  }
+
+  [current, upcoming].forEach(function (frame) {
+    frame.addEventListener('load', function () {
+      var view = frame.contentWindow;
+      view.Reveal.addEventListener('ready', show);
+      view.addEventListener('markdownreveal:patched', show);
+      show();
+    });
+  });
+  timer.addEventListener('click', function () {
+    start = Date.now();
+    tick();
+  });
+  document.addEventListener('keydown', navigate);
+  setInterval(tick, 1000);
+  connect();
+})();
+</script>
+</body>
+</html>
+"""
+
+
+def section_spans(html: str) -> List[Tuple[int, int]]:
+    """
+    Find the top-level slides (sections) of a presentation.
+
+    Returns
+    -------
+        The start and end position of each top-level slide.
+    """
+    spans = []
+    depth = 0
+    for match in re.finditer(SECTION_REGEX, html):
+        if not match.group(1):
+            if not depth:
+                start = match.start()
+            depth += 1
+            continue
+        depth -= 1
+        if not depth:
+            spans.append((start, html.index('>', match.end()) + 1))
+    return spans
+
+
+class Revision:
+    """
+    A build of the presentation, split in top-level slides.
+
+    Parameters
+    ----------
+    html
+        The presentation HTML.
+    number
+        The build number.
+    """
+
+    def __init__(self, html: str, number: int):
+        digest = sha1(html.encode('utf')).hexdigest()
+        self.id = '%d-%s' % (number, digest[:12])
+        self.digest = digest
+        spans = section_spans(html) or [(len(html), len(html))]
+        self.slides = [html[start:end] for start, end in spans]
+        self.frame = html[: spans[0][0]] + html[spans[-1][1] :]
+        self.page = self.inject(html)
+
+    def inject(self, html: str) -> str:
+        """
+        Add the live preview client to the presentation HTML.
+        """
+        state = json.dumps(
+            {'revision': self.id, 'prefix': PREFIX, 'manifest': MANIFEST}
+        )
+        script = CLIENT_SCRIPT % state
+        index = html.rfind('</body>')
+        if index < 0:
+            return html + script
+        return html[:index] + script + html[index:]
+
+    def diff(self, previous: 'Revision') -> dict:
+        """
+        Find the slides changed since a previous revision.
+
+        Returns
+        -------
+            The revision identifier, the number of top-level slides and the
+            changed slides, with their index. A full reload is requested
+            instead if anything changed outside the slides or the HTML did
+            not change at all (i.e.: only an image or a stylesheet changed).
+        """
+        if previous is self:
+            return {
+                'revision': self.id,
+                'count': len(self.slides),
+                'slides': [],
+            }
+        if previous.frame != self.frame or previous.digest == self.digest:
+            return {'revision': self.id, 'reload': True}
+        slides = [
+            {'index': index, 'html': slide}
+            for index, slide in enumerate(self.slides)
+            if index >= len(previous.slides) or previous.slides[index] != slide
+        ]
+        return {
+            'revision': self.id,
+            'count': len(self.slides),
+            'slides': slides,
+        }
+
+
+class DeckStore:
+    """
+    In-memory store of the latest presentation builds, notifying connected
+    viewers of each new revision.
+
+    Viewers only fetch the slides changed since the revision they display,
+    after a random delay which grows with the number of viewers, so a
+    rebuild does not make them all fetch the whole presentation at once.
+    Differences are computed once per revision for all viewers.
+
+    Builds publish their HTML to the store as soon as it is generated, so
+    pages are always served from memory, never from a file being written.
+
+    A random token is generated for each store, which presenters must know
+    to open the presenter view and navigate the speaker windows.
+    """
+
+    def __init__(self):
+        self.revisions = OrderedDict()
+        self.latest = None
+        self.count = 0
+        self.diffs = {}
+        self.viewers = set()
+        self.state = None
+        self.token = secrets.token_urlsafe(16)
+
+    def publish(self, html: str):
+        """
+        Publish a new build of the presentation and notify the viewers.
+        """
+        self.count += 1
+        self.latest = Revision(html, self.count)
+        self.revisions[self.latest.id] = self.latest
+        while len(self.revisions) > REVISIONS:
+            self.revisions.popitem(last=False)
+        self.diffs = {}
+        self.broadcast(self.announcement())
+
+    def announcement(self) -> dict:
+        viewers = [v for v in self.viewers if v.role != 'presenter']
+        jitter = min(MAX_JITTER, VIEWER_JITTER * len(viewers))
+        return {'revision': self.latest.id, 'jitter': jitter}
+
+    def diff(self, since: str) -> dict:
+        """
+        Find the slides changed in the latest revision since another one.
+        """
+        if since not in self.diffs:
+            previous = self.revisions.get(since)
+            if previous:
+                self.diffs[since] = self.latest.diff(previous)
+            else:
+                self.diffs[since] = {
+                    'revision': self.latest.id,
+                    'reload': True,
+                }
+        return self.diffs[since]
+
+    def authorized(self, token: str) -> bool:
+        """
+        Whether a token is the presenter token of the store.
+        """
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def receive(self, viewer, message: dict):
+        """
+        Relay the state of the speaker window to the presenter views, and
+        the navigation in the (authorized) presenter views to the speaker
+        windows.
+        """
+        if viewer.role == 'speaker' and 'state' in message:
+            self.state = message['state']
+            self.broadcast({'state': self.state}, role='presenter')
+        elif viewer.role == 'presenter' and 'navigate' in message:
+            if self.authorized(viewer.token):
+                message = {'navigate': message['navigate']}
+                self.broadcast(message, role='speaker')
+
+    def broadcast(self, message: dict, role: str = None):
+        """
+        Send a message to all the connected viewers, or to those with the
+        given role only.
+        """
+        text = json.dumps(message)
+        for viewer in list(self.viewers):
+            if role and viewer.role != role:
+                continue
+            try:
+                viewer.write_message(text)
+            except WebSocketClosedError:
+                self.viewers.discard(viewer)
+
+
+class AssetCache:
+    """
+    Least recently used cache of the contents of small files, validated by
+    their modification time and size on each access.
+
+    Parameters
+    ----------
+    max_size
+        Maximum size of all the cached contents, in bytes.
+    """
+
+    def __init__(self, max_size: int = MAX_ASSETS_SIZE):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.max_size = max_size
+
+    def get(self, path: str) -> Optional[bytes]:
+        """
+        Get the contents of a file, or `None` if it is too big to cache.
+        """
+        stat = os.stat(path)
+        if stat.st_size > MAX_ASSET_SIZE:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.pop(path, None)
+        if entry:
+            self.size -= len(entry[1])
+        if not entry or entry[0] != key:
+            with open(path, 'rb') as asset:
+                entry = (key, asset.read())
+        self.entries[path] = entry
+        self.size += len(entry[1])
+        while self.size > self.max_size:
+            _, (_, content) = self.entries.popitem(last=False)
+            self.size -= len(content)
+        return entry[1]
+
+
+# Contents of the presentation files served recently
+_assets = AssetCache()
+
+
+class AssetHandler(StaticFileHandler):
+    """
+    Serve the presentation files, keeping small ones in memory.
+    """
+
+    @classmethod
+    def get_content(cls, abspath, start=None, end=None):
+        content = _assets.get(abspath)
+        if content is None:
+            return super().get_content(abspath, start, end)
+        return content[start:end]
+
+
+class PageHandler(RequestHandler):
+    """
+    Serve the latest presentation page from memory.
+    """
+
+    def initialize(self, store: DeckStore):
+        self.store = store
+
+    def get(self):
+        self.set_header('Cache-Control', 'no-cache')
+        self.write(self.store.latest.page)
+
+
+class DiffHandler(RequestHandler):
+    """
+    Serve the slides changed since a revision, as JSON.
+    """
+
+    def initialize(self, store: DeckStore):
+        self.store = store
+
+    def get(self):
+        self.set_header('Cache-Control', 'no-cache')
+        self.write(self.store.diff(self.get_argument('since', '')))
+
+
+class PresenterHandler(RequestHandler):
+    """
+    Serve the presenter view, to those with the presenter token only.
+    """
+
+    def initialize(self, store: DeckStore):
+        self.store = store
+
+    def get(self):
+        token = self.get_argument('token', '')
+        if not self.store.authorized(token):
+            raise HTTPError(403)
+        self.write(PRESENTER_PAGE % (json.dumps(PREFIX), json.dumps(token)))
+
+
+class UpdatesHandler(WebSocketHandler):
+    """
+    Notify a viewer of each new revision, and relay the speaker window
+    state to the presenter views.
+
+    Viewers connect with a `role`: `viewer` (the default), `speaker`,
+    `preview` (the slides in the presenter view) or `presenter`, which
+    requires the presenter `token`.
+    """
+
+    def initialize(self, store: DeckStore):
+        self.store = store
+        self.role = 'viewer'
+        self.token = ''
+
+    def open(self):
+        self.role = self.get_argument('role', 'viewer')
+        self.token = self.get_argument('token', '')
+        if self.role == 'presenter' and not self.store.authorized(self.token):
+            self.close(code=1008, reason='Invalid presenter token')
+            return
+        self.store.viewers.add(self)
+        if self.role == 'presenter':
+            if self.store.state:
+                self.write_message(json.dumps({'state': self.store.state}))
+            return
+        self.write_message(json.dumps(self.store.announcement()))
+
+    def on_message(self, message):
+        self.store.receive(self, json.loads(message))
+
+    def on_close(self):
+        self.store.viewers.discard(self)
+
+
+def static_options(root: Path, links: Path = None) -> dict:
+    """
+    Options to serve the files in a directory, following the symbolic links
+    to another one (only required with Tornado >= 6.5).
+    """
+    options = {'path': str(root)}
+    parameters = signature(StaticFileHandler.initialize).parameters
+    if links and 'allowed_symlink_directory' in parameters:
+        directories = [str(root.resolve()), str(links.resolve())]
+        options['allowed_symlink_directory'] = directories
+    return options
+
+
+def make_application(
+    store: DeckStore, root: Path, links: Path = None, debug: bool = False
+) -> Application:
+    """
+    Create the live preview web application.
+
+    Parameters
+    ----------
+    store
+        Store with the latest builds of the presentation.
+    root
+        Output directory, to serve the presentation files from.
+    links
+        Directory the symbolic links in the output directory point to (i.e.:
+        the local directory).
+    debug
+        Whether to run the application in debug mode.
+    """
+    options = {'store': store}
+    return Application(
+        [
+            (r'/(?:index\.html)?', PageHandler, options),
+            (PREFIX + '/diff', DiffHandler, options),
+            (PREFIX + '/presenter', PresenterHandler, options),
+            (PREFIX + '/updates', UpdatesHandler, options),
+            (r'/(.*)', AssetHandler, static_options(root, links)),
+        ],
+        debug=debug,
+    )
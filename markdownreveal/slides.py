@@ -0,0 +1,236 @@
+import json
+import re
+from hashlib import sha1
+from pathlib import Path
+from typing import List
+
+# Slide manifest file, next to the generated `index.html`
+MANIFEST = 'markdownrevealslides.json'
+
+# Opening and closing section tags
+SECTION_REGEX = r'<(/?)section\b([^>]*)>'
+
+# Slide properties used, in order, to match slides with the previous build
+MATCH_KEYS = ('hash', 'anchor', 'indices')
+
+
+def content_hash(html: str) -> str:
+    """
+    Hash of the HTML of a slide.
+    """
+    return sha1(html.encode('utf')).hexdigest()[:16]
+
+
+def make_slide(html: str, attributes: str, indices: List[int]) -> dict:
+    """
+    Describe a slide, given its HTML and the attributes of its section.
+    """
+    anchor = re.search(r'\bid="([^"]*)"', attributes)
+    heading = re.search(r'<h[1-6]\b[^>]*>(.*?)</h[1-6]>', html, re.S)
+    title = re.sub(r'<[^>]*>', '', heading.group(1)) if heading else ''
+    return {
+        'hash': content_hash(html),
+        'anchor': anchor.group(1) if anchor else '',
+        'title': ' '.join(title.split()),
+        'indices': indices,
+    }
+
+
+class SlideScanner:
+    """
+    Find the slides in a generated presentation as its HTML flows.
+
+    Slides are the innermost sections; vertical stacks are not slides on
+    their own. Only the HTML of the current slide is kept in memory.
+
+    Attributes
+    ----------
+    slides
+        The `hash` (of the slide HTML), `anchor` (the section id, if any),
+        `title` and `indices` (horizontal and vertical, as used by
+        reveal.js) of each slide found so far, in order.
+    """
+
+    def __init__(self):
+        self.slides = []
+        self.stack = []
+        self.horizontal = -1
+        self.buffer = ''
+        self.offset = 0
+        self.position = 0
+
+    def feed(self, html: str):
+        self.buffer += html
+        regex = re.compile(SECTION_REGEX)
+        for match in regex.finditer(self.buffer, self.position):
+            self.position = match.end()
+            if match.group(1):
+                self.close(match)
+            else:
+                self.open(match)
+        self.trim()
+
+    def open(self, match):
+        if self.stack:
+            self.stack[-1][2] += 1
+            indices = [self.horizontal, self.stack[-1][2] - 1]
+        else:
+            self.horizontal += 1
+            indices = [self.horizontal, 0]
+        start = self.offset + match.start()
+        self.stack.append([start, match.group(2), 0, indices])
+
+    def close(self, match):
+        if not self.stack:
+            return
+        start, attributes, children, indices = self.stack.pop()
+        if not children:
+            slide = self.buffer[start - self.offset : match.end()]
+            self.slides.append(make_slide(slide, attributes, indices))
+
+    def trim(self):
+        """
+        Forget the scanned HTML, except for the open slide (if any).
+        """
+        end = self.position
+        if self.stack and not self.stack[-1][2]:
+            end = min(end, self.stack[-1][0] - self.offset)
+        self.buffer = self.buffer[end:]
+        self.offset += end
+        self.position -= end
+
+
+def find_slides(html: str) -> List[dict]:
+    """
+    Find the slides in a generated presentation (see `SlideScanner`).
+    """
+    scanner = SlideScanner()
+    scanner.feed(html)
+    return scanner.slides
+
+
+def match_ids(slides: List[dict], unused: dict, key: str):
+    """
+    Reuse the identifiers of previous slides with the same property.
+
+    Parameters
+    ----------
+    slides
+        The new slides, some of which may already have an identifier.
+    unused
+        The previous slides whose identifier was not reused yet, indexed by
+        identifier. Matched slides are removed.
+    key
+        The property to match slides by.
+    """
+    lookup = {}
+    for ident, previous in unused.items():
+        if previous.get(key):
+            lookup.setdefault(json.dumps(previous[key]), ident)
+    for slide in slides:
+        ident = lookup.get(json.dumps(slide[key]))
+        if 'id' in slide or not slide[key] or ident not in unused:
+            continue
+        slide['id'] = ident
+        del unused[ident]
+
+
+def assign_ids(slides: List[dict], previous: List[dict]) -> List[dict]:
+    """
+    Assign stable identifiers to slides.
+
+    Slides keep the identifier of the slide they replace in the previous
+    build: the one with the same content, else the one with the same
+    anchor, else the one in the same position. That way, editing or
+    renaming a slide, or inserting, removing and reordering others, keeps
+    its identifier. New slides are named after their content hash.
+
+    Parameters
+    ----------
+    slides
+        The slides found in the presentation (see `find_slides`).
+    previous
+        The slides in the previous manifest.
+
+    Returns
+    -------
+        The same slides, with their `id`.
+    """
+    unused = {slide['id']: slide for slide in previous}
+    for key in MATCH_KEYS:
+        match_ids(slides, unused, key)
+    taken = {slide['id'] for slide in slides if 'id' in slide}
+    taken.update(unused)
+    for slide in [slide for slide in slides if 'id' not in slide]:
+        ident = 's' + slide['hash'][:8]
+        suffix = 1
+        while ident in taken:
+            suffix += 1
+            ident = 's%s-%d' % (slide['hash'][:8], suffix)
+        slide['id'] = ident
+        taken.add(ident)
+    return slides
+
+
+def read_manifest(directory: Path) -> dict:
+    """
+    Read the slide manifest in an output directory.
+
+    Returns
+    -------
+        The manifest, with the `source` Markdown file and the `slides`, or
+        an empty manifest if it does not exist or is not valid.
+    """
+    try:
+        manifest = json.loads((directory / MANIFEST).read_text())
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault('source', '')
+    manifest.setdefault('slides', [])
+    return manifest
+
+
+def update_manifest(
+    markdown_file: Path,
+    slides: List[dict],
+    directory: Path,
+    reproducible: bool = False,
+) -> dict:
+    """
+    Write the slide manifest of a generated presentation.
+
+    The manifest lists the `id`, `hash`, `anchor`, `title` and `indices` of
+    each slide. Identifiers are stable across builds of the same
+    presentation (see `assign_ids`), so tools can use them to follow a
+    slide, and hashes to know which slides changed (i.e.: to cache
+    thumbnails or PDF pages).
+
+    Parameters
+    ----------
+    markdown_file
+        Presentation Markdown file.
+    slides
+        The slides found in the generated HTML (see `SlideScanner`).
+    directory
+        The output directory.
+    reproducible
+        Whether the manifest must only depend on the HTML: identifiers are
+        not taken from the previous build, and the `source` is the name of
+        the Markdown file instead of its absolute path.
+
+    Returns
+    -------
+        The new manifest.
+    """
+    source = str(markdown_file.resolve())
+    previous = read_manifest(directory)
+    if reproducible:
+        source = markdown_file.name
+    if reproducible or previous['source'] != source:
+        previous['slides'] = []
+    slides = assign_ids(slides, previous['slides'])
+    manifest = {'source': source, 'slides': slides}
+    partial = directory / (MANIFEST + '.part')
+    partial.write_text(json.dumps(manifest, indent=2))
+    partial.replace(directory / MANIFEST)
+    return manifest
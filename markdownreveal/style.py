@@ -0,0 +1,272 @@
+import json
+import os
+import re
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+import yaml
+
+from .typing import Config
+
+# Style files which may be used in the presentation
+STYLE_KEYS = (
+    'style_logo',
+    'style_background',
+    'style_warmup',
+    'style_custom_css',
+)
+
+# Link, within the output directory, to the downloaded style
+STYLE_LINK = 'markdownrevealstyle'
+
+# Index of a compiled style package, within its directory
+PACKAGE_INDEX = '.package.json'
+
+# Version of the style compilation (packages compiled by other versions are
+# compiled again)
+PACKAGE_VERSION = 1
+
+# Compiled style packages, indexed by path and modification time
+_packages = {}
+
+# Resolved style files, indexed by style and local style directories state
+_resolved = {}
+
+# CSS tokens kept verbatim when minifying (strings and URLs), and comments
+CSS_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+CSS_TOKEN_REGEX = r'(%s|url\(\s*(?:%s|[^)]*)\s*\))|/\*.*?\*/' % (
+    CSS_STRING,
+    CSS_STRING,
+)
+
+
+def collapse_css(code: str) -> str:
+    """
+    Remove unnecessary whitespace from CSS code (without strings or URLs).
+    """
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r'\s*([{};,])\s*', r'\1', code)
+    return code.replace(';}', '}')
+
+
+def minify_css(css: str) -> str:
+    """
+    Minify a CSS file, removing comments and unnecessary whitespace.
+
+    Strings and `url()` values are kept verbatim.
+    """
+    chunks = []
+    code = ''
+    position = 0
+    for match in re.finditer(CSS_TOKEN_REGEX, css, re.DOTALL | re.I):
+        code += css[position : match.start()]
+        position = match.end()
+        if match.group(1):
+            chunks.extend([collapse_css(code), match.group(1)])
+            code = ''
+    chunks.append(collapse_css(code + css[position:]))
+    return ''.join(chunks).strip()
+
+
+def optimize_svg(svg: str) -> str:
+    """
+    Optimize an SVG file, removing comments, metadata and indentation.
+    """
+    svg = re.sub(r'<!--.*?-->', '', svg, flags=re.DOTALL)
+    svg = re.sub(r'<metadata\b.*?</metadata>', '', svg, flags=re.DOTALL)
+    svg = re.sub(r'\n\s*', '\n', svg)
+    return svg.strip() + '\n'
+
+
+# Compilers of style files, by suffix
+COMPILERS = {'.css': minify_css, '.svg': optimize_svg}
+
+
+def compile_file(path: Path):
+    """
+    Compile a style file in place, if it has a compiler for its suffix.
+    """
+    compiler = COMPILERS.get(path.suffix.lower())
+    if not compiler:
+        return
+    try:
+        source = path.read_text()
+    except UnicodeDecodeError:
+        return
+    compiled = compiler(source)
+    if compiled != source:
+        path.write_text(compiled)
+
+
+def package_files(path: Path) -> Iterable[Path]:
+    """
+    List the files of a style package, except hidden ones.
+    """
+    for directory, subdirectories, files in os.walk(str(path)):
+        subdirectories[:] = [d for d in subdirectories if d[0] != '.']
+        for name in files:
+            if name[0] != '.':
+                yield Path(directory, name)
+
+
+def compile_style(path: Path) -> dict:
+    """
+    Compile a downloaded style into a style package.
+
+    CSS files are minified and SVG files optimized in place, and an index
+    with the available files and the parsed style configuration is written
+    in the package, so builds use the style without probing or parsing it.
+
+    Parameters
+    ----------
+    path
+        Directory of the downloaded style.
+
+    Returns
+    -------
+        The package index.
+    """
+    files = []
+    for filepath in package_files(path):
+        compile_file(filepath)
+        files.append(filepath.relative_to(path).as_posix())
+    config_file = path / 'config.yaml'
+    config = {}
+    if config_file.exists():
+        config = yaml.safe_load(config_file.read_text()) or {}
+    index = {
+        'version': PACKAGE_VERSION,
+        'files': sorted(files),
+        'config': config,
+    }
+    partial = path / (PACKAGE_INDEX + '.part')
+    partial.write_text(json.dumps(index, default=str))
+    partial.replace(path / PACKAGE_INDEX)
+    return index
+
+
+def read_package(path: Path) -> Optional[dict]:
+    """
+    Read the index of a style package (i.e.: the style link in the output
+    directory), which is cached until the package is compiled again.
+
+    Returns
+    -------
+        The package index, or `None` if the style is not compiled.
+    """
+    index = path / PACKAGE_INDEX
+    try:
+        key = (os.path.realpath(str(index)), index.stat().st_mtime_ns)
+    except OSError:
+        return None
+    package = _packages.get(key)
+    if package is None:
+        package = json.loads(index.read_text())
+        _packages[key] = package
+    if package.get('version') != PACKAGE_VERSION:
+        return None
+    return package
+
+
+def style_config(path: Path) -> Config:
+    """
+    Get the configuration of a downloaded style.
+
+    Parameters
+    ----------
+    path
+        Directory of the style (i.e.: the style link in the output
+        directory).
+    """
+    package = read_package(path)
+    if package is not None:
+        return deepcopy(package['config'])
+    config_file = path / 'config.yaml'
+    if not config_file.exists():
+        return {}
+    return yaml.safe_load(config_file.read_text())
+
+
+def directories_state(directories: Iterable[Path]) -> Tuple:
+    """
+    Get the modification times of some directories, which change when
+    files are added to or removed from them.
+    """
+    state = []
+    for directory in directories:
+        try:
+            state.append(directory.stat().st_mtime_ns)
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+def find_style_files(config: Config) -> Dict[str, Optional[Path]]:
+    """
+    Find the style files, in the local style directory first, and then in
+    the downloaded style.
+
+    Results are cached until the downloaded style or the local style
+    directories change, so builds do not probe each file.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The path of each configured style file (by configuration key)
+        relative to the output directory, or `None` if it does not exist.
+    """
+    outpath = config['local_path'] / 'out'
+    names = {key: config[key] for key in STYLE_KEYS if config.get(key)}
+    local = outpath / config['style_path']
+    directories = sorted({(local / name).parent for name in names.values()})
+    package_path = outpath / STYLE_LINK
+    cache_key = json.dumps(
+        [
+            str(local),
+            names,
+            directories_state(directories),
+            os.path.realpath(str(package_path)),
+            directories_state([package_path / PACKAGE_INDEX]),
+        ]
+    )
+    files = _resolved.get(cache_key)
+    if files is None:
+        package = read_package(package_path)
+        files = _resolved[cache_key] = {
+            key: resolve_style_file(name, config, package)
+            for key, name in names.items()
+        }
+    return files
+
+
+def resolve_style_file(
+    name: str, config: Config, package: Optional[dict]
+) -> Optional[Path]:
+    """
+    Find a style file in the output directory.
+
+    Parameters
+    ----------
+    name
+        Name of the file, within the style directories.
+    config
+        Markdownreveal configuration.
+    package
+        Index of the downloaded style, or `None` if it is not compiled.
+    """
+    outpath = config['local_path'] / 'out'
+    if (outpath / config['style_path'] / name).is_file():
+        return Path(config['style_path'], name)
+    if package is None:
+        exists = (outpath / STYLE_LINK / name).is_file()
+    else:
+        exists = Path(name).as_posix() in package['files']
+    return Path(STYLE_LINK, name) if exists else None
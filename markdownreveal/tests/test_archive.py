@@ -0,0 +1,58 @@
+"""
+Markdownreveal archive module tests.
+"""
+
+import os
+import zipfile
+from hashlib import sha256
+from pathlib import Path
+
+from markdownreveal.archive import write_zip
+
+
+def create_tree(root, mtime):
+    """
+    Create a directory tree, with a symbolic link, in a given order.
+    """
+    (root / 'b').mkdir(parents=True)
+    (root / 'b' / 'z.txt').write_text('z')
+    (root / 'a.txt').write_text('a')
+    (root / 'linked').mkdir()
+    (root / 'linked' / 'file.txt').write_text('linked')
+    (root / 'c').symlink_to(root / 'linked', target_is_directory=True)
+    for path in root.rglob('*'):
+        os.utime(str(path), (mtime, mtime), follow_symlinks=False)
+
+
+def test_write_zip_reproducible(tmpdir, monkeypatch):
+    """
+    Reproducible archives must not depend on timestamps or file order.
+    """
+    tmpdir = Path(str(tmpdir))
+    create_tree(tmpdir / 'first', 1e9)
+    create_tree(tmpdir / 'second', 1.5e9)
+    monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+    digests = []
+    for name in ('first', 'second'):
+        archive = tmpdir / (name + '.zip')
+        write_zip(archive, tmpdir / name, reproducible=True)
+        digests.append(sha256(archive.read_bytes()).hexdigest())
+    assert digests[0] == digests[1]
+
+    with zipfile.ZipFile(str(tmpdir / 'first.zip')) as archive:
+        assert archive.namelist() == [
+            'a.txt',
+            'b/',
+            'b/z.txt',
+            'c/',
+            'c/file.txt',
+            'linked/',
+            'linked/file.txt',
+        ]
+        assert archive.read('c/file.txt') == b'linked'
+        assert archive.getinfo('a.txt').date_time == (1980, 1, 1, 0, 0, 0)
+
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1600000000')
+    write_zip(tmpdir / 'epoch.zip', tmpdir / 'first', reproducible=True)
+    with zipfile.ZipFile(str(tmpdir / 'epoch.zip')) as archive:
+        assert archive.getinfo('a.txt').date_time[:3] == (2020, 9, 13)
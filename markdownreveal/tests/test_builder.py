@@ -0,0 +1,78 @@
+"""
+Markdownreveal builder module tests.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from markdownreveal import builder
+from markdownreveal.builder import Builder
+from markdownreveal.convert import run_command
+from markdownreveal.convert import run_sync
+
+
+def test_run_command_cancel(monkeypatch):
+    """
+    Cancelling `run_command()` must kill the child process.
+    """
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def spawn(*args, **kwargs):
+        process = await create_subprocess_exec(*args, **kwargs)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(asyncio, 'create_subprocess_exec', spawn)
+
+    async def cancel():
+        task = asyncio.ensure_future(run_command(['sleep', '10']))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+
+    t0 = time.time()
+    assert run_sync(cancel())
+    assert time.time() - t0 < 5
+    # The process was killed and reaped
+    assert processes[0].returncode is not None
+    with pytest.raises(ProcessLookupError):
+        os.kill(processes[0].pid, 0)
+
+
+def test_builder_newest_wins(monkeypatch):
+    """
+    A newer build request must cancel the in-flight build.
+    """
+    results = []
+    published = []
+
+    async def fake_build(
+        markdown_file, no_warmup, preview=False, publish=None
+    ):
+        await asyncio.sleep(0.2)
+        publish(markdown_file)
+        return {markdown_file}
+
+    async def scenario():
+        instance = Builder(
+            'first', results.append, period=0, publish=published.append
+        )
+        instance.start()
+        await asyncio.sleep(0.1)
+        instance.markdown_file = 'second'
+        instance.start()
+        await asyncio.sleep(0.5)
+        return instance
+
+    monkeypatch.setattr(builder, 'build', fake_build)
+    instance = run_sync(scenario())
+    assert results == [{'second'}]
+    assert published == ['second']
+    assert instance.stats() == {'built': 1, 'cancelled': 1}
@@ -0,0 +1,132 @@
+"""
+Markdownreveal bundle module tests.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from markdownreveal import bundle
+from markdownreveal.bundle import bundle_assets
+from markdownreveal.bundle import bundle_css
+from markdownreveal.bundle import rebase_css
+
+INDEX = """<html>
+<head>
+  <link rel="stylesheet" href="revealjs/reset.css">
+  <link rel="stylesheet" href="revealjs/theme/white.css" id="theme">
+  <link rel="stylesheet" href="https://example.com/remote.css">
+  <link rel="stylesheet" href="print.css" media="print">
+  <link rel="stylesheet" href="missing.css">
+</head>
+<body>
+  <script src="revealjs/reveal.js"></script>
+  <!-- Plugins -->
+  <script src="revealjs/notes.js"></script>
+  <script>Reveal.initialize();</script>
+  <script src="revealjs/zoom.js"></script>
+</body>
+</html>
+"""
+
+FILES = {
+    'revealjs/reset.css': '/* Reset */\nhtml {\n  margin: 0;\n}\n',
+    'revealjs/theme/white.css': (
+        '@import url(./fonts/sans.css);\n'
+        'body {\n  background: url("../images/white.png");\n}\n'
+    ),
+    'revealjs/reveal.js': 'var Reveal = {};\n',
+    'revealjs/reveal.min.js': 'var Reveal={};\n//# sourceMappingURL=x.map\n',
+    'revealjs/notes.js': 'var Notes = {};\n',
+    'revealjs/zoom.js': 'var Zoom = {};\n',
+    'print.css': 'body { color: black; }',
+}
+
+
+def write_deck(directory, index=INDEX):
+    """
+    Write the presentation files and index.
+    """
+    for name, content in FILES.items():
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (directory / 'index.html').write_text(index)
+
+
+@pytest.fixture
+def deck(tmpdir):
+    directory = Path(str(tmpdir)) / 'deck'
+    write_deck(directory)
+    return directory
+
+
+def test_rebase_css():
+    """
+    Relative URLs must be rewritten relative to the presentation.
+    """
+    css = 'a { background: url("../a.png") } b { background: url(data:x) }'
+    assert rebase_css(css, 'revealjs/theme/white.css') == (
+        'a { background: url("revealjs/a.png") } b { background: url(data:x) }'
+    )
+
+
+def test_bundle_css():
+    """
+    Imports must be moved to the beginning of CSS bundles.
+    """
+    sources = [
+        ('reset.css', 'html { margin: 0; }'),
+        ('theme/white.css', '@import url(fonts/sans.css);\nbody { }'),
+    ]
+    assert bundle_css(sources) == (
+        '@import url(theme/fonts/sans.css);html{margin: 0}body{}'
+    )
+
+
+def test_bundle_assets(deck, tmpdir, monkeypatch):
+    """
+    Consecutive local assets must be bundled, and bundles reused.
+    """
+    config = {'local_path': Path(str(tmpdir)) / 'local'}
+    css, js, zoom = bundle_assets(deck, config)
+    html = (deck / 'index.html').read_text()
+    assert '<link rel="stylesheet" href="%s">' % css.name in html
+    assert '<script src="%s"></script>' % js.name in html
+    assert '<script src="%s"></script>' % zoom.name in html
+    for kept in ['remote.css', 'print.css', 'missing.css', 'initialize']:
+        assert kept in html
+    assert 'revealjs/' not in html
+    assert '<!-- Plugins -->' not in html
+    assert css.read_text() == (
+        '@import url(revealjs/theme/fonts/sans.css);html{margin: 0}'
+        'body{background: url("revealjs/images/white.png")}'
+    )
+    assert js.read_text() == 'var Reveal={};\n;\nvar Notes = {};\n'
+
+    # Bundled files are removed, with the directories left empty
+    assert not (deck / 'revealjs').exists()
+    assert (deck / 'print.css').exists()
+
+    # Unchanged assets are not bundled again
+    monkeypatch.setattr(bundle, 'BUNDLERS', {})
+    write_deck(deck)
+    assert bundle_assets(deck, config) == [css, js, zoom]
+
+
+def test_bundle_assets_referenced(deck, tmpdir):
+    """
+    Bundled files still referenced by the presentation must be kept.
+    """
+    index = INDEX.replace(
+        'Reveal.initialize();',
+        'Reveal.initialize({dependencies: [{src: "revealjs/zoom.js"}]});',
+    )
+    write_deck(deck, index)
+    config = {'local_path': Path(str(tmpdir)) / 'local'}
+    bundle_assets(deck, config)
+    remaining = sorted(
+        path.relative_to(deck).as_posix()
+        for path in (deck / 'revealjs').rglob('*')
+    )
+    assert remaining == ['revealjs/zoom.js']
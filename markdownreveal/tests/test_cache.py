@@ -0,0 +1,135 @@
+"""
+Markdownreveal cache module tests.
+"""
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from markdownreveal.cache import cache_entries
+from markdownreveal.cache import cache_stats
+from markdownreveal.cache import collect_garbage
+from markdownreveal.cache import format_size
+from markdownreveal.cache import parse_size
+from markdownreveal.cache import prune_cache
+from markdownreveal.cache import record_usage
+
+STYLE = 'c75cc1e5ada9fcb9bf140bb481300cd8ca0901b7'
+
+
+@pytest.fixture
+def config(tmpdir):
+    """
+    Configuration with a local cache holding two reveal.js versions, one
+    KaTeX version and one style, 1 KiB each.
+    """
+    localdir = Path(str(tmpdir)) / 'local'
+    for name in ['revealjs/3.8.0', 'revealjs/3.9.2', 'katex/v0.11.1', STYLE]:
+        (localdir / name).mkdir(parents=True)
+        (localdir / name / 'file').write_bytes(b'0' * 1024)
+    (localdir / '.locks').mkdir()
+    (localdir / '.locks' / 'revealjs-3.9.2.lock').touch()
+    (localdir / 'out').mkdir()
+    return {'local_path': localdir, 'output_path': localdir / 'out'}
+
+
+def link(config, names):
+    """
+    Link cache entries from the output directory, as a build would.
+    """
+    outdir = config['output_path']
+    for name, target in names.items():
+        (outdir / name).symlink_to(config['local_path'] / target)
+
+
+def test_parse_size():
+    """
+    Human-readable sizes must be parsed in bytes.
+    """
+    assert parse_size('1024') == 1024
+    assert parse_size('500K') == 500 * 1024
+    assert parse_size('1.5M') == 3 * 2**19
+    assert parse_size('2GiB') == 2 * 2**30
+    with pytest.raises(ValueError):
+        parse_size('much')
+
+
+def test_format_size():
+    """
+    Sizes must be formatted in a human-readable way.
+    """
+    assert format_size(10) == '10B'
+    assert format_size(1536) == '1.5K'
+    assert format_size(3 * 2**30) == '3.0G'
+
+
+def test_cache_entries(config):
+    """
+    Each version, style and template must be a cache entry, lock files
+    excluded.
+    """
+    localdir = config['local_path']
+    (localdir / 'templates').mkdir()
+    (localdir / 'templates' / 'abc.revealjs').touch()
+    names = [p.relative_to(localdir) for p in cache_entries(localdir)]
+    assert [str(name) for name in names] == [
+        STYLE,
+        'katex/v0.11.1',
+        'revealjs/3.8.0',
+        'revealjs/3.9.2',
+        'templates/abc.revealjs',
+    ]
+
+
+def test_record_usage(config, tmpdir):
+    """
+    Builds must record the entries linked from the output directory.
+    """
+    link(config, {'revealjs': 'revealjs/3.9.2', 'katex': 'katex/v0.11.1'})
+    deck = Path(str(tmpdir)) / 'deck.md'
+    deck.touch()
+    record_usage(deck, config)
+    stats = {stat['name']: stat for stat in cache_stats(config)}
+    assert stats['revealjs/3.9.2']['decks'] == 1
+    assert stats['revealjs/3.8.0']['decks'] == 0
+    assert stats['revealjs/3.9.2']['size'] == 1024
+    assert cache_stats(config)[-1]['name'] in [
+        'katex/v0.11.1',
+        'revealjs/3.9.2',
+    ]
+
+
+def test_collect_garbage(config, tmpdir):
+    """
+    Least recently used entries must be removed first.
+    """
+    localdir = config['local_path']
+    old = time.time() - 10 * 24 * 60 * 60
+    os.utime(str(localdir / 'revealjs' / '3.8.0'), (old, old))
+    link(config, {'revealjs': 'revealjs/3.9.2', 'katex': 'katex/v0.11.1'})
+    record_usage(Path(str(tmpdir)) / 'deck.md', config)
+
+    assert collect_garbage(config, max_age=24 * 60 * 60) == ['revealjs/3.8.0']
+    assert collect_garbage(config, max_size=2048) == [STYLE]
+    assert collect_garbage(config, max_size=2048) == []
+    assert not (localdir / 'revealjs' / '3.8.0').exists()
+    assert (localdir / '.locks' / 'revealjs-3.9.2.lock').exists()
+
+
+def test_prune_cache(config, tmpdir):
+    """
+    Entries used by known presentations must be kept.
+    """
+    localdir = config['local_path']
+    kept = Path(str(tmpdir)) / 'kept.md'
+    kept.touch()
+    link(config, {'revealjs': 'revealjs/3.9.2'})
+    record_usage(kept, config)
+    (config['output_path'] / 'revealjs').unlink()
+    link(config, {'revealjs': 'revealjs/3.8.0', 'katex': 'katex/v0.11.1'})
+    record_usage(Path(str(tmpdir)) / 'removed.md', config)
+
+    assert prune_cache(config) == [STYLE, 'katex/v0.11.1', 'revealjs/3.8.0']
+    assert [p.name for p in cache_entries(localdir)] == ['3.9.2']
@@ -1,6 +1,8 @@
+import json
 from os.path import dirname
 from pathlib import Path
 
+from markdownreveal.commands import upload as cmd_upload
 from markdownreveal.commands import zip as cmd_zip
 
 
@@ -12,3 +14,22 @@ def test_zip(clirunner, validate_cliresult):
         markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
         result = clirunner.invoke(cmd_zip, [str(markdown_file)])
         validate_cliresult(result)
+
+
+def test_upload_json_error(clirunner):
+    """
+    Test `upload` cli command reports errors as JSON events.
+    """
+    with clirunner.isolated_filesystem():
+        result = clirunner.invoke(cmd_upload, ['slides.md', '--json'])
+    assert result.exit_code == 1
+    events = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [event['event'] for event in events] == [
+        'phase_start',
+        'phase_finish',
+        'error',
+    ]
+    assert events[1]['phase'] == 'upload'
+    assert events[1]['status'] == 'error'
+    assert events[2]['code'] == 1
+    assert 'origin' in events[2]['message']
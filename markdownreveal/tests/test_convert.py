@@ -1,16 +1,29 @@
 """
 Markdownreveal convert module tests.
 """
+
+import time
 from os.path import dirname
 from pathlib import Path
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
 
+import pytest
 import yaml
 
+from markdownreveal import convert
 from markdownreveal.config import load_config
+from markdownreveal.convert import build
+from markdownreveal.convert import conversion_profile
+from markdownreveal.convert import convert_file
 from markdownreveal.convert import generate
 from markdownreveal.convert import markdown_to_reveal
 from markdownreveal.convert import pandoc_extra_to_args
 from markdownreveal.convert import reveal_extra_to_args
+from markdownreveal.convert import rsync_command
+from markdownreveal.convert import run_command
+from markdownreveal.convert import run_sync
+from markdownreveal.slides import read_manifest
 
 
 def test_pandoc_extra_to_args():
@@ -48,6 +61,16 @@ reveal_extra:
     assert 'key1=value1' in args
 
 
+def test_run_command():
+    """
+    Test `run_command()` coroutine.
+    """
+    output = run_sync(run_command(['cat'], stdin=b'Once upon a time'))
+    assert output == b'Once upon a time'
+    with pytest.raises(CalledProcessError):
+        run_sync(run_command(['false']))
+
+
 def test_markdown_to_reveal():
     """
     Test `markdown_to_reveal()` function.
@@ -109,9 +132,139 @@ def test_markdown_to_reveal_emoji_codes():
     assert text in html
 
 
+def test_convert_file():
+    """
+    Test `convert_file()` streaming conversion.
+    """
+    markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
+    config = load_config()
+    with TemporaryDirectory() as tmpdir:
+        output_file = Path(tmpdir) / 'index.html'
+        references = run_sync(convert_file(markdown_file, output_file, config))
+        html = output_file.read_text()
+        assert not (Path(tmpdir) / 'index.html.part').exists()
+        manifest = read_manifest(Path(tmpdir))
+    assert html.rstrip() == markdown_to_reveal(
+        markdown_file.read_text(), config
+    )
+    assert '<h2>Subsection</h2>' in html
+    assert references == []
+    assert manifest['source'] == str(markdown_file.resolve())
+    assert [slide['title'] for slide in manifest['slides']] == [
+        'Presentation title',
+        'First section',
+        'Subsection',
+    ]
+
+
+def test_convert_file_publish():
+    """
+    Published HTML must be written to the output file in the background.
+    """
+    markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
+    config = load_config()
+    published = []
+    with TemporaryDirectory() as tmpdir:
+        output_file = Path(tmpdir) / 'index.html'
+        run_sync(
+            convert_file(
+                markdown_file, output_file, config, publish=published.append
+            )
+        )
+        for _ in range(100):
+            if output_file.exists():
+                break
+            time.sleep(0.05)
+        assert output_file.read_text() == published[0]
+    assert '<h2>Subsection</h2>' in published[0]
+
+
+def test_build_publish(tmpdir, monkeypatch):
+    """
+    Published builds must not depend on the output file, which is written in
+    the background and removed by `rsync --delete` before each build.
+    """
+    markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
+    monkeypatch.setenv('MARKDOWNREVEAL_HOME', str(tmpdir))
+    monkeypatch.setattr(convert, 'load_lock', lambda *args: None)
+    monkeypatch.setattr(convert, 'initialize_twemoji', lambda config: None)
+    monkeypatch.setattr(
+        convert,
+        'initialize_localdir',
+        lambda config: config['output_path'].mkdir(
+            parents=True, exist_ok=True
+        ),
+    )
+    monkeypatch.setattr(
+        convert,
+        'rsync_command',
+        lambda markdown_file, config: [
+            'rm',
+            '-f',
+            str(config['output_path'] / 'index.html'),
+        ],
+    )
+    published = []
+    for _ in range(2):
+        run_sync(build(markdown_file, publish=published.append))
+    assert len(published) == 2
+    assert published[0] == published[1]
+
+
+def test_rsync_command():
+    """
+    Files generated in the output directory must be kept by `rsync`.
+    """
+    markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
+    command = rsync_command(markdown_file, load_config())
+    excluded = [
+        value
+        for option, value in zip(command, command[1:])
+        if option == '--exclude'
+    ]
+    assert 'markdownrevealimages' in excluded
+    assert 'markdownrevealemoji' in excluded
+    assert 'markdownrevealslides.json' in excluded
+
+
 def test_generate():
     """
     Test `generate()` function.
     """
     markdown_file = Path(dirname(__file__), 'resources', 'presentation.md')
     generate(markdown_file)
+
+
+def test_conversion_profile():
+    """
+    Conversion profiles must be reused while the configuration is the same.
+    """
+    config = load_config()
+    profile = conversion_profile(config)
+    assert conversion_profile(load_config()) is profile
+    assert profile.template.exists()
+    assert '--template=%s' % profile.template in profile.command
+    config['footer'] = 'Footer'
+    assert conversion_profile(config) is not profile
+    config['pandoc_extra']['template'] = 'custom.revealjs'
+    assert conversion_profile(config).template is None
+
+
+def test_convert_file_native_preview():
+    """
+    Native previews must match the Pandoc output.
+    """
+    markdown_file = Path(dirname(__file__), 'resources', 'native.md')
+    config = load_config()
+    config['native_preview'] = True
+    with TemporaryDirectory() as tmpdir:
+        pandoc_file = Path(tmpdir) / 'pandoc.html'
+        native_file = Path(tmpdir) / 'native.html'
+        expected = run_sync(convert_file(markdown_file, pandoc_file, config))
+        references = run_sync(
+            convert_file(markdown_file, native_file, config, preview=True)
+        )
+        assert references == expected
+        pandoc_html = ' '.join(pandoc_file.read_text().split())
+        native_html = ' '.join(native_file.read_text().split())
+        assert native_html == pandoc_html
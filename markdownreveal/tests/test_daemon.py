@@ -0,0 +1,89 @@
+"""
+Markdownreveal daemon module tests.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from markdownreveal import daemon
+from markdownreveal.convert import run_sync
+from markdownreveal.daemon import Daemon
+from markdownreveal.daemon import DaemonError
+from markdownreveal.daemon import DaemonUnavailable
+from markdownreveal.daemon import request
+
+
+@pytest.fixture
+def config(tmpdir, monkeypatch):
+    tmpdir = Path(str(tmpdir))
+    config = {'local_path': tmpdir, 'output_path': tmpdir / 'out'}
+    config['output_path'].mkdir()
+    (config['output_path'] / 'index.html').write_text('<html></html>')
+
+    async def fake_build(markdown_file, no_warmup=False, cwd=None):
+        config['directories'] = (cwd, Path(os.getcwd()))
+        return {markdown_file}
+
+    monkeypatch.setattr(daemon, 'build', fake_build)
+    monkeypatch.setattr(daemon, 'load_config', lambda cwd=None: config)
+    return config
+
+
+@pytest.fixture
+def running(config):
+    """
+    Run the daemon in a background thread.
+    """
+    thread = threading.Thread(target=run_sync, args=(Daemon(config).serve(),))
+    thread.start()
+    while not daemon.socket_path(config).exists():
+        time.sleep(0.01)
+    yield config
+    request(config, 'stop')
+    thread.join()
+
+
+def test_daemon_unavailable(config):
+    """
+    Requests must fail when the daemon is not running.
+    """
+    with pytest.raises(DaemonUnavailable):
+        request(config, 'status')
+
+
+def test_daemon_build(running, tmpdir):
+    """
+    Builds must be run by the daemon and reported in its status.
+    """
+    markdown_file = str(Path(str(tmpdir)) / 'deck.md')
+    export = Path(str(tmpdir)) / 'export'
+    result = request(
+        running,
+        'build',
+        markdown_file=markdown_file,
+        cwd=str(tmpdir),
+        export=str(export),
+    )
+    assert result == [markdown_file]
+    # The client directory is passed to the build, the daemon stays put
+    assert running['directories'] == (Path(str(tmpdir)), Path.cwd())
+    assert (export / 'index.html').read_text() == '<html></html>'
+    status = request(running, 'status')
+    assert list(status['builds']) == [markdown_file]
+    assert request(running, 'invalidate') is None
+    assert request(running, 'slides', cwd=str(tmpdir))['slides'] == []
+
+
+def test_daemon_errors(running):
+    """
+    Failed requests must be reported to the client.
+    """
+    with pytest.raises(DaemonError, match='Unknown command'):
+        request(running, 'fly')
+    with pytest.raises(DaemonError, match='already running'):
+        run_sync(Daemon(running).serve())
+    assert request(running, 'status')['pid']
@@ -0,0 +1,57 @@
+"""
+Markdownreveal dependencies module tests.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from markdownreveal.dependencies import deck_dependencies
+from markdownreveal.dependencies import html_references
+from markdownreveal.dependencies import watched_directories
+
+
+def test_html_references():
+    """
+    Test `html_references()` function.
+    """
+    html = """
+<link rel="stylesheet" href="revealjs/dist/reveal.css">
+<link rel="stylesheet" href="markdownrevealstyle/custom.css">
+<section data-background="style/background.svg">
+<img src="figures/my%20figure.png" />
+<a href="https://example.com">Link</a>
+<a href="#/slide">Internal</a>
+<video poster="poster.jpg" data-src="video.mp4"></video>
+"""
+    assert html_references(html) == [
+        'style/background.svg',
+        'figures/my figure.png',
+        'poster.jpg',
+        'video.mp4',
+    ]
+
+
+def test_deck_dependencies():
+    """
+    Test `deck_dependencies()` function.
+    """
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir).resolve()
+        markdown_file = tmpdir / 'presentation.md'
+        markdown_file.write_text('# Title')
+        config = {
+            'pandoc_extra': {'include-in-header': str(markdown_file)},
+            'style_path': 'style',
+            'style_logo': 'logo.svg',
+            'style_background': 'background.svg',
+            'style_warmup': 'warmup.svg',
+            'style_custom_css': 'custom.css',
+        }
+        references = ['figures/../image.png']
+        dependencies = deck_dependencies(markdown_file, references, config)
+        assert markdown_file in dependencies
+        assert tmpdir / 'image.png' in dependencies
+        assert tmpdir / 'style' / 'logo.svg' in dependencies
+        assert tmpdir / 'style' / 'custom.css' in dependencies
+        assert Path.cwd() / 'config.yaml' in dependencies
+        assert watched_directories(dependencies) == {tmpdir, Path.cwd()}
@@ -0,0 +1,142 @@
+"""
+Markdownreveal emoji module tests.
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+import requests
+
+from markdownreveal import emoji
+from markdownreveal.cache import linked_entries
+from markdownreveal.emoji import EMOJI_REGEX
+from markdownreveal.emoji import EmojiRenderer
+from markdownreveal.emoji import emoji_names
+from markdownreveal.emoji import initialize_twemoji
+
+HTML = [
+    '<head>',
+    '<title>Smile \U0001f604</title>',
+    '</head>',
+    '<p title="\U0001f604">Smile \U0001f604, love ❤️, and',
+    'unknown \U0001faff</p>',
+]
+
+
+@pytest.fixture
+def config(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    images = tmpdir / 'twemoji' / 'v15.1.0' / 'assets' / 'svg'
+    images.mkdir(parents=True)
+    for name in ['1f604.svg', '2764.svg', '1f44d.svg']:
+        (images / name).write_text('<svg></svg>')
+    (tmpdir / 'out').mkdir()
+    return {
+        'twemoji': True,
+        'twemoji_version': 'v15.1.0',
+        'prune_assets': True,
+        'local_path': tmpdir,
+        'output_path': tmpdir / 'out',
+        'twemoji_path': images,
+    }
+
+
+def test_emoji_names():
+    """
+    Twemoji images are named after the emoji code points.
+    """
+    assert emoji_names('❤️') == ['2764.svg']
+    assert emoji_names('1️⃣') == ['31-20e3.svg']
+    assert emoji_names('\U0001f44d\U0001f3fd') == ['1f44d-1f3fd.svg']
+    assert emoji_names('\U0001f3f3️‍\U0001f308') == [
+        '1f3f3-fe0f-200d-1f308.svg',
+        '1f3f3-200d-1f308.svg',
+    ]
+
+
+def test_emoji_regex():
+    """
+    Only emoji presentation sequences must be found, not symbols displayed
+    as text by default.
+    """
+    text = '© ®️ ™ ❤ ❤️ ⌚ ⌚︎ \U0001f604 \U0001f44d\U0001f3fd 1️⃣'
+    text += ' \U0001f1ea\U0001f1f8'
+    assert re.findall(EMOJI_REGEX, text) == [
+        '®️',
+        '❤️',
+        '⌚',
+        '\U0001f604',
+        '\U0001f44d\U0001f3fd',
+        '1️⃣',
+        '\U0001f1ea\U0001f1f8',
+    ]
+
+
+def test_emoji_renderer(config):
+    """
+    Emoji in the text must be replaced by the Twemoji images, and only the
+    images used must be linked from the output directory.
+    """
+    html = EmojiRenderer(config).render_html(list(HTML))
+    image = '<img class="emoji" draggable="false" alt="%s" src="%s" />'
+    assert html == [
+        '<head>',
+        '<title>Smile \U0001f604</title>',
+        '</head>',
+        '<p title="\U0001f604">Smile %s, love %s, and'
+        % (
+            image % ('\U0001f604', 'markdownrevealemoji/1f604.svg'),
+            image % ('❤️', 'markdownrevealemoji/2764.svg'),
+        ),
+        'unknown \U0001faff</p>',
+    ]
+    links = sorted(config['output_path'].glob('markdownrevealemoji/*'))
+    assert [link.name for link in links] == ['1f604.svg', '2764.svg']
+    assert linked_entries(config) == ['twemoji/v15.1.0']
+
+
+def test_emoji_renderer_pending(config):
+    """
+    Twemoji must only be installed once emoji are found in the text.
+    """
+    del config['twemoji_path']
+    renderer = EmojiRenderer(config)
+    assert not renderer.pending(['<title>Smile \U0001f604</title>', 'Hi'])
+    assert renderer.pending(list(HTML))
+    assert renderer.render_html(list(HTML)) == HTML
+    assert initialize_twemoji(config) == config['twemoji_path']
+    assert not renderer.pending(list(HTML))
+
+
+def test_emoji_renderer_offline(config, monkeypatch):
+    """
+    Emoji must be kept as they are if Twemoji cannot be downloaded, and the
+    download must not be retried by the process.
+    """
+    attempts = []
+
+    def fail(**kwargs):
+        attempts.append(kwargs)
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(emoji, 'install_project', fail)
+    monkeypatch.setattr(emoji, '_unavailable', set())
+    del config['twemoji_path']
+    config['twemoji_version'] = 'latest'
+    renderer = EmojiRenderer(config)
+    assert renderer.pending(list(HTML))
+    assert initialize_twemoji(config) is None
+    assert initialize_twemoji(config) is None
+    assert len(attempts) == 1
+    assert not renderer.pending(list(HTML))
+    assert renderer.render_html(list(HTML)) == HTML
+
+
+def test_emoji_renderer_disabled(config):
+    """
+    Nothing must be changed when Twemoji is disabled.
+    """
+    config['twemoji'] = False
+    assert EmojiRenderer(config).render_html(list(HTML)) == HTML
+    assert not (config['output_path'] / 'markdownrevealemoji').exists()
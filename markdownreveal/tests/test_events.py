@@ -0,0 +1,53 @@
+"""
+Markdownreveal events module tests.
+"""
+
+import io
+import json
+
+import pytest
+
+from markdownreveal import events
+
+
+@pytest.fixture
+def stream():
+    stream = io.StringIO()
+    events.enable(stream)
+    yield stream
+    events.disable()
+
+
+def read_events(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_emit(stream):
+    """
+    Events must be written as lines of JSON, only when enabled.
+    """
+    events.emit('cache', cache='install', key='revealjs', hit=True)
+    events.disable()
+    events.emit('cache', cache='install', key='katex', hit=False)
+    [event] = read_events(stream)
+    assert event['event'] == 'cache'
+    assert event['key'] == 'revealjs'
+    assert event['hit'] is True
+    assert 'time' in event
+
+
+def test_phase(stream):
+    """
+    Phases must report their duration and whether they failed.
+    """
+    with events.phase('rsync'):
+        pass
+    with pytest.raises(ValueError):
+        with events.phase('convert', generation=2):
+            raise ValueError()
+    start, finish, failed_start, failed = read_events(stream)
+    assert (start['event'], start['phase']) == ('phase_start', 'rsync')
+    assert finish['status'] == 'ok'
+    assert finish['duration'] >= 0
+    assert failed_start['generation'] == 2
+    assert (failed['status'], failed['generation']) == ('error', 2)
@@ -0,0 +1,53 @@
+"""
+Markdownreveal images module tests.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from markdownreveal.images import IMAGES_DIRECTORY
+from markdownreveal.images import optimize_images
+
+
+def test_optimize_images():
+    """
+    Test `optimize_images()` function.
+    """
+    image = pytest.importorskip('PIL.Image')
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = {
+            'optimize_images': True,
+            'optimize_images_width': 640,
+            'optimize_images_quality': 80,
+            'local_path': tmpdir,
+            'output_path': tmpdir / 'out',
+        }
+        config['output_path'].mkdir()
+        photo = config['output_path'] / 'photo.png'
+        image.new('RGB', (4000, 3000), (200, 30, 30)).save(str(photo))
+        html = [
+            '<section id="slide" data-background="photo.png">',
+            '<img src="photo.png" alt="Photo" />',
+            '<img src="style/logo.svg" />',
+            '</section>',
+        ]
+        optimize_images(html, config)
+        assert 'data-background="%s/' % IMAGES_DIRECTORY in html[0]
+        assert html[1].startswith('<img data-src="%s/' % IMAGES_DIRECTORY)
+        assert html[2] == '<img data-src="style/logo.svg" />'
+        variant = config['output_path'] / html[1].split('"')[1]
+        with image.open(str(variant)) as optimized:
+            assert optimized.format == 'WEBP'
+            assert optimized.size == (640, 480)
+
+
+def test_optimize_images_disabled():
+    """
+    Nothing should change when images optimization is disabled.
+    """
+    html = ['<section>', '<img src="photo.png" />', '</section>']
+    optimize_images(html, {'optimize_images': False})
+    assert html == ['<section>', '<img src="photo.png" />', '</section>']
@@ -0,0 +1,116 @@
+"""
+Markdownreveal katex module tests.
+"""
+
+from pathlib import Path
+from shutil import which
+
+import pytest
+
+from markdownreveal.convert import run_sync
+from markdownreveal.katex import FALLBACK_SCRIPT
+from markdownreveal.katex import KatexRenderer
+
+pytestmark = pytest.mark.skipif(not which('node'), reason='Requires Node.js')
+
+# A fake KaTeX module, showing how formulas are rendered
+FAKE_KATEX = """
+module.exports = {
+  renderToString: function(tex, options) {
+    while (tex === 'slow') {}
+    return (options.displayMode ? 'display:' : 'inline:') + tex;
+  }
+};
+"""
+
+HTML = [
+    '<head>',
+    '  <script defer="" src="katex/katex.min.js"></script>',
+    '  <script>document.addEventListener("DOMContentLoaded", function () {',
+    '   katex.render(texText.data, mathElements[i], {});',
+    '  </script>',
+    '  <link rel="stylesheet" href="katex/katex.min.css" />',
+    '</head>',
+    '<p><span class="math inline">a &lt; b</span> and <span',
+    'class="math display">\\sum x</span></p>',
+]
+
+
+@pytest.fixture
+def config(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    (tmpdir / 'out' / 'katex').mkdir(parents=True)
+    (tmpdir / 'out' / 'katex' / 'katex.js').write_text(FAKE_KATEX)
+    return {
+        'katex': True,
+        'katex_prerender': True,
+        'local_path': tmpdir,
+        'output_path': tmpdir / 'out',
+    }
+
+
+async def render_html(config, html):
+    async with KatexRenderer(config) as renderer:
+        return renderer, await renderer.render_html(list(html))
+
+
+def test_katex_renderer(config):
+    """
+    Formulas must be pre-rendered and client-side scripts removed.
+    """
+    _, html = run_sync(render_html(config, HTML))
+    assert html == [
+        '<head>',
+        '  <link rel="stylesheet" href="katex/katex.min.css" />',
+        '</head>',
+        '<p><span class="math inline">inline:a < b</span> and '
+        '<span class="math display">display:\\sum x</span></p>',
+    ]
+
+    # Cached formulas do not require Node.js
+    renderer, cached = run_sync(render_html(config, HTML))
+    assert cached == html
+    assert renderer.process is None
+
+
+def test_katex_renderer_macros(config):
+    """
+    Formulas following a macro definition must not be cached.
+    """
+
+    async def render(formulas):
+        async with KatexRenderer(config) as renderer:
+            return renderer, await renderer.render(formulas)
+
+    formulas = [['x', False], ['\\gdef\\R{\\mathbb{R}}', False], ['y', False]]
+    renderer, rendered = run_sync(render(formulas))
+    assert rendered == ['inline:' + tex for tex, _ in formulas]
+    assert len(list(renderer.cache.iterdir())) == 1
+
+
+def test_katex_renderer_timeout(config):
+    """
+    Formulas must be rendered in the browser if pre-rendering is too slow.
+    """
+    config['katex_timeout'] = 0.5
+    slow = [line.replace('\\sum x', 'slow') for line in HTML]
+    renderer, html = run_sync(render_html(config, slow))
+    assert not renderer.enabled
+    scripts = ['<script defer="" src="katex/katex.min.js"></script>']
+    assert html == scripts + FALLBACK_SCRIPT.split('\n') + [
+        '<head>',
+        '  <link rel="stylesheet" href="katex/katex.min.css" />',
+        '</head>',
+        '<p><span class="math inline">a &lt; b</span> and <span',
+        'class="math display">slow</span></p>',
+    ]
+
+
+def test_katex_renderer_disabled(config):
+    """
+    Nothing must be changed when pre-rendering is disabled.
+    """
+    config['katex_prerender'] = False
+    renderer, html = run_sync(render_html(config, HTML))
+    assert not renderer.enabled
+    assert html == HTML
@@ -1,21 +1,181 @@
 """
 Markdownreveal local module tests.
 """
+
+import io
 import json
+import os
+import tarfile
+import threading
 import time
 from hashlib import sha1
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
 from pathlib import Path
 from shutil import rmtree
 from tarfile import TarInfo
+from tempfile import TemporaryDirectory
 from tempfile import mkdtemp
 
 import pytest
+import requests
+
+from markdownreveal.local import ChecksumError
 from markdownreveal.local import clean_tar_members
+from markdownreveal.local import create_session
+from markdownreveal.local import download
 from markdownreveal.local import initialize_localdir
+from markdownreveal.local import initialize_localdir_project
+from markdownreveal.local import install
+from markdownreveal.local import is_installed
 from markdownreveal.local import latest_project_release
+from markdownreveal.local import read_manifest
+
+
+def create_tarball():
+    """
+    Create an in-memory .tar.gz file with a top-level directory.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        names = ['index.html', 'test/test.js', 'docs/guide.md']
+        for name in ['project/' + name for name in names]:
+            content = os.urandom(2**18)
+            info = TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Serve a tarball, breaking the first connection halfway through.
+    """
+
+    content = create_tarball()
+    requests = []
+
+    def do_GET(self):  # noqa: N802
+        start = int(self.headers.get('Range', 'bytes=0-')[6:-1])
+        self.requests.append(self.headers.get('Range'))
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Length', str(len(self.content) - start))
+        self.end_headers()
+        end = len(self.content) // 2 if len(self.requests) == 1 else None
+        self.wfile.write(self.content[start:end])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    FlakyHandler.requests = []
+    server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%s' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_resume(http_server):
+    """
+    Test `download()` resumes interrupted downloads.
+    """
+    with TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'file.tar.gz'
+        download(create_session(), http_server + '/file.tar.gz', path)
+        assert path.read_bytes() == FlakyHandler.content
+        assert not path.with_name('file.tar.gz.part').exists()
+    assert FlakyHandler.requests[0] is None
+    assert FlakyHandler.requests[1].startswith('bytes=')
+
+
+def test_install_checksum(http_server):
+    """
+    Test `install()` verifies and records the checksum of the .tar file.
+    """
+    url = http_server + '/file.tar.gz'
+    checksum = sha256(FlakyHandler.content).hexdigest()
+    with TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'project'
+        with pytest.raises(ChecksumError):
+            install(create_session(), url, path, checksum='0' * 64)
+        assert not path.exists()
+        assert install(create_session(), url, path, checksum=checksum) == (
+            checksum
+        )
+        manifest = read_manifest(path)
+        assert (manifest['url'], manifest['sha256']) == (url, checksum)
+
+
+def test_initialize_localdir_project_local(http_server):
+    """
+    Test `initialize_localdir_project()` against a local HTTP server.
+    """
+    with TemporaryDirectory() as tmpdir:
+        localdir = Path(tmpdir)
+        outdir = localdir / 'out'
+        outdir.mkdir()
+        initialize_localdir_project(
+            github='project',
+            outdir=outdir,
+            localdir=localdir,
+            project_version='1.0.0',
+            name='project',
+            download_url=http_server + '/{project}/{version}.tar.gz',
+        )
+        assert (outdir / 'project' / 'index.html').exists()
+        assert not (outdir / 'project' / 'test').exists()
+        installed = sorted(p.name for p in (localdir / 'project').iterdir())
+        assert installed == ['1.0.0']
+        assert not (localdir / 'project' / '.1.0.0.lock').exists()
+
+
+def test_initialize_localdir_project_profile(http_server):
+    """
+    Test `initialize_localdir_project()` with extraction profiles.
+    """
+    with TemporaryDirectory() as tmpdir:
+        localdir = Path(tmpdir)
+        outdir = localdir / 'out'
+        outdir.mkdir()
+        kwargs = dict(
+            github='project',
+            outdir=outdir,
+            localdir=localdir,
+            project_version='1.0.0',
+            name='project',
+            download_url=http_server + '/{project}/{version}.tar.gz',
+        )
+        project = localdir / 'project' / '1.0.0'
+        initialize_localdir_project(profile=['index.html'], **kwargs)
+        assert (project / 'index.html').exists()
+        assert not (project / 'docs').exists()
+        assert is_installed(project, ['index.html'])
+        assert not is_installed(project, ['docs/*'])
+        assert not is_installed(project)
+        # Extending the profile keeps previously installed files
+        initialize_localdir_project(profile=['docs/*'], **kwargs)
+        assert (project / 'index.html').exists()
+        assert (project / 'docs' / 'guide.md').exists()
+        assert is_installed(project, ['index.html', 'docs/*'])
+
+
+@pytest.fixture
+def github():
+    """
+    Skip tests requiring GitHub when it cannot be reached.
+    """
+    try:
+        create_session().head('https://api.github.com', timeout=5)
+    except requests.RequestException:
+        pytest.skip('Requires access to GitHub')
 
 
-def test_latest_project_release():
+def test_latest_project_release(github):
     """
     Test `latest_project_release()` function.
     """
@@ -47,16 +207,28 @@ def test_clean_tar_members():
     assert all(x.name == y.name for x, y in zip(output, result))
 
 
+def test_clean_tar_members_profile():
+    """
+    Test `clean_tar_members()` function with an extraction profile.
+    """
+    members = [
+        TarInfo('toplevel/dist/reveal.js'),
+        TarInfo('toplevel/dist/theme/white.css'),
+        TarInfo('toplevel/dist/theme/black.css'),
+        TarInfo('toplevel/examples/index.html'),
+    ]
+    profile = ['dist/*.js', 'dist/theme/white.css']
+    result = clean_tar_members(members, profile)
+    assert [x.name for x in result] == [
+        'dist/reveal.js',
+        'dist/theme/white.css',
+    ]
+
+
 @pytest.mark.parametrize(
     'reveal_version,katex_version,reveal_tag,katex_tag,style',
     [
-        (
-            'latest',
-            'latest',
-            latest_project_release(github='hakimel/reveal.js'),
-            latest_project_release(github='khan/katex'),
-            '',
-        ),
+        ('latest', 'latest', None, None, ''),
         (
             '3.4.0',
             'v0.7.1',
@@ -68,11 +240,13 @@ def test_clean_tar_members():
     ],
 )
 def test_initialize_localdir(
-    reveal_version, katex_version, reveal_tag, katex_tag, style
+    github, reveal_version, katex_version, reveal_tag, katex_tag, style
 ):
     """
     Test `initialize_localdir()` function.
     """
+    reveal_tag = reveal_tag or latest_project_release('hakimel/reveal.js')
+    katex_tag = katex_tag or latest_project_release('khan/katex')
     localdir = Path(mkdtemp())
     config = {
         'local_path': localdir,
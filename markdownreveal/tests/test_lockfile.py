@@ -0,0 +1,112 @@
+"""
+Markdownreveal lockfile module tests.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from markdownreveal import lockfile
+from markdownreveal.local import MANIFEST
+from markdownreveal.local import style_directory
+from markdownreveal.lockfile import LOCKFILE
+from markdownreveal.lockfile import apply_lock
+from markdownreveal.lockfile import read_lockfile
+from markdownreveal.lockfile import update_lockfile
+
+
+@pytest.fixture
+def network(monkeypatch):
+    """
+    Fake the resolution of versions and the installation of files, which
+    record the checksum of the installed version in the manifest.
+    """
+    releases = {'hakimel/reveal.js': '5.1.0', 'Khan/KaTeX': 'v0.16.9'}
+    installed = []
+    network = {'releases': releases, 'installed': installed}
+
+    def fake_release(github, session):
+        return releases[github]
+
+    def fake_install(session, url, path, profile=None, checksum=None):
+        installed.append(url)
+        path.mkdir(parents=True, exist_ok=True)
+        sha256 = 'sha-' + url.split('/')[-1]
+        (path / MANIFEST).write_text('{"sha256": "%s"}' % sha256)
+        return sha256
+
+    def fake_install_project(localdir, project_version, name, **kwargs):
+        path = localdir / name / project_version
+        url = kwargs['download_url'].format(
+            project=kwargs['github'], version=project_version
+        )
+        if not path.exists():
+            fake_install(None, url, path)
+        return path
+
+    monkeypatch.setattr(lockfile, 'latest_project_release', fake_release)
+    monkeypatch.setattr(lockfile, 'install', fake_install)
+    monkeypatch.setattr(lockfile, 'install_project', fake_install_project)
+    return network
+
+
+@pytest.fixture
+def config(tmpdir):
+    return {
+        'local_path': Path(str(tmpdir)) / 'local',
+        'reveal_version': 'latest',
+        'katex_version': 'v0.10.0',
+        'style': 'https://example.com/style.tar.gz',
+    }
+
+
+def test_update_lockfile(tmpdir, network, config):
+    """
+    Locked versions must be kept until the lock file is updated.
+    """
+    markdown_file = Path(str(tmpdir)) / 'slides.md'
+    lock = update_lockfile(markdown_file, config)
+    assert lock == read_lockfile(markdown_file.parent / LOCKFILE)
+    assert lock['revealjs'] == {
+        'version': '5.1.0',
+        'url': 'https://github.com/hakimel/reveal.js/archive/5.1.0.tar.gz',
+        'sha256': 'sha-5.1.0.tar.gz',
+    }
+    assert lock['katex']['version'] == 'v0.10.0'
+    assert lock['style'] == {
+        'url': 'https://example.com/style.tar.gz',
+        'sha256': 'sha-style.tar.gz',
+    }
+    assert len(network['installed']) == 3
+
+    # Locked versions are kept, even if a newer release exists
+    network['releases']['hakimel/reveal.js'] = '6.0.0'
+    assert update_lockfile(markdown_file, config) == lock
+    assert len(network['installed']) == 3
+
+    # Updating resolves the versions and downloads the style again
+    lock = update_lockfile(markdown_file, config, update=True)
+    assert lock['revealjs']['version'] == '6.0.0'
+    assert network['installed'][3:] == [
+        'https://github.com/hakimel/reveal.js/archive/6.0.0.tar.gz',
+        'https://example.com/style.tar.gz',
+    ]
+
+
+def test_apply_lock(tmpdir, network, config):
+    """
+    Applying a lock must not require any request.
+    """
+    markdown_file = Path(str(tmpdir)) / 'slides.md'
+    apply_lock(markdown_file, config)
+    assert config['reveal_version'] == 'latest'
+    assert config['lock'] == {}
+
+    lock = update_lockfile(markdown_file, config)
+    network['releases'].clear()
+    apply_lock(markdown_file, config)
+    assert config['reveal_version'] == '5.1.0'
+    assert config['katex_version'] == 'v0.10.0'
+    assert config['lock'] == lock
+    style = style_directory(config['local_path'], config['style'])
+    assert style.exists()
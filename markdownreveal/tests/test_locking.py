@@ -0,0 +1,110 @@
+"""
+Markdownreveal locking module tests.
+"""
+
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from markdownreveal.convert import run_sync
+from markdownreveal.local import clean_localdir
+from markdownreveal.locking import async_file_lock
+from markdownreveal.locking import file_lock
+
+# Try to acquire a lock without blocking, printing whether it succeeded
+PROBE = """
+import fcntl, os, sys
+descriptor = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)
+flag = fcntl.LOCK_SH if sys.argv[2] == 'shared' else fcntl.LOCK_EX
+try:
+    fcntl.flock(descriptor, flag | fcntl.LOCK_NB)
+    print('acquired')
+except OSError:
+    print('blocked')
+"""
+
+
+def probe(path: Path, mode: str) -> str:
+    command = [sys.executable, '-c', PROBE, str(path), mode]
+    return subprocess.check_output(command).decode('utf-8').strip()
+
+
+def test_file_lock_exclusive(tmpdir):
+    """
+    An exclusive lock must block any other process.
+    """
+    path = Path(str(tmpdir)) / '.test.lock'
+    with file_lock(path):
+        assert probe(path, 'shared') == 'blocked'
+        assert probe(path, 'exclusive') == 'blocked'
+    assert probe(path, 'exclusive') == 'acquired'
+
+
+def test_file_lock_shared(tmpdir):
+    """
+    Shared locks must coexist, but block exclusive locks.
+    """
+    path = Path(str(tmpdir)) / '.test.lock'
+    with file_lock(path, shared=True):
+        assert probe(path, 'shared') == 'acquired'
+        assert probe(path, 'exclusive') == 'blocked'
+
+
+def test_file_lock_reentrant(tmpdir):
+    """
+    Nested locks on the same path must not deadlock within a thread, nor
+    within the coroutines it runs.
+    """
+    path = Path(str(tmpdir)) / '.test.lock'
+
+    async def nested():
+        async with async_file_lock(path):
+            return probe(path, 'shared')
+
+    with file_lock(path):
+        with file_lock(path, shared=True):
+            assert probe(path, 'shared') == 'blocked'
+        assert run_sync(nested()) == 'blocked'
+        assert probe(path, 'shared') == 'blocked'
+    assert probe(path, 'shared') == 'acquired'
+
+
+def test_async_file_lock(tmpdir):
+    """
+    Tasks must not reuse each other's locks, and must wait for them without
+    blocking the event loop.
+    """
+    path = Path(str(tmpdir)) / '.test.lock'
+    events = []
+
+    async def hold():
+        async with async_file_lock(path):
+            events.append('acquired')
+            await asyncio.sleep(0.2)
+            events.append('released')
+
+    async def tick():
+        await asyncio.sleep(0.1)
+        events.append('tick')
+
+    async def scenario():
+        await asyncio.gather(hold(), hold(), tick())
+
+    run_sync(scenario())
+    assert events == ['acquired', 'tick', 'released', 'acquired', 'released']
+
+
+def test_clean_localdir(tmpdir):
+    """
+    Cleaning the local directory must keep the lock files.
+    """
+    localdir = Path(str(tmpdir))
+    (localdir / 'revealjs' / 'js').mkdir(parents=True)
+    (localdir / 'revealjs-3.9.2').symlink_to(localdir / 'revealjs')
+    (localdir / '.locks').mkdir()
+    (localdir / '.locks' / 'revealjs-3.9.2.lock').touch()
+    clean_localdir({'local_path': localdir})
+    names = sorted(path.name for path in localdir.iterdir())
+    assert names == ['.cache.lock', '.locks', '.output.lock']
+    assert (localdir / '.locks' / 'revealjs-3.9.2.lock').exists()
@@ -0,0 +1,102 @@
+"""
+Markdownreveal native module tests.
+"""
+
+import re
+import subprocess
+from distutils.version import LooseVersion
+from os.path import dirname
+from pathlib import Path
+
+import pytest
+from pypandoc import get_pandoc_path
+from pypandoc import get_pandoc_version
+
+from markdownreveal.native import UnsupportedMarkdown
+from markdownreveal.native import identifier
+from markdownreveal.native import render_markdown
+
+RESOURCES = Path(dirname(__file__), 'resources')
+
+pandoc3 = pytest.mark.skipif(
+    LooseVersion(get_pandoc_version()) < LooseVersion('3.0'),
+    reason='The native renderer mimics Pandoc 3',
+)
+
+SUPPORTED = [
+    '# Only a title\n\ntext\n\n# Other',
+    '## x\n\n# y\n\n## z',
+    '# y\n\ntext\n## not a heading',
+    '## Heading\n- a\n- b',
+    '---\ntitle: YAML\n---\n\n## a\n\nb',
+    '## Title ##\n\nA *nested **strong** emphasis*.',
+    '## 1 2 3\n\n## Hi_there. ok-yes\n\n## *Hi*\n\n## Hi',
+]
+
+UNSUPPORTED = [
+    '## Loose\n\n- a\n\n- b',
+    '## Math $x^2$',
+    '## Quote\n\n> text',
+    '## Table\n\n| a | b |\n|---|---|\n| 1 | 2 |',
+    '## Notes\n\n::: notes\ntext\n:::',
+    '## Emoji :smile:',
+    '## Code\n\n```python\nx = 1\n```',
+    '## Nested\n\n- a\n  - b',
+    '## Start\n\n3. a\n4. b',
+    '## Rule\n\n---\n\ntext',
+    '## Raw <b>HTML</b>',
+    '### Deeper heading',
+]
+
+
+def normalize(html: str) -> str:
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+def pandoc(text: str) -> str:
+    command = [get_pandoc_path(), '--from=markdown+emoji', '--to=revealjs']
+    command.append('--slide-level=2')
+    output = subprocess.check_output(command, input=text.encode('utf'))
+    return output.decode('utf')
+
+
+@pandoc3
+@pytest.mark.parametrize('name', ['presentation.md', 'native.md'])
+def test_render_markdown_decks(name):
+    """
+    The native renderer must match Pandoc on the sample decks.
+    """
+    text = (RESOURCES / name).read_text()
+    metadata, html = render_markdown(text, emoji=True)
+    assert metadata.startswith('% ')
+    assert normalize('\n'.join(html)) == normalize(pandoc(text))
+
+
+@pandoc3
+@pytest.mark.parametrize('text', SUPPORTED)
+def test_render_markdown(text):
+    """
+    The native renderer must match Pandoc on supported constructs.
+    """
+    metadata, html = render_markdown(text, emoji=True)
+    assert normalize('\n'.join(html)) == normalize(pandoc(text))
+
+
+@pytest.mark.parametrize('text', UNSUPPORTED)
+def test_render_markdown_unsupported(text):
+    """
+    Unsupported constructs must be reported, to fall back to Pandoc.
+    """
+    with pytest.raises(UnsupportedMarkdown):
+        render_markdown(text, emoji=True)
+
+
+def test_identifier():
+    """
+    Test `identifier()` function.
+    """
+    used = {}
+    assert identifier('2nd Section!', used) == 'nd-section'
+    assert identifier('Últimas cosas', used) == 'últimas-cosas'
+    assert identifier('Section', used) == 'section'
+    assert identifier('1 2 3', used) == 'section-1'
@@ -0,0 +1,178 @@
+"""
+Markdownreveal remote module tests.
+"""
+
+import threading
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from pathlib import Path
+
+import pytest
+
+from markdownreveal.remote import HttpCache
+from markdownreveal.remote import fetch_deck
+from markdownreveal.remote import is_exported
+from markdownreveal.remote import is_remote_markdown
+from markdownreveal.remote import record_export
+from markdownreveal.remote import remote_references
+
+MARKDOWN = """
+# Slide
+
+![Image](images/image.png)
+
+## Other {data-background-image="background.svg"}
+
+![Remote](https://example.com/remote.png) [Link](../outside.png)
+"""
+
+
+class CachingHandler(BaseHTTPRequestHandler):
+    """
+    Serve files with an `ETag`, answering conditional requests.
+    """
+
+    files = {}
+    requests = []
+
+    def do_GET(self):  # noqa: N802
+        content = self.files.get(self.path)
+        etag = content and '"%s"' % sha1(content).hexdigest()
+        if content is None:
+            status = 404
+        elif self.headers.get('If-None-Match') == etag:
+            status = 304
+        else:
+            status = 200
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if status == 200:
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    CachingHandler.files = {
+        '/deck/slides.md': MARKDOWN.encode('utf'),
+        '/deck/images/image.png': b'image',
+        '/deck/background.svg': b'<svg/>',
+        '/deck/style/logo.svg': b'<svg>logo</svg>',
+    }
+    CachingHandler.requests = []
+    server = HTTPServer(('127.0.0.1', 0), CachingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%s' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config(tmpdir):
+    return {
+        'local_path': Path(str(tmpdir)),
+        'style_path': 'style',
+        'style_logo': 'logo.svg',
+        'style_background': 'background.svg',
+        'style_warmup': 'warmup.svg',
+        'style_custom_css': 'custom.css',
+    }
+
+
+def test_is_remote_markdown():
+    """
+    Only URLs of Markdown files are fetched and built.
+    """
+    assert is_remote_markdown('https://example.com/deck/slides.md')
+    assert not is_remote_markdown('https://example.com/deck/index.html')
+    assert not is_remote_markdown('slides.md')
+
+
+def test_remote_references():
+    """
+    Only relative references within the deck directory must be fetched.
+    """
+    assert remote_references(MARKDOWN) == [
+        'background.svg',
+        'images/image.png',
+    ]
+
+
+def test_http_cache(http_server, config):
+    """
+    Cached responses must be revalidated with conditional requests.
+    """
+    cache = HttpCache(config['local_path'] / 'http')
+    url = http_server + '/deck/images/image.png'
+    assert cache.fetch(url) == b'image'
+    assert cache.fetch(url) == b'image'
+    CachingHandler.files['/deck/images/image.png'] = b'changed'
+    assert cache.fetch(url) == b'changed'
+    assert cache.fetch(http_server + '/missing.png') is None
+    assert [status for _, status in CachingHandler.requests] == [
+        200,
+        304,
+        200,
+        404,
+    ]
+    assert (cache.downloaded, cache.revalidated) == (2, 1)
+
+
+def test_fetch_deck(http_server, config):
+    """
+    Presentations must be fetched with their images and style files, and
+    only exported again when they change.
+    """
+    url = http_server + '/deck/slides.md'
+    markdown_file = fetch_deck(url, config)
+    directory = markdown_file.parent
+    assert markdown_file.name == 'slides.md'
+    assert (directory / 'images' / 'image.png').read_bytes() == b'image'
+    assert (directory / 'background.svg').exists()
+    assert (directory / 'style' / 'logo.svg').exists()
+    assert not (directory / 'style' / 'custom.css').exists()
+
+    output = config['local_path'] / 'slides.zip'
+    output.write_bytes(b'zip')
+    record_export(markdown_file, output)
+    assert [path.name for path in directory.glob('.*')] == []
+    CachingHandler.requests = []
+    fetch_deck(url, config)
+    assert {status for _, status in CachingHandler.requests} == {304, 404}
+    assert is_exported(markdown_file, output)
+
+    CachingHandler.files['/deck/images/image.png'] = b'changed'
+    fetch_deck(url, config)
+    assert not is_exported(markdown_file, output)
+
+
+@pytest.mark.parametrize(
+    'path,served,name',
+    [
+        ('/deck/..', '/', 'index.md'),
+        (
+            '/deck/..%2F..%2Fslides.md',
+            '/deck/..%2F..%2Fslides.md',
+            'slides.md',
+        ),
+    ],
+)
+def test_fetch_deck_name(http_server, config, path, served, name):
+    """
+    Fetched presentations must be written within their own directory.
+    """
+    CachingHandler.files[served] = b'# Slide'
+    markdown_file = fetch_deck(http_server + path, config)
+    assert markdown_file.name == name
+    assert markdown_file.parent.parent == config['local_path'] / 'remote'
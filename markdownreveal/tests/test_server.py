@@ -0,0 +1,177 @@
+"""
+Markdownreveal server module tests.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.websocket import websocket_connect
+
+from markdownreveal.convert import run_sync
+from markdownreveal.server import PREFIX
+from markdownreveal.server import AssetCache
+from markdownreveal.server import DeckStore
+from markdownreveal.server import Revision
+from markdownreveal.server import make_application
+from markdownreveal.server import section_spans
+
+
+def deck(slides, title='Deck'):
+    """
+    Build the HTML of a presentation with the given slides.
+    """
+    return '\n'.join(
+        ['<html><head><title>%s</title></head><body>' % title]
+        + ['<section><p>%s</p></section>' % slide for slide in slides]
+        + ['</body></html>']
+    )
+
+
+def test_section_spans():
+    """
+    Only top-level slides must be found.
+    """
+    html = '<section>a</section>\n<section><section>b</section></section>'
+    spans = section_spans(html)
+    assert [html[start:end] for start, end in spans] == [
+        '<section>a</section>',
+        '<section><section>b</section></section>',
+    ]
+
+
+def test_revision_diff():
+    """
+    Only changed slides must be sent, unless the page itself changed.
+    """
+    first = Revision(deck(['a', 'b', 'c']), 1)
+    second = Revision(deck(['a', 'x']), 2)
+    assert second.diff(first) == {
+        'revision': second.id,
+        'count': 2,
+        'slides': [{'index': 1, 'html': '<section><p>x</p></section>'}],
+    }
+    assert second.diff(second)['slides'] == []
+    retitled = Revision(deck(['a', 'x'], title='New'), 3)
+    assert retitled.diff(second) == {'revision': retitled.id, 'reload': True}
+    rebuilt = Revision(deck(['a', 'x']), 4)
+    assert rebuilt.diff(second)['reload']
+
+
+def test_deck_store():
+    """
+    Unknown revisions must be fully reloaded.
+    """
+    store = DeckStore()
+    store.publish(deck(['a']))
+    first = store.latest.id
+    store.publish(deck(['b']))
+    assert store.diff(first)['slides'][0]['index'] == 0
+    assert store.diff('unknown')['reload']
+    assert '<script>' in store.latest.page
+
+
+class FakeViewer:
+    def __init__(self, role, token=''):
+        self.role = role
+        self.token = token
+        self.messages = []
+
+    def write_message(self, text):
+        self.messages.append(json.loads(text))
+
+
+def test_presenter_relay():
+    """
+    The speaker state must be relayed to presenters, and the navigation of
+    presenters with the token to speakers.
+    """
+    store = DeckStore()
+    store.publish(deck(['a']))
+    speaker = FakeViewer('speaker')
+    presenter = FakeViewer('presenter', store.token)
+    intruder = FakeViewer('presenter', 'guess')
+    viewer = FakeViewer('viewer')
+    store.viewers.update([speaker, presenter, viewer])
+    store.receive(speaker, {'state': {'indexh': 1}})
+    store.receive(viewer, {'state': {'indexh': 5}})
+    store.receive(intruder, {'navigate': {'indexh': 3}})
+    store.receive(presenter, {'navigate': {'indexh': 2}})
+    assert store.state == {'indexh': 1}
+    assert presenter.messages == [{'state': {'indexh': 1}}]
+    assert speaker.messages == [{'navigate': {'indexh': 2}}]
+    assert viewer.messages == []
+
+
+def test_asset_cache(tmpdir):
+    """
+    Cached contents must be refreshed when files change and evicted when
+    the cache is full.
+    """
+    first = Path(str(tmpdir)) / 'first.css'
+    second = Path(str(tmpdir)) / 'second.css'
+    first.write_text('a' * 10)
+    second.write_text('b' * 10)
+    cache = AssetCache(max_size=15)
+    assert cache.get(str(first)) == b'a' * 10
+    first.write_text('c' * 5)
+    assert cache.get(str(first)) == b'c' * 5
+    assert cache.get(str(second)) == b'b' * 10
+    assert cache.size == 15
+    assert cache.get(str(first)) == b'c' * 5
+    assert list(cache.entries) == [str(second), str(first)]
+
+
+def test_application(tmpdir):
+    """
+    Viewers must be notified of new revisions and fetch their changes.
+    """
+    root = Path(str(tmpdir))
+    (root / 'style.css').write_text('p {}')
+    store = DeckStore()
+    store.publish(deck(['a', 'b']))
+
+    async def scenario():
+        sock, port = bind_unused_port()
+        server = HTTPServer(make_application(store, root))
+        server.add_sockets([sock])
+        url = 'http://127.0.0.1:%d' % port
+        client = AsyncHTTPClient()
+        try:
+            page = await client.fetch(url + '/')
+            viewer = await websocket_connect(
+                url.replace('http', 'ws') + PREFIX + '/updates'
+            )
+            first = json.loads(await viewer.read_message())
+            store.publish(deck(['a', 'c']))
+            second = json.loads(await viewer.read_message())
+            since = '%s/diff?since=%s' % (PREFIX, first['revision'])
+            diff = json.loads((await client.fetch(url + since)).body)
+            style = await client.fetch(url + '/style.css')
+            presenter = url + PREFIX + '/presenter?token='
+            with pytest.raises(HTTPClientError) as forbidden:
+                await client.fetch(presenter + 'guess')
+            assert forbidden.value.code == 403
+            presenter = await client.fetch(presenter + store.token)
+            assert b'Presenter view' in presenter.body
+            intruder = await websocket_connect(
+                url.replace('http', 'ws') + PREFIX + '/updates?role=presenter'
+            )
+            assert await intruder.read_message() is None
+            assert intruder.close_code == 1008
+            viewer.close()
+        finally:
+            server.stop()
+        return page.body.decode(), first, second, diff, style.body
+
+    page, first, second, diff, style = run_sync(scenario())
+    assert first['revision'] in page
+    assert second['revision'] == diff['revision']
+    assert diff['slides'] == [
+        {'index': 1, 'html': '<section><p>c</p></section>'}
+    ]
+    assert style == b'p {}'
@@ -0,0 +1,130 @@
+"""
+Markdownreveal slides module tests.
+"""
+
+from pathlib import Path
+
+from markdownreveal.slides import MANIFEST
+from markdownreveal.slides import SlideScanner
+from markdownreveal.slides import assign_ids
+from markdownreveal.slides import find_slides
+from markdownreveal.slides import read_manifest
+from markdownreveal.slides import update_manifest
+
+HTML = """
+<section id="title-slide"><h1 class="title">Title</h1></section>
+<section>
+<section id="first" class="slide level1"><h1>First</h1></section>
+<section id="second" class="slide level2"><h2>Second <em>one</em></h2>
+</section>
+</section>
+<section id="third" class="slide level1"><p>No title</p></section>
+"""
+
+
+def ids(html, previous):
+    return [slide['id'] for slide in assign_ids(find_slides(html), previous)]
+
+
+def test_find_slides():
+    """
+    Slides must be the innermost sections, with reveal.js indices.
+    """
+    slides = find_slides(HTML)
+    assert [slide['anchor'] for slide in slides] == [
+        'title-slide',
+        'first',
+        'second',
+        'third',
+    ]
+    assert [slide['indices'] for slide in slides] == [
+        [0, 0],
+        [1, 0],
+        [1, 1],
+        [2, 0],
+    ]
+    assert [slide['title'] for slide in slides] == [
+        'Title',
+        'First',
+        'Second one',
+        '',
+    ]
+    assert len({slide['hash'] for slide in slides}) == 4
+
+
+def test_slide_scanner():
+    """
+    Slides must be found as the HTML flows, whatever the chunks.
+    """
+    for size in (1, 7, 64):
+        scanner = SlideScanner()
+        for start in range(0, len(HTML), size):
+            scanner.feed(HTML[start : start + size])
+        assert scanner.slides == find_slides(HTML)
+        assert len(scanner.buffer) < size + len('</section>')
+
+
+def test_assign_ids():
+    """
+    Identifiers must survive edits, renames, insertions and removals.
+    """
+    previous = assign_ids(find_slides(HTML), [])
+    original = [slide['id'] for slide in previous]
+    assert len(set(original)) == 4
+
+    # Renaming a slide changes its anchor and hash, but not its position
+    renamed = HTML.replace('id="first"', 'id="renamed"')
+    assert ids(renamed.replace('First', 'Renamed'), previous) == original
+
+    # Inserting a slide keeps the identifiers of the others
+    inserted = HTML.replace(
+        '<section>\n', '<section id="new"><p>New</p></section>\n<section>\n'
+    )
+    new = ids(inserted, previous)
+    assert new[:1] + new[2:] == original
+    assert new[1] not in original
+
+    # Removing a slide keeps the identifiers of the others
+    removed = HTML.split('\n', 2)[2]
+    assert ids(removed, previous) == original[1:]
+
+    # Duplicated slides get different identifiers
+    assert len(set(ids(HTML + HTML, []))) == 8
+
+
+def test_update_manifest(tmpdir):
+    """
+    Manifests must be written next to the HTML and reset for other decks.
+    """
+    directory = Path(str(tmpdir))
+    manifest = update_manifest(Path('deck.md'), find_slides(HTML), directory)
+    assert (directory / MANIFEST).exists()
+    assert read_manifest(directory) == manifest
+
+    edited = HTML.replace('First', 'Edited')
+    again = update_manifest(Path('deck.md'), find_slides(edited), directory)
+    assert again['slides'][1]['id'] == manifest['slides'][1]['id']
+    assert again['slides'][1]['hash'] != manifest['slides'][1]['hash']
+
+    other = update_manifest(
+        Path('other.md'), find_slides(HTML.replace('First', 'X')), directory
+    )
+    assert other['slides'][1]['id'] != manifest['slides'][1]['id']
+
+
+def test_update_manifest_reproducible(tmpdir):
+    """
+    Reproducible manifests must only depend on the slides.
+    """
+    directory = Path(str(tmpdir))
+    update_manifest(Path('deck.md'), find_slides(HTML), directory)
+    edited = HTML.replace('First', 'Edited')
+    manifest = update_manifest(
+        Path('deck.md'), find_slides(edited), directory, reproducible=True
+    )
+    (directory / MANIFEST).unlink()
+    fresh = update_manifest(
+        Path('deck.md'), find_slides(edited), directory, reproducible=True
+    )
+    assert manifest == fresh
+    assert manifest['source'] == 'deck.md'
@@ -0,0 +1,124 @@
+"""
+Markdownreveal style module tests.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from markdownreveal import style
+from markdownreveal.style import compile_style
+from markdownreveal.style import find_style_files
+from markdownreveal.style import minify_css
+from markdownreveal.style import optimize_svg
+from markdownreveal.style import read_package
+from markdownreveal.style import style_config
+
+
+@pytest.fixture
+def config(tmpdir):
+    """
+    Output directory with a downloaded (linked) style and a local style.
+    """
+    local_path = Path(str(tmpdir))
+    downloaded = local_path / 'c75cc1e5'
+    downloaded.mkdir()
+    (downloaded / 'logo.svg').write_text('<!-- Logo -->\n  <svg/>\n')
+    (downloaded / 'custom.css').write_text(
+        '/* Custom */\na {\n  color: red;\n}'
+    )
+    (downloaded / 'config.yaml').write_text('footer: Style footer\n')
+    out = local_path / 'out'
+    (out / 'style').mkdir(parents=True)
+    (out / 'markdownrevealstyle').symlink_to(downloaded)
+    return {
+        'local_path': local_path,
+        'style_path': 'style',
+        'style_logo': 'logo.svg',
+        'style_background': 'background.svg',
+        'style_warmup': 'warmup.png',
+        'style_custom_css': 'custom.css',
+    }
+
+
+def test_minify_css():
+    """
+    Comments and whitespace must be removed from CSS files.
+    """
+    css = '/* Title */\nh1 , h2 {\n  color: red;\n  margin: 0 auto;\n}\n'
+    assert minify_css(css) == 'h1,h2{color: red;margin: 0 auto}'
+
+
+@pytest.mark.parametrize(
+    'css,minified',
+    [
+        ('a::after {\n  content: "a , b";\n}', 'a::after{content: "a , b"}'),
+        (
+            'a { background: url(data:image/svg+xml,<svg>/*</svg>) ; }',
+            'a{background: url(data:image/svg+xml,<svg>/*</svg>)}',
+        ),
+        ("a { content: ';}' ; }\n/* End */", "a{content: ';}'}"),
+    ],
+)
+def test_minify_css_verbatim(css, minified):
+    """
+    Strings and URLs must be kept verbatim when minifying CSS files.
+    """
+    assert minify_css(css) == minified
+
+
+def test_optimize_svg():
+    """
+    Comments, metadata and indentation must be removed from SVG files.
+    """
+    svg = '<!-- Editor -->\n<svg>\n  <metadata>\n  </metadata>\n  <g/>\n</svg>'
+    assert optimize_svg(svg) == '<svg>\n<g/>\n</svg>\n'
+
+
+def test_compile_style(config):
+    """
+    Compiled styles must be indexed, with their configuration.
+    """
+    path = config['local_path'] / 'c75cc1e5'
+    assert read_package(path) is None
+    assert style_config(path) == {'footer': 'Style footer'}
+    compile_style(path)
+    package = read_package(path)
+    assert package['files'] == ['config.yaml', 'custom.css', 'logo.svg']
+    assert (path / 'custom.css').read_text() == 'a{color: red}'
+    assert (path / 'logo.svg').read_text() == '<svg/>\n'
+    (path / 'config.yaml').unlink()
+    assert style_config(path) == {'footer': 'Style footer'}
+
+
+def test_find_style_files(config, monkeypatch):
+    """
+    Style files must be resolved once, until the local style changes.
+    """
+    compile_style(config['local_path'] / 'c75cc1e5')
+    files = find_style_files(config)
+    assert files == {
+        'style_logo': Path('markdownrevealstyle/logo.svg'),
+        'style_background': None,
+        'style_warmup': None,
+        'style_custom_css': Path('markdownrevealstyle/custom.css'),
+    }
+
+    resolved = []
+    resolve = style.resolve_style_file
+
+    def counting_resolve(*args):
+        resolved.append(args[0])
+        return resolve(*args)
+
+    monkeypatch.setattr(style, 'resolve_style_file', counting_resolve)
+    assert find_style_files(config) == files
+    assert not resolved
+
+    # Local files take precedence over the downloaded style
+    local = config['local_path'] / 'out' / 'style'
+    (local / 'logo.svg').write_text('<svg/>')
+    os.utime(str(local), ns=(0, 0))
+    assert find_style_files(config)['style_logo'] == Path('style/logo.svg')
+    assert len(resolved) == 4
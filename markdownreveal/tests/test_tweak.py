@@ -1,7 +1,10 @@
 """
 Markdownreveal tweak module tests.
 """
+from pathlib import Path
+
 from markdownreveal.tweak import find_indexes
+from markdownreveal.tweak import tweak_template
 
 
 def test_find_indexes():
@@ -10,3 +13,32 @@ def test_find_indexes():
     """
     haystack = ['asdf qwer', 'foo bar', 'foo qwerbar', 'barasdf qwe']
     assert find_indexes(haystack, 'qwer') == [0, 2]
+
+
+def test_tweak_template():
+    """
+    Test `tweak_template()` function.
+    """
+    template = '\n'.join(
+        [
+            '<head>',
+            '<title>$pagetitle$</title>',
+            '</head>',
+            '<div class="reveal">',
+            '$body$',
+        ]
+    )
+    config = {
+        'footer': 'Only $5',
+        'header': '',
+        'no_warmup': True,
+        'local_path': Path('/nonexistent'),
+        'style_path': 'style',
+        'style_logo': 'logo.svg',
+        'style_custom_css': 'custom.css',
+    }
+    text = tweak_template(template, config)
+    assert '<title>$pagetitle$</title>' in text
+    assert '<div class="markdownreveal_footer">Only $$5</div>' in text
+    assert 'twemoji' not in text
+    assert text.endswith('$body$\n')
@@ -0,0 +1,118 @@
+"""
+Markdownreveal watch module tests.
+"""
+
+import os
+import time
+from pathlib import Path
+from sys import platform
+
+import pytest
+from watchdog.events import FileClosedNoWriteEvent
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileOpenedEvent
+
+from markdownreveal.watch import EventHandler
+from markdownreveal.watch import NativeWatcher
+from markdownreveal.watch import PollingWatcher
+from markdownreveal.watch import inotify_supported
+from markdownreveal.watch import make_watcher
+
+
+def wait_for(condition, timeout=5):
+    start = time.time()
+    while not condition() and time.time() - start < timeout:
+        time.sleep(0.01)
+    return condition()
+
+
+def touch(path, offset):
+    """
+    Modify a file, with a distinct modification time.
+    """
+    path.write_text('modified')
+    mtime = time.time() + offset
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_event_handler_ignores_reads():
+    """
+    Reading a dependency must not be reported.
+    """
+    requests = []
+    watcher = NativeWatcher(lambda: requests.append(1))
+    watcher.dependencies = {Path('/deck/slides.md')}
+    handler = EventHandler(watcher)
+    handler.on_any_event(FileOpenedEvent('/deck/slides.md'))
+    handler.on_any_event(FileClosedNoWriteEvent('/deck/slides.md'))
+    assert not requests
+    handler.on_any_event(FileModifiedEvent('/deck/other.md'))
+    assert not requests
+    handler.on_any_event(FileModifiedEvent('/deck/slides.md'))
+    assert requests == [1]
+    assert watcher.stats()['events'] == 1
+
+
+@pytest.mark.skipif(platform != 'linux', reason='Requires inotify')
+def test_inotify_supported():
+    """
+    The watchdog internals used to tune inotify must be available in the
+    supported watchdog versions.
+    """
+    assert inotify_supported()
+
+
+@pytest.mark.parametrize('backend', ['native', 'poll'])
+def test_watcher(tmpdir, backend):
+    """
+    Watchers must report modified and created dependencies.
+    """
+    tmpdir = Path(str(tmpdir))
+    slides = tmpdir / 'slides.md'
+    slides.write_text('# Slides')
+    style = tmpdir / 'style' / 'custom.css'
+    requests = []
+    config = {'watcher_delay': 0.01}
+    watcher = make_watcher(config, lambda: requests.append(1), backend)
+    watcher.watch({slides, style})
+    watcher.start()
+    try:
+        touch(slides, 1)
+        assert wait_for(lambda: requests)
+        style.parent.mkdir()
+        watcher.watch({slides, style, tmpdir / 'other.md'})
+        touch(style, 2)
+        assert wait_for(lambda: len(requests) >= 2)
+        stats = watcher.stats()
+    finally:
+        watcher.stop()
+    assert stats['backend'] == backend
+    assert stats['watches'] == {'native': 2, 'poll': 3}[backend]
+
+
+def test_polling_watcher_index(tmpdir):
+    """
+    The index must keep signatures of dependencies still watched.
+    """
+    tmpdir = Path(str(tmpdir))
+    slides = tmpdir / 'slides.md'
+    slides.write_text('# Slides')
+    requests = []
+    watcher = PollingWatcher(lambda: requests.append(1))
+    watcher.watch({slides})
+    touch(slides, 1)
+    watcher.watch({slides, tmpdir / 'missing.md'})
+    watcher.poll()
+    assert requests == [1]
+    watcher.poll()
+    assert requests == [1]
+    assert watcher.watches() == 2
+
+
+def test_make_watcher():
+    """
+    Unknown backends must be rejected.
+    """
+    with pytest.raises(ValueError, match='Unknown watcher'):
+        make_watcher({}, None, 'fsevents')
+    assert isinstance(make_watcher({}, None), NativeWatcher)
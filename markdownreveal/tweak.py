@@ -1,6 +1,16 @@
 import re
+from typing import Iterable
+from typing import Iterator
 from typing import List
 
+from .style import find_style_files
+
+# Regular expression matching the lines where a new slide starts
+SLIDE_REGEX = '^<section'
+
+# Placeholder for the template `$` signs, while tweaking Pandoc templates
+TEMPLATE_DOLLAR = '\ue000'
+
 
 def find_indexes(haystack: List[str], regex: str) -> List[int]:
     """
@@ -22,15 +32,10 @@ def find_indexes(haystack: List[str], regex: str) -> List[int]:
 
 def find_style_file(filename, config):
     """
-    TODO
+    Find a style file (i.e.: `style_logo`) relative to the output directory
+    (see `style.find_style_files`).
     """
-    outpath = config['local_path'] / 'out'
-    filepath = outpath / config['style_path'] / config[filename]
-    if not filepath.exists():
-        filepath = outpath / 'markdownrevealstyle' / config[filename]
-    if not filepath.exists():
-        return
-    return filepath.relative_to(filepath.parents[1])
+    return find_style_files(config).get(filename)
 
 
 def tweak_html_footer(html, footer):
@@ -62,23 +67,28 @@ def tweak_html_warmup(html, config):
     """
     if config.get("no_warmup"):
         return
+    indexes = find_indexes(html, 'div class="slides"')
+    if not indexes:
+        return
     fname = find_style_file('style_warmup', config)
     if not fname:
         return
     text = '<section><img src="%s" /></section>' % fname
-    index = find_indexes(html, 'div class="slides"')[0]
-    html.insert(index + 1, text)
+    html.insert(indexes[0] + 1, text)
 
 
 def tweak_html_logo(html, config):
     """
     TODO
     """
+    indexes = find_indexes(html, '<div class=\"reveal\">')
+    if not indexes:
+        return
     fname = find_style_file('style_logo', config)
     if not fname:
         return
     text = '<div class="logo"><img src="%s" /></div>' % fname
-    for index in find_indexes(html, '<div class=\"reveal\">'):
+    for index in indexes:
         html.insert(index + 1, text)
 
 
@@ -86,10 +96,13 @@ def tweak_html_background(html, config):
     """
     TODO
     """
+    indexes = find_indexes(html, SLIDE_REGEX)
+    if not indexes:
+        return
     fname = find_style_file('style_background', config)
     if not fname:
         return
-    for index in find_indexes(html, '^<section.*'):
+    for index in indexes:
         html[index] = html[index].replace(
             '<section', '<section data-background="%s"' % fname, 1
         )
@@ -99,49 +112,103 @@ def tweak_html_css(html, config):
     """
     TODO
     """
+    indexes = find_indexes(html, 'stylesheet.*id="theme"')
+    if not indexes:
+        return
     fname = find_style_file('style_custom_css', config)
     if not fname:
         return
-    index = find_indexes(html, 'stylesheet.*id="theme"')[0]
     text = '<link rel="stylesheet" href="%s">' % fname
-    html.insert(index + 1, text)
+    html.insert(indexes[0] + 1, text)
     return True
 
 
-def tweak_html_emoji(html):
+def tweak_html_page(html: List[str], config) -> List[str]:
     """
-    Add required scripts to parse emojis and display them with a consistent
-    style in all browsers.
-    """
-    text = """
-<script src="https://twemoji.maxcdn.com/v/latest/twemoji.min.js"
-  crossorigin="anonymous"></script>
-<script>
-  function addEvent(element, eventName, fn) {
-    if (element.addEventListener)
-      element.addEventListener(eventName, fn, false);
-    else if (element.attachEvent)
-      element.attachEvent('on' + eventName, fn);
-  }
-
-  addEvent(window, 'load', function() {
-    twemoji.parse(document.body, {'folder': 'svg', 'ext': '.svg'});
-  });
-</script>
-"""
-    html.insert(find_indexes(html, '</head>')[0], text)
-
+    Apply the page-level HTML tweaks (header, footer, logo, custom CSS and
+    warmup slide) to a list of lines.
 
-def tweak_html(html, config):
+    These tweaks only modify the page around the slides, so they can be
+    applied to a Pandoc template as well.
     """
-    TODO
-    """
-    html = html.splitlines()
     tweak_html_footer(html, config['footer'])
     tweak_html_header(html, config['header'])
     tweak_html_warmup(html, config)
     tweak_html_logo(html, config)
-    tweak_html_background(html, config)
     tweak_html_css(html, config)
-    tweak_html_emoji(html)
-    return '\n'.join(html)
+    return html
+
+
+def tweak_html_slide(html: List[str], config) -> List[str]:
+    """
+    Apply the slide-level HTML tweaks (background) to a list of lines.
+    """
+    tweak_html_background(html, config)
+    return html
+
+
+def tweak_html_chunk(html: List[str], config) -> List[str]:
+    """
+    Apply all the HTML tweaks to a chunk of lines.
+
+    Parameters
+    ----------
+    html
+        List of HTML lines, usually a single slide. It is modified in place.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The tweaked list of lines.
+    """
+    tweak_html_page(html, config)
+    tweak_html_slide(html, config)
+    return html
+
+
+def tweak_template(template: str, config) -> str:
+    """
+    Apply the page-level HTML tweaks to a Pandoc template.
+
+    Pandoc template syntax is preserved, while any `$` sign in the inserted
+    text is escaped.
+
+    Parameters
+    ----------
+    template
+        Pandoc template text.
+    config
+        Markdownreveal configuration.
+
+    Returns
+    -------
+        The tweaked template text.
+    """
+    lines = template.replace('$', TEMPLATE_DOLLAR).splitlines()
+    tweak_html_page(lines, config)
+    text = '\n'.join(lines).replace('$', '$$').replace(TEMPLATE_DOLLAR, '$')
+    return text + '\n'
+
+
+def split_slides(lines: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Group HTML lines in chunks, starting a new chunk on each slide.
+
+    Parameters
+    ----------
+    lines
+        HTML lines.
+
+    Returns
+    -------
+        An iterator over the chunks (lists of lines).
+    """
+    chunk = []
+    for line in lines:
+        if chunk and re.search(SLIDE_REGEX, line):
+            yield chunk
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield chunk
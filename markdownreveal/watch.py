@@ -0,0 +1,318 @@
+import os
+import threading
+import time
+from pathlib import Path
+from sys import platform
+from typing import Callable
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from watchdog.events import FileClosedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileDeletedEvent
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+
+from .dependencies import watched_directories
+from .typing import Config
+
+try:
+    from watchdog.observers.inotify import InotifyEmitter
+    from watchdog.observers.inotify_buffer import InotifyBuffer
+except ImportError:  # pragma: no cover
+    InotifyEmitter = InotifyBuffer = None
+
+# File watcher backends (see `make_watcher`)
+WATCHERS = ('native', 'poll')
+
+# File system events which do not modify files (i.e.: reported when a build
+# reads its dependencies)
+READ_EVENTS = ('opened', 'closed_no_write')
+
+# File system events the native watcher subscribes to
+WATCHED_EVENTS = [
+    FileModifiedEvent,
+    FileClosedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileMovedEvent,
+]
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """
+    Modification time (in nanoseconds) and size of a file.
+
+    Returns
+    -------
+        The signature, or `None` if the file does not exist.
+    """
+    try:
+        stat = os.stat(str(path))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Watcher:
+    """
+    Base file watcher, calling a function when a dependency is modified.
+
+    Only the files a presentation depends on are watched: the set of
+    dependencies is replaced after each build (see `watch`).
+
+    Parameters
+    ----------
+    callback
+        Function to call (from any thread) when a dependency is modified.
+    delay
+        Time, in seconds, the backend may wait before reporting a change.
+    """
+
+    backend = None
+
+    def __init__(self, callback: Callable[[], None], delay: float = 0.1):
+        self.callback = callback
+        self.delay = delay
+        self.dependencies = set()
+        self.events = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def watch(self, dependencies: Set[Path]):
+        """
+        Watch a new set of dependencies.
+        """
+        if dependencies == self.dependencies:
+            return
+        self.dependencies = set(dependencies)
+        self.subscribe()
+
+    def subscribe(self):
+        """
+        Subscribe the backend to the current dependencies.
+        """
+        raise NotImplementedError
+
+    def watches(self) -> int:
+        """
+        Number of paths the backend is watching.
+        """
+        raise NotImplementedError
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def notify(self, *paths: Path):
+        """
+        Report modified files, calling the callback if any is a dependency.
+
+        The time elapsed since the file modification is recorded as the
+        latency of the backend.
+        """
+        modified = [path for path in paths if path in self.dependencies]
+        if not modified:
+            return
+        signature = file_signature(modified[0])
+        if signature:
+            self.latency = max(0.0, time.time() - signature[0] / 1e9)
+            self.max_latency = max(self.max_latency, self.latency)
+        self.events += 1
+        self.callback()
+
+    def stats(self) -> dict:
+        """
+        Watcher statistics, for diagnostics.
+
+        Returns
+        -------
+            The `backend` name, the number of `watches`, the number of
+            `events` reported, and the last and maximum `latency` (in
+            milliseconds) between a file modification and its report.
+        """
+        return {
+            'backend': self.backend,
+            'watches': self.watches(),
+            'events': self.events,
+            'latency': self.latency * 1000,
+            'max_latency': self.max_latency * 1000,
+        }
+
+
+def inotify_supported() -> bool:
+    """
+    Whether the inotify emitter of the installed watchdog version can be
+    customized (see `native_observer`).
+    """
+    return (
+        platform == 'linux'
+        and hasattr(InotifyEmitter, 'get_event_mask_from_filter')
+        and hasattr(InotifyBuffer, 'delay')
+    )
+
+
+def native_observer(delay: float) -> BaseObserver:
+    """
+    Create the native watchdog observer for the platform.
+
+    On Linux, inotify events are held in a buffer, to pair moves, for
+    `delay` seconds instead of watchdog's default. This relies on watchdog
+    internals, tested with the versions allowed in `setup.py`: other
+    versions, and other platforms, use the default observer.
+    """
+    if not inotify_supported():
+        return Observer(timeout=delay)
+    buffer = type('InotifyBuffer', (InotifyBuffer,), {'delay': delay})
+
+    class Emitter(InotifyEmitter):
+        def on_thread_start(self):
+            self._inotify = buffer(
+                os.fsencode(self.watch.path),
+                recursive=self.watch.is_recursive,
+                event_mask=self.get_event_mask_from_filter(),
+            )
+
+    return BaseObserver(Emitter)
+
+
+class EventHandler(FileSystemEventHandler):
+    """
+    Forward watchdog events to a watcher.
+    """
+
+    def __init__(self, watcher: 'NativeWatcher'):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in READ_EVENTS:
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        self.watcher.notify(*[Path(path) for path in paths if path])
+
+
+class NativeWatcher(Watcher):
+    """
+    Watch dependencies with the native file system events (i.e.: inotify).
+
+    The directories holding the dependencies are watched, not recursively.
+    """
+
+    backend = 'native'
+
+    def __init__(self, callback: Callable[[], None], delay: float = 0.1):
+        super().__init__(callback, delay)
+        self.observer = native_observer(delay)
+        self.handler = EventHandler(self)
+
+    def subscribe(self):
+        self.observer.unschedule_all()
+        for directory in watched_directories(self.dependencies):
+            self.observer.schedule(
+                self.handler, str(directory), event_filter=WATCHED_EVENTS
+            )
+
+    def watches(self) -> int:
+        return len(self.observer.emitters)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+
+class PollingWatcher(Watcher):
+    """
+    Watch dependencies by polling their modification time and size.
+
+    Native events are not reported for some file systems (i.e.: network
+    mounts or bind mounts in containers), but polling works everywhere.
+    Only the dependencies are checked, every `delay` seconds, against an
+    index of their last signature, which is kept for unchanged dependencies
+    when the set of dependencies is replaced.
+    """
+
+    backend = 'poll'
+
+    def __init__(self, callback: Callable[[], None], delay: float = 0.1):
+        super().__init__(callback, delay)
+        self.index = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def subscribe(self):
+        with self.lock:
+            self.index = {
+                path: (
+                    self.index[path]
+                    if path in self.index
+                    else file_signature(path)
+                )
+                for path in self.dependencies
+            }
+
+    def watches(self) -> int:
+        return len(self.index)
+
+    def poll(self):
+        """
+        Check the dependencies once, reporting those modified.
+        """
+        modified = []
+        with self.lock:
+            for path, signature in self.index.items():
+                current = file_signature(path)
+                if current != signature:
+                    self.index[path] = current
+                    modified.append(path)
+        if modified:
+            self.notify(*modified)
+
+    def run(self):
+        while not self.stopped.wait(self.delay):
+            self.poll()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def make_watcher(
+    config: Config, callback: Callable[[], None], backend: str = None
+) -> Watcher:
+    """
+    Create the file watcher configured with `watcher` and `watcher_delay`.
+
+    Parameters
+    ----------
+    config
+        Markdownreveal configuration.
+    callback
+        Function to call when a dependency is modified.
+    backend
+        The backend to use instead of the configured one (`native` or
+        `poll`).
+
+    Returns
+    -------
+        The (not started) watcher.
+    """
+    backend = backend or config.get('watcher', 'native')
+    if backend not in WATCHERS:
+        raise ValueError('Unknown watcher: %s' % backend)
+    delay = float(config.get('watcher_delay', 0.1))
+    if backend == 'poll':
+        return PollingWatcher(callback, delay)
+    return NativeWatcher(callback, delay)
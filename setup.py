@@ -22,9 +22,10 @@ setup(
         'Topic :: Utilities',
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Programming Language :: Python :: Implementation :: CPython',
     ],
     keywords='markdown reveal reveal.js presentation',
@@ -35,13 +36,14 @@ setup(
         ]
     },
     packages=['markdownreveal'],
+    python_requires='>=3.8',
     package_data={'markdownreveal': ['config.template.yaml']},
     install_requires=[
         'PyYAML>=5.1',
         'requests',
         'pypandoc',
-        'livereload==2.6.2',
-        'watchdog',
+        'tornado',
+        'watchdog>=4.0,<7',
         'click',
         'click_default_group',
     ],
@@ -49,5 +51,6 @@ setup(
         'dev': [],
         'test': ['tox'],
         'docs': ['sphinx', 'numpydoc', 'sphinx_rtd_theme'],
+        'images': ['Pillow'],
     },
 )